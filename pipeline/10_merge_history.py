@@ -2,50 +2,78 @@
 """
 Merge snapshot CSVs (raw scrapes) into a normalized, append-only history.
 
-Inputs:  data/snapshots/*_pi_brand.csv  (columns: sku,name,price,availability,stock,url)
+Inputs:  data/snapshots/<YYYY-MM-DD>_pi_brand.csv  (columns: sku,name,price,availability,stock,url)
 Output:  data/history/price_history.csv (columns below)
+         data/history/merge_manifest.json (ingested snapshots: name -> size, sha256)
 Columns:
   date, sku, name, url, price, stock, availability, model, memory_gb, brand
+
+History is kept in (date, sku) order. Existing (date, sku) rows win over the
+rows of a new snapshot, but a snapshot whose contents changed since it was
+merged replaces every history row of its date. By default only snapshots that
+are new or changed since the manifest was written are parsed; when they only
+add dates after the newest one in the history, their rows are appended to the
+CSV without reading it. --full re-reads every snapshot and produces the same
+bytes.
+
+--max-memory MB switches to a streaming merge for histories that do not fit in
+RAM: history and snapshots are read in chunks, each chunk is sorted by
+(date, sku) and spilled to a temporary run file, and the runs are k-way
+merged (keeping the first row per (date, sku)) straight into the CSV. The
+output is identical to the in-memory merge. Both the streaming merge and an
+append drop the Parquet sidecar and leave it for the next stage that loads
+the full history to rewrite.
+
+With --sqlite (or once data/history/prices.sqlite exists) the merged rows are
+also upserted into the SQLite store; see history_db.py. Likewise --intervals
+(or an existing data/history/price_intervals.csv) keeps the change-only interval
+encoding plus a per-SKU product table in step, folding in the new rows when the
+tables match the previous manifest; see history_intervals.py.
+Every run also keeps the latest-row-per-SKU table (data/history/latest.csv) in
+step, folding in only the new snapshot rows; see latest_table.py.
 """
 
 from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import heapq
+import json
 import re
+import tempfile
 from pathlib import Path
+from typing import Iterator
 import pandas as pd
 
+import history_db
+import history_intervals
+import latest_table
+from classify import classify_names
+from history_store import write_history
+
 SNAP_DIR = Path("data/snapshots")
 HIST_PATH = Path("data/history/price_history.csv")
+MANIFEST_PATH = Path("data/history/merge_manifest.json")
 HIST_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-
-def _extract_model(name: str) -> str:
-    n = (name or "").lower()
-    if "raspberry pi 5" in n:
-        return "Pi 5"
-    if "raspberry pi 4" in n:
-        return "Pi 4"
-    if "raspberry pi 3" in n:
-        return "Pi 3"
-    if "500 plus" in n or "500+" in n:
-        return "Pi 500+"
-    if "500" in n:
-        return "Pi 500"
-    if "pico 2" in n:
-        return "Pico 2"
-    if "pico" in n:
-        return "Pico"
-    return "Accessory"
-
-
-def _extract_mem_gb(name: str) -> float | None:
-    m = re.search(r"\b(512|1|2|4|8|16)\s*(GB|MB)\b", name or "", re.I)
-    if not m:
-        return None
-    amount = float(m.group(1))
-    unit = m.group(2).lower()
-    if unit == "mb":
-        return round(amount / 1024, 3)
-    return amount
+SNAP_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})_pi_brand\.csv$")
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# row order of price_history.csv, recorded in the manifest so an append is
+# only attempted on a file that was written in it
+ORDER = ["date", "sku"]
+COLUMNS = [
+    "date",
+    "sku",
+    "name",
+    "url",
+    "price",
+    "stock",
+    "availability",
+    "model",
+    "memory_gb",
+    "brand",
+]
+STRING_COLUMNS = ("date", "sku", "name", "url", "stock", "availability", "brand", "model")
 
 
 def _normalize_price(series: pd.Series) -> pd.Series:
@@ -57,75 +85,73 @@ def _normalize_price(series: pd.Series) -> pd.Series:
 
 def _load_history() -> pd.DataFrame:
     if HIST_PATH.exists():
-        return pd.read_csv(HIST_PATH, dtype={"sku": str})
-    cols = [
-        "date",
-        "sku",
-        "name",
-        "url",
-        "price",
-        "stock",
-        "availability",
-        "model",
-        "memory_gb",
-        "brand",
-    ]
-    return pd.DataFrame(columns=cols)
+        return pd.read_csv(HIST_PATH, dtype={"sku": str}, float_precision="round_trip")
+    return pd.DataFrame(columns=COLUMNS)
 
 
-def main() -> None:
-    snaps = sorted(SNAP_DIR.glob("*_pi_brand.csv"))
-    if not snaps:
-        print("No snapshots found in data/snapshots; nothing to merge.")
-        return
-    frames = []
-    for snap in snaps:
-        date_part = snap.name.split("_")[0]  # YYYY-MM-DD
-        df = pd.read_csv(snap, dtype={"sku": str})
-        if df.empty:
-            continue
-
-        df["sku"] = (
-            df["sku"]
-            .fillna("")
-            .astype(str)
-            .str.strip()
-            .replace({"nan": "", "None": "", "none": ""})
-        )
-        df["name"] = df["name"].fillna("").astype(str)
-        # expected columns: sku,name,price,availability,stock,url
-        df["date"] = date_part
-        df["brand"] = "Raspberry Pi"
-        df["model"] = df["name"].map(_extract_model)
-        df["memory_gb"] = df["name"].map(_extract_mem_gb)
-        df["price"] = _normalize_price(df["price"])
-        frames.append(
-            df[
-                [
-                    "date",
-                    "sku",
-                    "name",
-                    "url",
-                    "price",
-                    "stock",
-                    "availability",
-                    "model",
-                    "memory_gb",
-                    "brand",
-                ]
-            ]
-        )
+def _snapshots() -> dict[str, Path]:
+    """Dated snapshots by name (skips _fallback_pi_brand.csv and friends)."""
+    return {
+        snap.name: snap
+        for snap in sorted(SNAP_DIR.glob("*_pi_brand.csv"))
+        if SNAP_RE.match(snap.name)
+    }
 
-    history = _load_history()
-    merged_sources = [history] + frames if not history.empty else frames
-    if not merged_sources:
-        print("No rows to merge.")
-        return
 
-    merged = pd.concat(merged_sources, ignore_index=True)
+def _fingerprint(path: Path) -> dict:
+    data = path.read_bytes()
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def _load_manifest() -> dict[str, dict]:
+    try:
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))["snapshots"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def _manifest_order() -> list[str] | None:
+    try:
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8")).get("order")
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(fingerprints: dict[str, dict]) -> None:
+    MANIFEST_PATH.write_text(
+        json.dumps({"order": ORDER, "snapshots": fingerprints}, indent=2, sort_keys=True)
+        + "\n",
+        encoding="utf-8",
+    )
+
+
+def _read_snapshot(snap: Path) -> pd.DataFrame | None:
+    date_part = SNAP_RE.match(snap.name).group(1)  # YYYY-MM-DD
+    df = pd.read_csv(snap, dtype={"sku": str})
+    if df.empty:
+        return None
+
+    df["sku"] = (
+        df["sku"]
+        .fillna("")
+        .astype(str)
+        .str.strip()
+        .replace({"nan": "", "None": "", "none": ""})
+    )
+    df["name"] = df["name"].fillna("").astype(str)
+    # expected columns: sku,name,price,availability,stock,url
+    df["date"] = date_part
+    df["brand"] = "Raspberry Pi"
+    names = classify_names(df["name"])
+    df["model"] = names["model"]
+    df["memory_gb"] = names["memory_gb"]
+    df["price"] = _normalize_price(df["price"])
+    return df[COLUMNS]
+
 
+def _finalize(merged: pd.DataFrame) -> pd.DataFrame:
     # ensure string columns are clean
-    for col in ("date", "sku", "name", "url", "stock", "availability", "brand", "model"):
+    for col in STRING_COLUMNS:
         if col in merged:
             merged[col] = merged[col].fillna("").astype(str).str.strip()
 
@@ -135,11 +161,299 @@ def main() -> None:
     )
     no_sku = merged[merged["sku"] == ""]
     merged = pd.concat([with_sku, no_sku], ignore_index=True)
-    merged = merged.sort_values(["sku", "date"], kind="mergesort")
+    merged = merged.sort_values(ORDER, kind="mergesort")
     merged["date"] = merged["date"].replace(pd.NA, "").fillna("").astype(str)
+    return merged
+
+
+def _read_snapshots(snaps: dict[str, Path], names: list[str]) -> list[pd.DataFrame]:
+    return [df for df in (_read_snapshot(snaps[name]) for name in names) if df is not None]
+
+
+def _tail() -> tuple[list[str], str] | None:
+    """The CSV header and the date of its last row, or None if unreadable."""
+    with HIST_PATH.open("rb") as fh:
+        header = next(csv.reader([fh.readline().decode("utf-8")]), [])
+        size = fh.seek(0, 2)
+        fh.seek(max(size - 65536, 0))
+        lines = fh.read().decode("utf-8", errors="replace").splitlines(keepends=True)
+    if "date" not in header or len(lines) < 2 or not lines[-1].endswith("\n"):
+        return None
+    # a quoted name spanning lines leaves no date in the last line's date column
+    last = next(csv.reader([lines[-1]]), [])
+    at = header.index("date")
+    if len(last) != len(header) or not DATE_RE.match(last[at]):
+        return None
+    return header, last[at]
+
+
+def _append(rows: pd.DataFrame) -> bool:
+    """Append rows dated after the whole history to the CSV; False if they are not."""
+    if not HIST_PATH.exists() or _manifest_order() != ORDER:
+        return False
+    tail = _tail()
+    if tail is None:
+        return False
+    header, last = tail
+    if any(col not in header for col in COLUMNS) or not rows["date"].gt(last).all():
+        return False
+    rows.reindex(columns=header).to_csv(HIST_PATH, mode="a", header=False, index=False)
+    HIST_PATH.with_suffix(".parquet").unlink(missing_ok=True)
+    return True
+
 
-    merged.to_csv(HIST_PATH, index=False)
-    print(f"Wrote {HIST_PATH} with {len(merged)} rows")
+def _peak_rss() -> int:
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _rows_per_run(max_memory_mb: int) -> int:
+    """How many rows one sorted run may hold within the --max-memory budget."""
+    # leave headroom for the CSV parser's buffers and allocator slack
+    budget = (max_memory_mb - 64) * 1024 * 1024 - _peak_rss()
+    sample = (
+        pd.read_csv(HIST_PATH, dtype=str, nrows=1000) if HIST_PATH.exists() else None
+    )
+    per_row = 1024
+    if sample is not None and not sample.empty:
+        per_row = int(sample.memory_usage(deep=True).sum() / len(sample)) + 1
+    # a chunk exists as parsed, cleaned and sorted copies while it is spilled
+    rows = budget // (per_row * 6)
+    if rows < 1000:
+        raise SystemExit(
+            f"--max-memory {max_memory_mb} leaves no room for a sort run; raise it"
+        )
+    return int(rows)
+
+
+def _spill(chunk: pd.DataFrame, columns: list[str], seq: int, tmp: Path, runs: list[Path]) -> int:
+    """Sort one chunk by (date, sku, arrival) and write it as a run file."""
+    chunk = chunk.reindex(columns=columns)
+    for col in STRING_COLUMNS:
+        chunk[col] = chunk[col].fillna("").astype(str).str.strip()
+    chunk["_seq"] = range(seq, seq + len(chunk))
+    chunk = chunk.sort_values([*ORDER, "_seq"], kind="mergesort")
+    run = tmp / f"run{len(runs):05d}.csv"
+    chunk.to_csv(run, index=False, header=False)
+    runs.append(run)
+    return seq + len(chunk)
+
+
+def _streaming_merge(snaps: list[Path], rows_per_run: int, replaced: set[str]) -> int:
+    """
+    External-sort merge of history + snapshots into HIST_PATH, leaving out the
+    history rows of the `replaced` dates; returns rows.
+    """
+    columns = list(COLUMNS)
+    if HIST_PATH.exists():
+        header = pd.read_csv(HIST_PATH, nrows=0).columns.tolist()
+        if header:
+            columns = header + [c for c in COLUMNS if c not in header]
+
+    with tempfile.TemporaryDirectory(prefix="merge-", dir=HIST_PATH.parent) as tmp_dir:
+        tmp = Path(tmp_dir)
+        runs: list[Path] = []
+        seq = 0
+        if HIST_PATH.exists():
+            for chunk in pd.read_csv(HIST_PATH, dtype=str, chunksize=rows_per_run):
+                if replaced:
+                    chunk = chunk.loc[~chunk["date"].isin(replaced)]
+                seq = _spill(chunk, columns, seq, tmp, runs)
+        pending: list[pd.DataFrame] = []
+        pending_rows = 0
+        for snap in snaps:
+            df = _read_snapshot(snap)
+            if df is None:
+                continue
+            pending.append(df)
+            pending_rows += len(df)
+            if pending_rows >= rows_per_run:
+                seq = _spill(pd.concat(pending, ignore_index=True), columns, seq, tmp, runs)
+                pending, pending_rows = [], 0
+        if pending:
+            seq = _spill(pd.concat(pending, ignore_index=True), columns, seq, tmp, runs)
+        if not runs:
+            return 0
+
+        sku_at, date_at = columns.index("sku"), columns.index("date")
+        handles = [run.open(newline="", encoding="utf-8") for run in runs]
+        written = 0
+        try:
+            merged = heapq.merge(
+                *(csv.reader(h) for h in handles),
+                key=lambda r: (r[date_at], r[sku_at], int(r[-1])),
+            )
+            partial = HIST_PATH.with_suffix(".csv.tmp")
+            with partial.open("w", newline="", encoding="utf-8") as out:
+                writer = csv.writer(out, lineterminator="\n")
+                writer.writerow(columns)
+                last = None
+                for row in merged:
+                    key = (row[date_at], row[sku_at])
+                    if key[1] and key == last:
+                        continue  # earlier source (history first) wins
+                    last = key
+                    writer.writerow(row[:-1])
+                    written += 1
+        finally:
+            for h in handles:
+                h.close()
+        partial.replace(HIST_PATH)
+    HIST_PATH.with_suffix(".parquet").unlink(missing_ok=True)
+    return written
+
+
+def _history_chunks(rows: int) -> Iterator[pd.DataFrame]:
+    """Read the history in file-order chunks, i.e. by date."""
+    yield from pd.read_csv(
+        HIST_PATH, dtype={"sku": str}, chunksize=rows, float_precision="round_trip"
+    )
+
+
+def _whole_history(
+    merged: pd.DataFrame | None, rows_per_chunk: int | None
+) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    """The merged history: as merged in memory, else read in chunks or whole."""
+    if merged is not None:
+        return merged
+    if rows_per_chunk:
+        return _history_chunks(rows_per_chunk)
+    return _load_history()
+
+
+def _write_latest(latest: pd.DataFrame) -> None:
+    latest_table.write(latest)
+    print(f"Wrote {latest_table.LATEST} with {len(latest)} SKUs")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the manifest and rebuild history from every snapshot",
+    )
+    ap.add_argument(
+        "--sqlite",
+        action="store_true",
+        help=f"Also maintain the SQLite store at {history_db.DB_PATH}",
+    )
+    ap.add_argument(
+        "--intervals",
+        action="store_true",
+        help=f"Also write the change-only encoding to {history_intervals.INTERVALS}",
+    )
+    ap.add_argument(
+        "--max-memory",
+        type=int,
+        metavar="MB",
+        help="Stream the merge through sorted on-disk runs, keeping peak memory under MB",
+    )
+    args = ap.parse_args()
+
+    snaps = _snapshots()
+    if not snaps:
+        print("No snapshots found in data/snapshots; nothing to merge.")
+        return
+    fingerprints = {name: _fingerprint(path) for name, path in snaps.items()}
+    manifest = _load_manifest()
+    rows_per_chunk = _rows_per_run(args.max_memory) if args.max_memory else None
+
+    if args.full or not manifest:
+        todo, replaced = list(snaps), set()
+    else:
+        todo = [name for name in snaps if manifest.get(name) != fingerprints[name]]
+        if not todo:
+            print(f"{HIST_PATH} is up to date ({len(snaps)} snapshots ingested)")
+            if HIST_PATH.exists() and not latest_table.is_fresh():
+                _write_latest(latest_table.build(_whole_history(None, rows_per_chunk)))
+            return
+        # snapshots merged before whose contents changed replace their dates
+        replaced = {SNAP_RE.match(name).group(1) for name in todo if name in manifest}
+    # replaced rows invalidate every table that only folds in new rows
+    rebuild = args.full or bool(replaced)
+
+    use_db = args.sqlite or history_db.DB_PATH.exists()
+    # a database that matched the old CSV only needs the new snapshot rows;
+    # otherwise it is seeded from the whole history
+    conn = history_db.open_if_fresh(HIST_PATH) if use_db else None
+    db_incremental = conn is not None and not rebuild
+    if conn is not None:
+        conn.close()
+    # the table written for the previous manifest only needs the new rows
+    previous = None if rebuild else latest_table.load()
+    use_intervals = args.intervals or history_intervals.INTERVALS.exists()
+    previous_intervals = (
+        history_intervals.load()
+        if use_intervals and not rebuild and history_intervals.is_fresh()
+        else None
+    )
+
+    merged = frames = new_rows = None
+    if not rebuild:
+        frames = _read_snapshots(snaps, todo)
+        new_rows = _finalize(pd.concat(frames, ignore_index=True)) if frames else None
+    if new_rows is not None and _append(new_rows):
+        summary = f"Appended {len(new_rows)} rows to {HIST_PATH}"
+    elif args.max_memory:
+        total = _streaming_merge([snaps[name] for name in todo], rows_per_chunk, replaced)
+        if not total:
+            print("No rows to merge.")
+            return
+        summary = f"Wrote {HIST_PATH} with {total} rows"
+    else:
+        history = _load_history()
+        if replaced:
+            history = history.loc[~history["date"].astype(str).isin(replaced)]
+        if frames is None:
+            frames = _read_snapshots(snaps, todo)
+        merged_sources = [history] + frames if not history.empty else frames
+        if not merged_sources:
+            print("No rows to merge.")
+            return
+        merged = _finalize(pd.concat(merged_sources, ignore_index=True))
+        write_history(merged, HIST_PATH)
+        summary = f"Wrote {HIST_PATH} with {len(merged)} rows"
+
+    _write_manifest(fingerprints)
+    print(f"{summary} ({len(todo)} snapshot(s) parsed)")
+    if new_rows is None:
+        new_rows = []
+    if previous is not None:
+        latest = latest_table.update(previous, new_rows) if len(new_rows) else previous
+    else:
+        latest = latest_table.build(_whole_history(merged, rows_per_chunk))
+    _write_latest(latest)
+    if use_db:
+        if db_incremental:
+            db_rows = new_rows
+        else:
+            db_rows = _whole_history(merged, rows_per_chunk)
+        sent = history_db.sync(db_rows, HIST_PATH, replace=not db_incremental)
+        print(f"Upserted {sent} rows into {history_db.DB_PATH}")
+    if use_intervals:
+        encoded = None
+        if previous_intervals is not None:
+            encoded = (
+                history_intervals.update(*previous_intervals, new_rows)
+                if len(new_rows)
+                else previous_intervals
+            )
+        if encoded is None:
+            history = _whole_history(merged, rows_per_chunk)
+            encoded = (
+                history_intervals.encode(history)
+                if isinstance(history, pd.DataFrame)
+                else history_intervals.encode_chunks(history)
+            )
+        n_intervals, n_products = history_intervals.write(*encoded)
+        print(
+            f"Wrote {history_intervals.INTERVALS} with {n_intervals} intervals "
+            f"and {history_intervals.PRODUCTS} with {n_products} products"
+        )
 
 
 if __name__ == "__main__":
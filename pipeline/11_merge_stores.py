@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Merge per-store availability snapshots into a compact store-stock history.
+
+Inputs:  data/snapshots/*_stores.csv  (columns: date,store_id,sku,price,stock)
+         written by `search.py --stores 029,101,...`
+Outputs: data/history/store_ids.json   store dictionary; list position = bit
+         data/history/store_stock.csv  one row per (date, sku)
+         data/history/store_manifest.json  ingested store snapshots (name -> size, sha256)
+Columns:
+  date, sku, price_min, price_max, listed, available
+  listed/available are integer bitsets over store_ids.json: bit i is set when
+  store i listed the SKU / had it available: classify.stock_status() of the
+  store's stock text is not sold_out, the same normalization 12_alerts.py and
+  13_stock_events.py use (so Buy In Store counts). Bitsets are int64, so at
+  most MAX_STORES stores can be tracked.
+
+Only store snapshots that are new or changed since the manifest was written
+are read; their dates replace what store_stock.csv held for them. The
+manifest also names the availability rule; when it differs (an older
+manifest), every snapshot is re-read. --full re-reads every store snapshot.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from classify import stock_status
+
+SNAP_DIR = Path("data/snapshots")
+STORES_PATH = Path("data/history/store_ids.json")
+OUT_PATH = Path("data/history/store_stock.csv")
+MANIFEST_PATH = Path("data/history/store_manifest.json")
+OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+COLUMNS = ["date", "sku", "price_min", "price_max", "listed", "available"]
+AVAILABLE_RULE = "classify.stock_status != sold_out"
+MAX_STORES = 63  # bit 63 is the sign bit of an int64 bitset
+
+
+def _load_store_ids() -> list[str]:
+    if STORES_PATH.exists():
+        return json.loads(STORES_PATH.read_text(encoding="utf-8"))
+    return []
+
+
+def _fingerprint(path: Path) -> dict:
+    data = path.read_bytes()
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def _load_manifest() -> dict[str, dict]:
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    # bitsets built under another availability rule are rebuilt from scratch
+    if manifest.get("available") != AVAILABLE_RULE:
+        return {}
+    return manifest.get("snapshots", {})
+
+
+def _write_manifest(fingerprints: dict[str, dict]) -> None:
+    MANIFEST_PATH.write_text(
+        json.dumps(
+            {"available": AVAILABLE_RULE, "snapshots": fingerprints}, indent=2, sort_keys=True
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+
+
+def _read_snapshot(snap: Path) -> pd.DataFrame | None:
+    df = pd.read_csv(snap, dtype={"sku": str, "store_id": str}).fillna("")
+    if df.empty:
+        return None
+    df["sku"] = df["sku"].astype(str).str.strip()
+    df = df[df["sku"] != ""]
+    df["price"] = pd.to_numeric(
+        df["price"].astype(str).str.replace(r"[^0-9.]", "", regex=True),
+        errors="coerce",
+    )
+    return df[["date", "store_id", "sku", "price", "stock"]]
+
+
+def _available(stock: pd.Series) -> pd.Series:
+    """True where classify.stock_status() of the stock text is not sold_out."""
+    stock = stock.astype(str)
+    states = {s: stock_status(s, "") != "sold_out" for s in stock.unique()}
+    return stock.map(states).astype(bool)
+
+
+def _encode(df: pd.DataFrame, store_ids: list[str]) -> pd.DataFrame:
+    # store dictionary is append-only so existing bit positions never move
+    for sid in sorted(set(df["store_id"]) - set(store_ids)):
+        store_ids.append(sid)
+    if len(store_ids) > MAX_STORES:
+        raise SystemExit(
+            f"{len(store_ids)} stores in {STORES_PATH}; the listed/available bitsets "
+            f"hold at most {MAX_STORES}. Track fewer stores with --stores."
+        )
+    position = {sid: i for i, sid in enumerate(store_ids)}
+
+    df = df.copy()
+    df["bit"] = df["store_id"].map(position).map(lambda i: 1 << i)
+    df["avail_bit"] = df["bit"].where(_available(df["stock"]), 0)
+    grouped = df.groupby(["date", "sku"], sort=True).agg(
+        price_min=("price", "min"),
+        price_max=("price", "max"),
+        listed=("bit", "sum"),
+        available=("avail_bit", "sum"),
+    )
+    return grouped.reset_index()[COLUMNS]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the manifest and re-read every store snapshot",
+    )
+    args = ap.parse_args()
+
+    snaps = {snap.name: snap for snap in sorted(SNAP_DIR.glob("*_stores.csv"))}
+    if not snaps:
+        print("No store snapshots found in data/snapshots; nothing to merge.")
+        return
+    fingerprints = {name: _fingerprint(path) for name, path in snaps.items()}
+    manifest = {} if args.full or not OUT_PATH.exists() else _load_manifest()
+    todo = [name for name in snaps if manifest.get(name) != fingerprints[name]]
+    if not todo:
+        print(f"{OUT_PATH} is up to date ({len(snaps)} store snapshots ingested)")
+        return
+
+    frames = [df for df in (_read_snapshot(snaps[name]) for name in todo) if df is not None]
+    if not frames:
+        _write_manifest(fingerprints)
+        print("No store rows to merge.")
+        return
+
+    store_ids = _load_store_ids()
+    fresh = _encode(pd.concat(frames, ignore_index=True), store_ids)
+
+    # upsert: snapshot dates replace whatever history held for them
+    if OUT_PATH.exists():
+        history = pd.read_csv(OUT_PATH, dtype={"sku": str})
+        history = history[~history["date"].isin(set(fresh["date"]))]
+        fresh = pd.concat([history, fresh], ignore_index=True)
+    merged = fresh.sort_values(["sku", "date"], kind="mergesort")
+
+    STORES_PATH.write_text(json.dumps(store_ids, indent=2), encoding="utf-8")
+    merged.to_csv(OUT_PATH, index=False)
+    _write_manifest(fingerprints)
+    print(
+        f"Wrote {OUT_PATH} with {len(merged)} rows across {len(store_ids)} stores "
+        f"({len(todo)} snapshot(s) read)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Evaluate alert rules against the newest snapshot.
+
+Inputs:  data/snapshots/<YYYY-MM-DD>_pi_brand.csv  (only dates after the last run)
+         .scrapegoat/alert_state.json             per-SKU state after the last run
+Outputs: data/history/alerts.jsonl                 one JSON alert per line (append-only, --alerts)
+         optional webhook POST of each day's alerts (--webhook / $ALERT_WEBHOOK_URL)
+
+Rule types (see DEFAULT_RULES; --rules loads a JSON or YAML list instead):
+  price_drop     price fell at least min_pct percent (and min_abs dollars) vs the last sighting
+  back_in_stock  last sighting was sold out, now it is not
+  new_sku        SKU never seen before
+  disappeared    SKU was in the previous snapshot but not in this one
+  all_time_low   price below every earlier price for the SKU
+Any rule may narrow itself with `skus` (list) and/or `name_contains` (string).
+Stock states are classify.stock_status(), the same normalization
+13_stock_events.py uses: available / store_only / sold_out.
+
+Each snapshot is compared with the saved state only, so a run costs one
+snapshot's worth of work. Without a state file the state is rebuilt once
+from price_history.csv; with no history either, the first run only seeds it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+from classify import stock_status
+from history_store import HIST, load_history
+
+SNAP_DIR = Path("data/snapshots")
+ALERTS_PATH = Path("data/history/alerts.jsonl")
+STATE_PATH = Path(".scrapegoat/alert_state.json")
+SNAP_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})_pi_brand\.csv$")
+
+DEFAULT_RULES = [
+    {"name": "price_drop", "type": "price_drop", "min_pct": 5, "min_abs": 1.0},
+    {"name": "back_in_stock", "type": "back_in_stock"},
+    {"name": "new_sku", "type": "new_sku"},
+    {"name": "disappeared", "type": "disappeared"},
+    {"name": "all_time_low", "type": "all_time_low"},
+]
+RULE_TYPES = {"price_drop", "back_in_stock", "new_sku", "disappeared", "all_time_low"}
+
+
+def load_rules(path: Path) -> list[dict]:
+    """Rules from JSON or YAML (YAML needs PyYAML): a list or {"rules": [...]}."""
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in {".yml", ".yaml"}:
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("YAML rules need PyYAML (pip install pyyaml)")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    rules = []
+    for i, rule in enumerate(data or [], start=1):
+        if not isinstance(rule, dict) or rule.get("type") not in RULE_TYPES:
+            raise SystemExit(
+                f"{path}: rule #{i} needs a type ({', '.join(sorted(RULE_TYPES))})"
+            )
+        rules.append({"name": rule.get("name") or rule["type"], **rule})
+    return rules
+
+
+def _load_snapshot(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype={"sku": str}).fillna("")
+    df["sku"] = df["sku"].astype(str).str.strip()
+    df = df[df["sku"] != ""].drop_duplicates("sku", keep="first")
+    df["price"] = pd.to_numeric(
+        df["price"].astype(str).str.replace(r"[^0-9.]", "", regex=True),
+        errors="coerce",
+    )
+    df["status"] = [
+        stock_status(stock, avail) for stock, avail in zip(df["stock"], df["availability"])
+    ]
+    return df
+
+
+def _price(value) -> float | None:
+    return None if pd.isna(value) else round(float(value), 2)
+
+
+def _state_from_history(before: str) -> dict:
+    """One-off rebuild of the per-SKU state from history rows before `before`."""
+    empty = {"date": None, "skus": {}}
+    if not HIST.exists():
+        return empty
+    df = load_history(
+        ["date", "sku", "name", "price", "stock", "availability"], parse_dates=False
+    )
+    df = df[df["sku"].notna() & (df["date"].astype(str) < before)]
+    if df.empty:
+        return empty
+    df = df.assign(sku=df["sku"].astype(str)).sort_values(["sku", "date"], kind="mergesort")
+    last = df.groupby("sku").tail(1)
+    lows = df.groupby("sku")["price"].min()
+    skus = {}
+    for row in last.itertuples(index=False):
+        skus[row.sku] = {
+            "name": "" if pd.isna(row.name) else str(row.name),
+            "price": _price(row.price),
+            "status": stock_status(row.stock, row.availability),
+            "last_seen": str(row.date),
+            "min": _price(lows.get(row.sku)),
+        }
+    return {"date": str(df["date"].max()), "skus": skus}
+
+
+def _matches(rule: dict, sku: str, name: str) -> bool:
+    if rule.get("skus") and sku not in {str(s) for s in rule["skus"]}:
+        return False
+    needle = rule.get("name_contains")
+    return not needle or needle.lower() in (name or "").lower()
+
+
+def _alert(rule: dict, date: str, sku: str, name: str, **fields) -> dict:
+    return {"date": date, "rule": rule["name"], "type": rule["type"], "sku": sku, "name": name, **fields}
+
+
+def evaluate(snapshot: pd.DataFrame, date: str, state: dict, rules: list[dict]) -> tuple[list[dict], dict]:
+    """Alerts for one snapshot and the state after it."""
+    prev_date = state.get("date")
+    skus: dict[str, dict] = dict(state.get("skus", {}))
+    alerts: list[dict] = []
+
+    for row in snapshot.itertuples(index=False):
+        sku, name = row.sku, str(row.name)
+        price = _price(row.price)
+        prev = skus.get(sku)
+        for rule in rules:
+            if not _matches(rule, sku, name):
+                continue
+            kind = rule["type"]
+            if kind == "new_sku" and prev is None:
+                alerts.append(_alert(rule, date, sku, name, price=price, url=row.url))
+            if prev is None:
+                continue
+            old = prev.get("price")
+            if kind == "price_drop" and price is not None and old:
+                drop = old - price
+                pct = 100.0 * drop / old
+                if pct >= float(rule.get("min_pct", 0)) and drop >= float(rule.get("min_abs", 0)) and drop > 0:
+                    alerts.append(
+                        _alert(rule, date, sku, name, price=price, prev_price=old, pct_off=round(pct, 1), url=row.url)
+                    )
+            elif kind == "back_in_stock":
+                if prev.get("status") == "sold_out" and row.status != "sold_out":
+                    alerts.append(
+                        _alert(rule, date, sku, name, price=price, status=row.status, since=prev.get("last_seen"), url=row.url)
+                    )
+            elif kind == "all_time_low":
+                low = prev.get("min")
+                if price is not None and low is not None and price < low:
+                    alerts.append(_alert(rule, date, sku, name, price=price, prev_min=low, url=row.url))
+
+        low = prev.get("min") if prev else None
+        skus[sku] = {
+            "name": name,
+            "price": price,
+            "status": row.status,
+            "last_seen": date,
+            "min": price if low is None else (low if price is None else min(low, price)),
+        }
+
+    seen = set(snapshot["sku"])
+    for sku, prev in sorted(skus.items()):
+        if sku in seen or prev_date is None or prev.get("last_seen") != prev_date:
+            continue
+        for rule in rules:
+            if rule["type"] == "disappeared" and _matches(rule, sku, prev.get("name", "")):
+                alerts.append(
+                    _alert(rule, date, sku, prev.get("name", ""), prev_price=prev.get("price"), last_seen=prev_date)
+                )
+    return alerts, {"date": date, "skus": skus}
+
+
+def _save_state(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+
+
+def post_webhook(url: str, date: str, alerts: list[dict]) -> None:
+    """POST {"date", "alerts"}; failures are reported, not fatal."""
+    try:
+        resp = requests.post(url, json={"date": date, "alerts": alerts}, timeout=10)
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Webhook POST to {url} failed: {e}")
+        return
+    print(f"Posted {len(alerts)} alert(s) to webhook")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rules", type=Path, help="JSON/YAML rules file (default: built-in rules)")
+    ap.add_argument(
+        "--webhook",
+        default=os.environ.get("ALERT_WEBHOOK_URL"),
+        help="POST each day's alerts as JSON to this URL (default: $ALERT_WEBHOOK_URL)",
+    )
+    ap.add_argument("--state", type=Path, default=STATE_PATH, help="State file (default: %(default)s)")
+    ap.add_argument(
+        "--alerts", type=Path, default=ALERTS_PATH, help="Alert log to append to (default: %(default)s)"
+    )
+    args = ap.parse_args()
+
+    rules = load_rules(args.rules) if args.rules else DEFAULT_RULES
+    snaps = sorted(
+        (SNAP_RE.match(p.name).group(1), p)
+        for p in SNAP_DIR.glob("*_pi_brand.csv")
+        if SNAP_RE.match(p.name)
+    )
+    if not snaps:
+        print("No snapshots found in data/snapshots; nothing to evaluate.")
+        return
+
+    try:
+        state = json.loads(args.state.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = _state_from_history(before=snaps[-1][0])
+    if not state.get("date"):
+        # first run with no history: nothing to compare against, so just seed
+        date, path = snaps[-1]
+        _, state = evaluate(_load_snapshot(path), date, state, rules)
+        _save_state(args.state, state)
+        print(f"Seeded {args.state} from the {date} snapshot; no alerts on a first run")
+        return
+    todo = [(d, p) for d, p in snaps if d > state["date"]]
+    if not todo:
+        print(f"Alerts are up to date (last evaluated {state['date']})")
+        return
+
+    args.alerts.parent.mkdir(parents=True, exist_ok=True)
+    total = 0
+    for date, path in todo:
+        alerts, state = evaluate(_load_snapshot(path), date, state, rules)
+        with args.alerts.open("a", encoding="utf-8") as fh:
+            for alert in alerts:
+                fh.write(json.dumps(alert, sort_keys=True) + "\n")
+        if args.webhook and alerts:
+            post_webhook(args.webhook, date, alerts)
+        total += len(alerts)
+        print(f"{date}: {len(alerts)} alert(s)")
+
+    _save_state(args.state, state)
+    print(f"Appended {total} alert(s) to {args.alerts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Maintain an append-only log of stock transitions (restocks, sell-outs, ...).
+
+Inputs:  data/snapshots/<YYYY-MM-DD>_pi_brand.csv  (only dates after the last run)
+         .scrapegoat/stock_state.json             each SKU's state and since-date
+Outputs: data/history/stock_events.csv            sku, date, from_state, to_state,
+                                                  duration_in_previous_state (days)
+         site/data/stock_events.json              events + current state per SKU
+
+States are classify.stock_status() of the row's stock and availability
+columns (an empty stock string is first derived from the availability text,
+as the scraper does): available / store_only / sold_out.
+A SKU's first sighting is not an event; SKUs missing from a snapshot keep
+their state.
+
+Daily runs only read the snapshots newer than the saved state. Without a state
+file (or with --full) the log is rebuilt in one pass, from the change-only
+interval tables when they match the merged history (see history_intervals.py)
+and from price_history.csv otherwise.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+
+import history_intervals
+from classify import stock_status
+from history_store import HIST, load_history
+
+SNAP_DIR = Path("data/snapshots")
+EVENTS_PATH = Path("data/history/stock_events.csv")
+EVENTS_JSON = Path("site/data/stock_events.json")
+STATE_PATH = Path(".scrapegoat/stock_state.json")
+SNAP_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})_pi_brand\.csv$")
+EVENT_COLUMNS = ["sku", "date", "from_state", "to_state", "duration_in_previous_state"]
+
+
+def stock_states(frame: pd.DataFrame) -> pd.Series:
+    """Normalized state for each row of a frame with stock/availability columns."""
+    stock = frame["stock"].fillna("").astype(str).str.strip()
+    avail = frame["availability"].fillna("").astype(str).str.strip()
+    pairs = pd.MultiIndex.from_arrays([stock, avail])
+    states = {(s, a): stock_status(s, a) for s, a in pairs.unique()}
+    return pd.Series([states[p] for p in pairs], index=frame.index, dtype=object)
+
+
+def _days(later: str, earlier: str) -> int:
+    return (pd.Timestamp(later) - pd.Timestamp(earlier)).days
+
+
+def rebuild(history: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Every transition in history, plus the state after its last day."""
+    df = history.loc[history["sku"].fillna("").astype(str).ne("")].copy()
+    df["sku"] = df["sku"].astype(str)
+    df["date"] = df["date"].astype(str)
+    df = df.sort_values(["sku", "date"], kind="mergesort").reset_index(drop=True)
+    if df.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS), {"date": None, "skus": {}}
+    df["state"] = stock_states(df)
+
+    new_sku = df["sku"].ne(df["sku"].shift())
+    changed = ~new_sku & df["state"].ne(df["state"].shift())
+    run = (new_sku | changed).cumsum()
+    df["since"] = df.groupby(run)["date"].transform("first")
+
+    prev = df.shift()
+    events = df.loc[changed, ["sku", "date"]].copy()
+    events["from_state"] = prev.loc[changed, "state"]
+    events["to_state"] = df.loc[changed, "state"]
+    events["duration_in_previous_state"] = (
+        pd.to_datetime(events["date"]) - pd.to_datetime(prev.loc[changed, "since"])
+    ).dt.days
+    events = events.sort_values(["date", "sku"], kind="mergesort")
+
+    last = df.groupby("sku", sort=True).tail(1)
+    skus = {
+        row.sku: {"state": row.state, "since": row.since}
+        for row in last.itertuples(index=False)
+    }
+    return events.reset_index(drop=True)[EVENT_COLUMNS], {
+        "date": df["date"].max(),
+        "skus": skus,
+    }
+
+
+def advance(snapshot: pd.DataFrame, date: str, state: dict) -> tuple[list[list], dict]:
+    """Transitions from state to one snapshot, and the state after it."""
+    skus = dict(state["skus"])
+    events = []
+    for sku, to_state in zip(snapshot["sku"], stock_states(snapshot)):
+        prev = skus.get(sku)
+        if prev is not None and prev["state"] == to_state:
+            continue
+        if prev is not None:
+            events.append(
+                [sku, date, prev["state"], to_state, _days(date, prev["since"])]
+            )
+        skus[sku] = {"state": to_state, "since": date}
+    return sorted(events), {"date": date, "skus": skus}
+
+
+def _load_snapshot(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype={"sku": str}).fillna("")
+    df["sku"] = df["sku"].astype(str).str.strip()
+    return df[df["sku"] != ""].drop_duplicates("sku", keep="first")
+
+
+def _load_state() -> dict | None:
+    try:
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _export_json(state: dict) -> None:
+    events = pd.read_csv(EVENTS_PATH, dtype={"sku": str})
+    payload = {
+        "updated": state["date"],
+        "current": state["skus"],
+        "events": events.to_dict(orient="records"),
+    }
+    EVENTS_JSON.parent.mkdir(parents=True, exist_ok=True)
+    EVENTS_JSON.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild the event log from the merged history",
+    )
+    args = ap.parse_args()
+
+    state = None if args.full else _load_state()
+    if state is None or not EVENTS_PATH.exists():
+        if not HIST.exists():
+            raise SystemExit("History file not found. Run 10_merge_history.py first.")
+        if history_intervals.is_fresh():
+            history = history_intervals.load_daily(attributes=False)
+        else:
+            history = load_history(["date", "sku", "stock", "availability"], parse_dates=False)
+        events, state = rebuild(history)
+        EVENTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        events.to_csv(EVENTS_PATH, index=False)
+        mode = f"rebuilt from history ({len(events)} events)"
+    else:
+        added = []
+        for snap in sorted(SNAP_DIR.glob("*_pi_brand.csv")):
+            match = SNAP_RE.match(snap.name)
+            if not match or match.group(1) <= (state["date"] or ""):
+                continue
+            events, state = advance(_load_snapshot(snap), match.group(1), state)
+            added += events
+        if added:
+            pd.DataFrame(added, columns=EVENT_COLUMNS).to_csv(
+                EVENTS_PATH, mode="a", header=False, index=False
+            )
+        mode = f"{len(added)} new events"
+
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+    _export_json(state)
+    print(f"Updated {EVENTS_PATH} ({mode}) and wrote {EVENTS_JSON}")
+
+
+if __name__ == "__main__":
+    main()
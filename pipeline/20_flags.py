@@ -3,67 +3,274 @@
 Add sale/low-price flags to history and emit a filtered flags file.
 - is_sale: price <= 95% of 30-row median AND at least $1 off that median
 - is_low : price equals new cumulative minimum for the SKU
+
+Flags are computed for the whole frame at once (groupby-rolling per SKU).
+After each run the per-SKU state needed to continue — the last 30 days of
+prices, the running minimum and the last flagged date — is saved to
+.scrapegoat/flags_state.json, with the size and sha256 of price_history.csv
+and price_flags.csv as written. The merge appends new dates to the end of the
+CSV, so the next run reads only the bytes after the flagged part, flags those
+rows from the saved state, and rewrites just that tail of both files (new
+flagged rows are appended to price_flags.csv). It falls back to loading and
+rewriting everything with --full, when the state is missing, when either
+file's flagged part no longer matches its fingerprint (e.g. the merge rebuilt
+the history), or when a new row predates its SKU's last flagged date (a
+backfill).
 """
 
 from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import io
+import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
-HIST = Path("data/history/price_history.csv")
-OUT = Path("data/history/price_flags.csv")
+import history_db
+from history_store import HIST, load_history, write_history
 
+OUT = Path("data/history/price_flags.csv")
+STATE_PATH = Path(".scrapegoat/flags_state.json")
+WINDOW = pd.Timedelta(days=30)
+FLAG_COLUMNS = ["rolling_median", "ever_min", "is_sale", "is_low", "pct_off"]
 
-def main() -> None:
-    if not HIST.exists():
-        raise SystemExit("History file not found. Run 10_merge_history.py first.")
 
-    df = pd.read_csv(HIST, dtype={"sku": str})
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop rows without a SKU or a parseable date; add the parsed date."""
+    df = df.loc[df["sku"].notna()].copy()
+    df["sku"] = df["sku"].astype(str)
     df["price"] = pd.to_numeric(df["price"], errors="coerce")
     df["date"] = df["date"].astype(str)
+    df["_dt"] = pd.to_datetime(df["date"], errors="coerce")
+    return df.loc[df["_dt"].notna()]
+
 
-    def per_sku(sku: str, g: pd.DataFrame) -> pd.DataFrame:
-        g = g.copy()
-        g["sku"] = str(sku)
-        g["date_dt"] = pd.to_datetime(g["date"], errors="coerce")
-        g = g.loc[g["date_dt"].notna()].sort_values("date_dt")
-        if g.empty:
-            return g.drop(columns=["date_dt"])
-
-        g = g.set_index("date_dt")
-        g["rolling_median"] = g["price"].rolling("30D", min_periods=3).median()
-        g["ever_min"] = g["price"].cummin()
-        # sale flag
-        g["is_sale"] = (
-            g["rolling_median"].notna()
-            & (g["price"] <= g["rolling_median"] * 0.95)
-            & ((g["rolling_median"] - g["price"]) >= 1.0)
+def _flags(frame: pd.DataFrame, prior_min: pd.Series | None = None) -> pd.DataFrame:
+    """
+    Flag columns for frame (sku, _dt, price), indexed like it. prior_min holds
+    each SKU's running minimum from rows outside the frame, if any.
+    """
+    frame = frame.sort_values(["sku", "_dt"], kind="mergesort")
+    by_sku = frame.set_index("_dt").groupby("sku", sort=False)["price"]
+    median = pd.Series(
+        by_sku.rolling("30D", min_periods=3).median().to_numpy(), index=frame.index
+    )
+    ever_min = frame.groupby("sku", sort=False)["price"].cummin()
+    if prior_min is not None:
+        seed = frame["sku"].map(prior_min).astype(float)
+        ever_min = pd.Series(np.fmin(ever_min, seed), index=frame.index).where(
+            frame["price"].notna()
         )
-        # all-time low
-        g["is_low"] = g["price"] <= g["ever_min"]
-        # pct off vs median (non-negative)
-        denom = g["rolling_median"].where(g["rolling_median"] > 0)
-        pct = (1.0 - g["price"] / denom).clip(lower=0)
-        pct = pct.where(denom.notna())
-        g["pct_off"] = pct.round(3)
-        g = g.reset_index().rename(columns={"date_dt": "date_dt"})
-        g = g.drop(columns=["date_dt"])
-        return g
-
-    processed = []
-    for sku, group in df.groupby("sku"):
-        processed_df = per_sku(sku, group)
-        if not processed_df.empty:
-            processed.append(processed_df)
-    if processed:
-        df = pd.concat(processed, ignore_index=True)
+    price = frame["price"]
+
+    out = pd.DataFrame(index=frame.index)
+    out["rolling_median"] = median
+    out["ever_min"] = ever_min
+    out["is_sale"] = median.notna() & (price <= median * 0.95) & ((median - price) >= 1.0)
+    out["is_low"] = price <= ever_min
+    denom = median.where(median > 0)
+    pct = (1.0 - price / denom).clip(lower=0)
+    out["pct_off"] = pct.where(denom.notna()).round(3)
+    return out
+
+
+def _full(df: pd.DataFrame) -> pd.DataFrame:
+    df = _prepare(df)
+    flags = _flags(df)
+    for col in FLAG_COLUMNS:
+        df[col] = flags[col]
+    return df
+
+
+def _load_state() -> dict | None:
+    try:
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _state_rows(state: dict) -> pd.DataFrame:
+    rows = [
+        (sku, date, price)
+        for sku, st in state["skus"].items()
+        for date, price in st["window"]
+    ]
+    frame = pd.DataFrame(rows, columns=["sku", "date", "price"])
+    frame["price"] = frame["price"].astype(float)
+    frame["_dt"] = pd.to_datetime(frame["date"], format="%Y-%m-%d")
+    return frame
+
+
+def _prefix_hash(path: Path, size: int):
+    """sha256 object over the first size bytes of path; None if it is shorter."""
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        while size:
+            block = fh.read(min(size, 1 << 20))
+            if not block:
+                return None
+            digest.update(block)
+            size -= len(block)
+    return digest
+
+
+def _fingerprint(path: Path) -> dict:
+    size = path.stat().st_size
+    return {"bytes": size, "sha256": _prefix_hash(path, size).hexdigest()}
+
+
+def _read_tail(state: dict):
+    """
+    (rows after the flagged part of the history, sha256 object of that part),
+    or None when either file no longer starts with what the last run wrote.
+    """
+    saved = state.get("history")
+    if not saved or not OUT.exists() or _fingerprint(OUT) != state.get("flags"):
+        return None
+    digest = _prefix_hash(HIST, saved["bytes"])
+    if digest is None or digest.hexdigest() != saved["sha256"]:
+        return None
+    with HIST.open("rb") as fh:
+        header = fh.readline()
+        fh.seek(saved["bytes"])
+        body = fh.read()
+    # as text: the rows go back out exactly as the merge wrote them
+    return pd.read_csv(io.BytesIO(header + body), dtype=str), digest
+
+
+def _rewrite_tail(path: Path, offset: int, rows: pd.DataFrame, digest) -> dict:
+    """Replace everything after offset with rows; returns the new fingerprint."""
+    with path.open("r+b") as fh:
+        header = next(csv.reader([fh.readline().decode("utf-8")]))
+        data = rows.reindex(columns=header).to_csv(header=False, index=False).encode("utf-8")
+        fh.seek(offset)
+        fh.truncate()
+        fh.write(data)
+    digest.update(data)
+    return {"bytes": offset + len(data), "sha256": digest.hexdigest()}
+
+
+def _incremental(tail: pd.DataFrame, state: dict) -> pd.DataFrame | None:
+    """Flag the unflagged tail rows from the saved state; None means run in full."""
+    if "is_sale" not in tail or tail["is_sale"].notna().any():
+        return None
+    fresh = _prepare(tail)
+    if fresh.empty:
+        return fresh
+    last = pd.to_datetime(
+        fresh["sku"].map({sku: st["last_date"] for sku, st in state["skus"].items()}),
+        format="%Y-%m-%d",
+    )
+    if (fresh["_dt"] <= last).any():
+        return None
+
+    touched = set(fresh["sku"])
+    context = _state_rows(
+        {"skus": {sku: st for sku, st in state["skus"].items() if sku in touched}}
+    )
+    prior_min = pd.Series(
+        {sku: st["min"] for sku, st in state["skus"].items() if sku in touched},
+        dtype=float,
+    )
+    frame = pd.concat(
+        [context[["sku", "_dt", "price"]], fresh[["sku", "_dt", "price"]]],
+        ignore_index=False,
+        keys=["ctx", "new"],
+    )
+    flags = _flags(frame, prior_min).loc["new"]
+    for col in FLAG_COLUMNS:
+        fresh[col] = flags[col]
+    return fresh
+
+
+def _next_state(df: pd.DataFrame, state: dict | None) -> dict:
+    """
+    Per-SKU state after this run. With a previous state, df holds only the
+    rows just flagged and only the SKUs among them are rebuilt.
+    """
+    skus = {} if state is None else dict(state["skus"])
+    if state is None:
+        frame = df[["sku", "_dt", "price"]]
     else:
-        df = df.iloc[0:0].copy()
-    df = df.sort_values(["sku", "date"])
-    df.to_csv(HIST, index=False)
+        touched = set(df["sku"])
+        ctx = _state_rows({"skus": {s: skus[s] for s in touched if s in skus}})
+        frame = pd.concat(
+            [ctx[["sku", "_dt", "price"]], df[["sku", "_dt", "price"]]],
+            ignore_index=True,
+        )
+    last = frame.groupby("sku")["_dt"].transform("max")
+    window = frame.loc[frame["_dt"] > last - WINDOW].sort_values(
+        ["sku", "_dt"], kind="mergesort"
+    )
+    mins = frame.groupby("sku")["price"].min()
+    for sku, group in window.groupby("sku", sort=False):
+        prev_min = skus.get(sku, {}).get("min")
+        low = mins.get(sku)
+        if prev_min is not None and not (pd.notna(low) and low < prev_min):
+            low = prev_min
+        skus[sku] = {
+            "last_date": group["_dt"].iloc[-1].strftime("%Y-%m-%d"),
+            "min": None if pd.isna(low) else float(low),
+            "window": [
+                [d.strftime("%Y-%m-%d"), None if pd.isna(p) else float(p)]
+                for d, p in zip(group["_dt"], group["price"])
+            ],
+        }
+    return {"skus": skus}
+
+
+def _flagged(df: pd.DataFrame) -> pd.DataFrame:
+    return df[(df["is_sale"] == True) | (df["is_low"] == True)]
 
-    flags = df[(df["is_sale"] == True) | (df["is_low"] == True)].copy()
-    flags.to_csv(OUT, index=False)
-    print(f"Updated {HIST} and wrote {OUT} with {len(flags)} flagged rows")
+
+def _save_state(state: dict) -> None:
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--full",
+        action="store_true",
+        help="Recompute every flag instead of only rows added since the last run",
+    )
+    args = ap.parse_args()
+
+    if not HIST.exists():
+        raise SystemExit("History file not found. Run 10_merge_history.py first.")
+
+    state = None if args.full else _load_state()
+    tail = None if state is None else _read_tail(state)
+    fresh = None if tail is None else _incremental(tail[0], state)
+
+    if fresh is None:
+        df = _full(load_history(parse_dates=False))
+        next_state = _next_state(df, None)
+        db_rows = df
+        df = df.drop(columns=["_dt"]).sort_values(["date", "sku"], kind="mergesort")
+        write_history(df)
+        flags = _flagged(df)
+        flags.to_csv(OUT, index=False)
+        next_state["history"] = _fingerprint(HIST)
+        next_state["flags"] = _fingerprint(OUT)
+        done = f"Updated {HIST} (all rows) and wrote {OUT} with {len(flags)} flagged rows"
+    else:
+        next_state = _next_state(fresh, state)
+        db_rows = fresh
+        rows = fresh.drop(columns=["_dt"]).sort_values(["date", "sku"], kind="mergesort")
+        next_state["history"] = _rewrite_tail(HIST, state["history"]["bytes"], rows, tail[1])
+        HIST.with_suffix(".parquet").unlink(missing_ok=True)
+        flags = _flagged(rows)
+        offset = state["flags"]["bytes"]
+        next_state["flags"] = _rewrite_tail(OUT, offset, flags, _prefix_hash(OUT, offset))
+        done = f"Updated {HIST} ({len(rows)} new rows) and appended {len(flags)} flagged rows to {OUT}"
+    _save_state(next_state)
+    if history_db.DB_PATH.exists():
+        history_db.sync(db_rows.drop(columns=["_dt"]), HIST, update=("is_sale", "is_low"))
+    print(done)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Multi-window price statistics per SKU.
+
+Inputs:  data/history/price_history.csv
+Outputs: data/history/price_stats.csv  one row per SKU (see price_stats.py)
+         site/data/stats.json          same numbers keyed by SKU and window
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+
+from history_store import HIST, load_history
+from price_stats import (
+    PERCENTILES,
+    STATS_JSON,
+    STATS_PATH,
+    WINDOWS,
+    compute_stats,
+    to_json_payload,
+)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--windows",
+        type=_int_list,
+        default=list(WINDOWS),
+        help="Comma-separated window lengths in days (default: %(default)s)",
+    )
+    ap.add_argument(
+        "--percentiles",
+        type=_int_list,
+        default=list(PERCENTILES),
+        help="Comma-separated percentiles per window (default: %(default)s)",
+    )
+    args = ap.parse_args()
+
+    if not HIST.exists():
+        raise SystemExit("History file not found. Run 10_merge_history.py first.")
+    df = load_history(["date", "sku", "price"], parse_dates=False)
+    stats = compute_stats(df, args.windows, args.percentiles)
+
+    stats.to_csv(STATS_PATH, index=False)
+    STATS_JSON.parent.mkdir(parents=True, exist_ok=True)
+    STATS_JSON.write_text(
+        json.dumps(to_json_payload(stats, args.windows), indent=2), encoding="utf-8"
+    )
+    print(f"Wrote {STATS_PATH} and {STATS_JSON} for {len(stats)} SKUs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,70 @@
 #!/usr/bin/env python3
 """
 Export history into JSON bundles consumed by the website frontend:
-- latest.json: most recent row per SKU
+- latest.json: most recent row per SKU (from latest_table.py when it is fresh)
+  plus its 30-day median and 90/365-day lows and highs from price_stats.csv
+  (22_stats.py; null until that has run)
 - index.json: SKU/name directory for dropdowns
 - sbc_matrix.json: model × memory board matrix
-- history/<SKU>.json: per-SKU time series for charts
+- history/<SKU>.json: per-SKU time series for charts (version 1)
+- history_compact/<SKU>.json[.gz|.br]: the same series as parallel arrays
+  (version 2, see _compact_payload), precompressed for static serving
+- history_rollup/<SKU>.week.json, <SKU>.month.json (+ .gz/.br): open/close/
+  min/max buckets (see history_rollup.py) for long-range charts
+- history_bundle.ndjson + history_bundle.index.json (--bundle): every v2
+  history as one line of a single file, and SKU -> [offset, length] so one
+  SKU is one file seek or one HTTP Range request
+
+history_manifest.json, history_compact_manifest.json and
+history_rollup_manifest.json record the sha256 of every history file written. A file is only rewritten when its content
+changes, and only files whose SKU left the history are deleted, so unchanged
+SKUs keep their bytes and mtime (no git churn, rsync/CDN caches stay valid).
+--full rewrites every file. --history-format picks which versions to write.
+Files are rendered from column arrays in one sorted pass and written on a
+small thread pool.
+.br siblings need the optional `brotli` package and are skipped without it.
 """
 
 from __future__ import annotations
 
+import argparse
+import gzip
+import hashlib
 import json
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-HIST = Path("data/history/price_history.csv")
+import history_db
+import latest_table
+from history_rollup import (
+    FLAG_LOW,
+    FLAG_SALE,
+    RESOLUTIONS,
+    downsample,
+    flag_values,
+    price_values,
+)
+from history_store import HIST, load_history
+from price_stats import STATS_PATH, load_stats
+
 OUT = Path("site/data")
 HISTORY_OUT = OUT / "history"
+HISTORY_MANIFEST = OUT / "history_manifest.json"
+COMPACT_OUT = OUT / "history_compact"
+COMPACT_MANIFEST = OUT / "history_compact_manifest.json"
+ROLLUP_OUT = OUT / "history_rollup"
+ROLLUP_MANIFEST = OUT / "history_rollup_manifest.json"
+BUNDLE_PATH = OUT / "history_bundle.ndjson"
+BUNDLE_INDEX = OUT / "history_bundle.index.json"
+COMPACT_VERSION = 2
+WRITE_THREADS = 8
 BOARD_MODELS = ["Pi 3", "Pi 4", "Pi 5", "Pi 500", "Pi 500+"]
+LATEST_STATS = ["median_30d", "min_90d", "max_90d", "min_365d", "max_365d"]
 
 
 def _slugify_filename(value: str) -> str:
@@ -33,19 +79,67 @@ def _slugify_filename(value: str) -> str:
 def _ensure_dirs() -> None:
     OUT.mkdir(parents=True, exist_ok=True)
     HISTORY_OUT.mkdir(parents=True, exist_ok=True)
-    for old in HISTORY_OUT.glob("*.json"):
-        old.unlink()
+    COMPACT_OUT.mkdir(parents=True, exist_ok=True)
+    ROLLUP_OUT.mkdir(parents=True, exist_ok=True)
+
+
+def _load_history_manifest(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def _write_history_manifest(path: Path, hashes: dict[str, str]) -> None:
+    path.write_text(
+        json.dumps({"files": hashes}, indent=2, sort_keys=True) + "\n",
+        encoding="utf-8",
+    )
 
 
 def _load_history() -> pd.DataFrame:
     if not HIST.exists():
         raise SystemExit("History file not found. Run 10_merge_history.py first.")
-    df = pd.read_csv(HIST, dtype={"sku": str}, parse_dates=["date"])
+    df = load_history(
+        [
+            "date",
+            "sku",
+            "name",
+            "url",
+            "price",
+            "stock",
+            "availability",
+            "model",
+            "memory_gb",
+            "brand",
+            "is_sale",
+            "is_low",
+        ]
+    )
     if df.empty:
         raise SystemExit("History is empty.")
     return df
 
 
+def _latest_from_db() -> pd.DataFrame | None:
+    conn = history_db.open_if_fresh(HIST)
+    if conn is None:
+        return None
+    try:
+        latest = history_db.latest_rows(conn)
+    finally:
+        conn.close()
+    return latest if not latest.empty else None
+
+
+def _latest_stats(skus: pd.Series) -> pd.DataFrame:
+    """The LATEST_STATS columns of price_stats.csv for skus (NaN where missing)."""
+    if not STATS_PATH.exists():
+        return pd.DataFrame(np.nan, index=skus.index, columns=LATEST_STATS)
+    stats = load_stats().reindex(columns=LATEST_STATS)
+    return stats.reindex(skus.astype(str).to_numpy()).set_index(skus.index)
+
+
 def _export_latest(latest: pd.DataFrame) -> None:
     cols = [
         "sku",
@@ -60,6 +154,7 @@ def _export_latest(latest: pd.DataFrame) -> None:
     ]
     latest_out = latest[cols].copy()
     latest_out["price"] = pd.to_numeric(latest_out["price"], errors="coerce").round(2)
+    latest_out = latest_out.join(_latest_stats(latest_out["sku"]))
     latest_out.to_json(OUT / "latest.json", orient="records", indent=2)
 
     idx_rows = latest[["sku", "name"]].sort_values("name").reset_index(drop=True)
@@ -79,15 +174,11 @@ def _export_matrix(latest: pd.DataFrame) -> None:
         )
         cols = [c for c in pivot.columns if pd.notna(c)]
         rows = list(pivot.index)
-        values = []
-        for _, row in pivot.iterrows():
-            ordered = row.reindex(cols)
-            values.append(
-                [
-                    None if pd.isna(val) else round(float(val), 2)
-                    for val in ordered
-                ]
-            )
+        grid = pivot.reindex(columns=cols).to_numpy(dtype=float)
+        values = [
+            [None if np.isnan(val) else round(val, 2) for val in row]
+            for row in grid.tolist()
+        ]
         matrix = {"rows": rows, "cols": cols, "values": values}
 
     (OUT / "sbc_matrix.json").write_text(
@@ -95,49 +186,307 @@ def _export_matrix(latest: pd.DataFrame) -> None:
     )
 
 
-def _export_histories(df: pd.DataFrame) -> None:
-    for sku, group in df.sort_values("date").groupby("sku"):
-        group = group.reset_index(drop=True)
-        series = []
-        for _, row in group.iterrows():
-            price = pd.to_numeric(row.get("price"), errors="coerce")
-            if pd.isna(price):
-                continue
-            dt = row["date"]
-            date_str = dt.strftime("%Y-%m-%d") if hasattr(dt, "strftime") else str(dt)
-            series.append(
-                {
-                    "date": date_str,
-                    "price": round(float(price), 2),
-                    "is_sale": bool(row.get("is_sale", False)),
-                    "is_low": bool(row.get("is_low", False)),
-                }
-            )
-        if not series:
-            continue
-        if "name" in group and group["name"].notna().any():
-            name = group["name"].dropna().iloc[-1]
+def _date_strings(dates: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    return dates.astype(str).to_numpy(dtype=object)
+
+
+def _sku_bounds(skus: np.ndarray) -> np.ndarray:
+    """Start offsets of each run of equal SKUs, plus the end offset."""
+    return np.flatnonzero(np.r_[True, skus[1:] != skus[:-1], True])
+
+
+def _flags(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Flag column as bools (missing column or value: False)."""
+    if col not in df:
+        return np.zeros(len(df), dtype=bool)
+    return flag_values(df[col])
+
+
+def _export_histories(df: pd.DataFrame):
+    """
+    Yield (filename, bytes) of the version-1 file for every SKU with a price:
+    {"sku", "name", "series": [{"date", "price", "is_sale", "is_low"}, ...]}.
+    df must be sorted by (sku, date). Every column is converted to a list
+    once; each SKU's series is built from slices of those lists.
+    """
+    df = df.loc[df["sku"].notna()]
+    names = _names(df)
+    price = price_values(df["price"])
+    keep = price.notna().to_numpy()
+    skus = df["sku"].to_numpy()[keep]
+    columns = {
+        "date": _date_strings(df["date"])[keep].tolist(),
+        "price": [round(p, 2) for p in price.to_numpy()[keep].tolist()],
+        "is_sale": _flags(df, "is_sale")[keep].tolist(),
+        "is_low": _flags(df, "is_low")[keep].tolist(),
+    }
+    bounds = _sku_bounds(skus)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        sku = skus[lo]
+        series = [
+            dict(zip(columns, point))
+            for point in zip(*(values[lo:hi] for values in columns.values()))
+        ]
+        payload = {"sku": str(sku), "name": names.get(sku, sku), "series": series}
+        data = json.dumps(payload, indent=2).encode("utf-8")
+        yield f"{_slugify_filename(str(sku))}.json", data
+
+
+def _compact_payload(sku: str, name: str, days: np.ndarray, prices: np.ndarray, flags: np.ndarray) -> dict:
+    """
+    Version-2 history: start date plus parallel arrays. `days` holds the gap
+    in days to the previous point (0 for the first), `flags` a bitmask of
+    FLAG_SALE | FLAG_LOW.
+    """
+    return {
+        "version": COMPACT_VERSION,
+        "sku": sku,
+        "name": name,
+        "start": str(days[0].astype("datetime64[D]")),
+        "days": np.diff(days, prepend=days[0]).tolist(),
+        "prices": prices.tolist(),
+        "flags": flags.tolist(),
+    }
+
+
+def _names(df: pd.DataFrame) -> pd.Series:
+    """Last non-null name per SKU (df sorted by date within each SKU)."""
+    return df.dropna(subset=["name"]).groupby("sku")["name"].last()
+
+
+def _with_siblings(filename: str, data: bytes, brotli):
+    """(filename, data) plus its precompressed .gz (and .br) copies."""
+    yield filename, data
+    yield f"{filename}.gz", gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield f"{filename}.br", brotli.compress(data, quality=11)
+
+
+def _import_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class _Bundle:
+    """
+    Collects v2 payloads into BUNDLE_PATH (one JSON document per line) and
+    records each SKU's byte offset and length (without the newline) in
+    BUNDLE_INDEX. Written to temp files and only swapped in when the bundle
+    bytes changed.
+    """
+
+    def __init__(self) -> None:
+        self.tmp = BUNDLE_PATH.with_suffix(".ndjson.tmp")
+        self.fh = self.tmp.open("wb")
+        self.index: dict[str, list[int]] = {}
+        self.digest = hashlib.sha256()
+        self.offset = 0
+
+    def add(self, sku: str, data: bytes) -> None:
+        self.index[sku] = [self.offset, len(data)]
+        line = data + b"\n"
+        self.fh.write(line)
+        self.digest.update(line)
+        self.offset += len(line)
+
+    def close(self) -> bool:
+        """Finish the bundle; returns True if it changed on disk."""
+        self.fh.close()
+        old = BUNDLE_PATH.read_bytes() if BUNDLE_PATH.exists() else None
+        changed = old is None or hashlib.sha256(old).digest() != self.digest.digest()
+        if changed:
+            self.tmp.replace(BUNDLE_PATH)
         else:
-            name = sku
-        payload = {"sku": str(sku), "name": name, "series": series}
-        filename = _slugify_filename(str(sku))
-        (HISTORY_OUT / f"{filename}.json").write_text(
-            json.dumps(payload, indent=2), encoding="utf-8"
+            self.tmp.unlink()
+        BUNDLE_INDEX.write_text(
+            json.dumps(
+                {
+                    "version": COMPACT_VERSION,
+                    "bundle": BUNDLE_PATH.name,
+                    "size": self.offset,
+                    "skus": self.index,
+                },
+                separators=(",", ":"),
+            ),
+            encoding="utf-8",
+        )
+        return changed
+
+
+def _export_compact(df: pd.DataFrame, bundle: _Bundle | None = None):
+    """
+    Yield (filename, bytes) of each version-2 file and its .gz/.br siblings,
+    adding each payload to bundle as well when given.
+    df must be sorted by (sku, date).
+    """
+    brotli = _import_brotli()
+    df = df.loc[df["sku"].notna()]
+    names = _names(df)
+    price = price_values(df["price"])
+    df = df.loc[price.notna()].assign(price=price.round(2))
+    days = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]").astype(np.int64)
+    flags = _flags(df, "is_sale") * FLAG_SALE | _flags(df, "is_low") * FLAG_LOW
+    prices = df["price"].to_numpy()
+    skus = df["sku"].to_numpy()
+    bounds = _sku_bounds(skus)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        sku = skus[lo]
+        payload = _compact_payload(
+            str(sku), names.get(sku, sku), days[lo:hi], prices[lo:hi], flags[lo:hi]
         )
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        if bundle is not None:
+            bundle.add(str(sku), data)
+        yield from _with_siblings(f"{_slugify_filename(str(sku))}.json", data, brotli)
+
+
+def _export_rollups(df: pd.DataFrame):
+    """
+    Yield (filename, bytes) of each SKU's <SKU>.week.json / <SKU>.month.json
+    and their siblings:
+    {"version", "sku", "name", "resolution", "first", "last",
+     "period", "open", "close", "min", "max", "flags"}
+    with one array entry per bucket. first/last bound the daily series, so a
+    consumer can read the small monthly file and then decide whether it
+    needs the weekly or daily one.
+    df must be sorted by (sku, date).
+    """
+    brotli = _import_brotli()
+    df = df.loc[df["sku"].notna(), ["sku", "date", "name", "price", "is_sale", "is_low"]]
+    names = _names(df)
+    priced = df.loc[price_values(df["price"]).notna()]
+    span = pd.to_datetime(priced["date"]).groupby(priced["sku"]).agg(["first", "last"])
+    first = span["first"].dt.strftime("%Y-%m-%d")
+    last = span["last"].dt.strftime("%Y-%m-%d")
+
+    for resolution in RESOLUTIONS:
+        table = downsample(df, resolution)
+        money = ["open", "close", "min", "max"]
+        table[money] = table[money].round(2)
+        columns = {col: table[col].tolist() for col in ["period", *money, "flags"]}
+        skus = table["sku"].to_numpy()
+        bounds = _sku_bounds(skus)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            sku = skus[lo]
+            payload = {
+                "version": COMPACT_VERSION,
+                "sku": str(sku),
+                "name": names.get(sku, sku),
+                "resolution": resolution,
+                "first": first[sku],
+                "last": last[sku],
+            }
+            payload.update({col: values[lo:hi] for col, values in columns.items()})
+            data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            filename = f"{_slugify_filename(str(sku))}.{resolution}.json"
+            yield from _with_siblings(filename, data, brotli)
+
+
+def _sync_histories(
+    out_dir: Path, manifest: Path, files, pattern: str = "*.json", full: bool = False
+) -> tuple[int, int, int]:
+    """
+    Write (filename, bytes) pairs under out_dir, skipping files whose hash
+    matches the manifest, then delete files matching pattern that were not
+    produced. Returns (written, skipped, deleted).
+    """
+    known = {} if full else _load_history_manifest(manifest)
+    hashes: dict[str, str] = {}
+    written = skipped = 0
+    pending: deque = deque()
+    with ThreadPoolExecutor(max_workers=WRITE_THREADS) as pool:
+        for filename, data in files:
+            digest = hashlib.sha256(data).hexdigest()
+            hashes[filename] = digest
+            path = out_dir / filename
+            if known.get(filename) == digest and path.exists():
+                skipped += 1
+                continue
+            # bounded queue: a handful of files in flight, not the whole export
+            if len(pending) >= WRITE_THREADS * 8:
+                pending.popleft().result()
+            pending.append(pool.submit(path.write_bytes, data))
+            written += 1
+        for future in pending:
+            future.result()
+
+    deleted = 0
+    for old in out_dir.glob(pattern):
+        if old.name not in hashes:
+            old.unlink()
+            deleted += 1
+    _write_history_manifest(manifest, hashes)
+    return written, skipped, deleted
 
 
 def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--full",
+        action="store_true",
+        help="Rewrite every history file instead of only changed ones",
+    )
+    ap.add_argument(
+        "--history-format",
+        choices=["v1", "v2", "both"],
+        default="both",
+        help=(
+            "Per-SKU history files to write: v1 (history/), "
+            "v2 (history_compact/ + history_rollup/) or both"
+        ),
+    )
+    ap.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Also write history_bundle.ndjson + .index.json (needs v2 output)",
+    )
+    args = ap.parse_args()
+    if args.bundle and args.history_format == "v1":
+        raise SystemExit("--bundle packs the v2 histories; use --history-format v2 or both")
+
     _ensure_dirs()
     df = _load_history()
-    df = df.sort_values("date").reset_index(drop=True)
+    # one sort serves the latest-row lookup and every per-SKU export
+    df = df.sort_values(["sku", "date"], kind="mergesort").reset_index(drop=True)
 
-    idx = df.groupby("sku")["date"].idxmax()
-    latest = df.loc[idx].copy()
+    latest = latest_table.load()
+    if latest is None:
+        latest = _latest_from_db()
+    if latest is None:
+        idx = df.groupby("sku")["date"].idxmax()
+        latest = df.loc[idx].copy()
 
     _export_latest(latest)
     _export_matrix(latest)
-    _export_histories(df)
-    print(f"Exported JSON to {OUT}/")
+    summary = []
+    if args.history_format in ("v1", "both"):
+        counts = _sync_histories(
+            HISTORY_OUT, HISTORY_MANIFEST, _export_histories(df), full=args.full
+        )
+        summary.append(("histories", counts))
+    if args.history_format in ("v2", "both"):
+        bundle = _Bundle() if args.bundle else None
+        counts = _sync_histories(
+            COMPACT_OUT, COMPACT_MANIFEST, _export_compact(df, bundle), "*.json*", full=args.full
+        )
+        summary.append(("compact", counts))
+        if bundle is not None:
+            changed = bundle.close()
+            summary.append(("bundle", (int(changed), int(not changed), 0)))
+        counts = _sync_histories(
+            ROLLUP_OUT, ROLLUP_MANIFEST, _export_rollups(df), "*.json*", full=args.full
+        )
+        summary.append(("rollup", counts))
+    details = "; ".join(
+        f"{label}: {w} written, {s} unchanged, {d} deleted"
+        for label, (w, s, d) in summary
+    )
+    print(f"Exported JSON to {OUT}/ ({details})")
 
 
 if __name__ == "__main__":
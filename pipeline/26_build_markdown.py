@@ -7,13 +7,16 @@ Outputs: site/markdown/raspberry_pi.md
 from __future__ import annotations
 
 import math
-import re
 from pathlib import Path
 from typing import Iterable, Optional
 
 import pandas as pd
 
-HIST = Path("data/history/price_history.csv")
+import history_db
+import latest_table
+from classify import ACCESSORY_KEYWORDS, availability_status, classify_names
+from history_store import HIST, load_history
+
 OUT = Path("site/markdown/raspberry_pi.md")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
@@ -38,69 +41,18 @@ MEMORY_ORDER = [
     ("16GB", 16),
 ]
 
-ACCESSORY_KEYWORDS = [
-    ("Cameras", ("camera", "imager")),
-    ("Cases", ("case", "enclosure", "shell")),
-    ("Kits", ("kit", "starter", "bundle", "set")),
-    ("Cooling", ("fan", "heat sink", "heatsink", "cooling")),
-    ("Displays", ("display", "screen", "monitor", "touchscreen")),
-    ("Storage", ("micro sd", "sd card", "storage", "ssd", "flash drive")),
-    ("Networking", ("poe", "ethernet", "network", "wifi", "wi-fi", "wireless")),
-    ("Audio", ("speaker", "audio", "microphone")),
-    ("Robotics", ("robot", "servo", "motor")),
-    ("Sensors", ("sensor", "temperature", "humidity", "accelerometer")),
-    ("Controllers", ("controller", "gamepad", "joystick")),
-]
-
 
 def _load_history() -> pd.DataFrame:
     if not HIST.exists():
         raise SystemExit("History file not found. Run 10_merge_history.py first.")
-    df = pd.read_csv(HIST, dtype={"sku": str}, parse_dates=["date"])
+    df = load_history(
+        ["date", "sku", "name", "url", "price", "stock", "availability", "memory_gb"]
+    )
     if df.empty:
         raise SystemExit("History is empty.")
     return df
 
 
-def _classify_board(name: str) -> Optional[str]:
-    n = (name or "").lower()
-    patterns = [
-        ("Zero 2 W", r"zero\s*2\s*w"),
-        ("Zero W", r"zero\s*w"),
-        ("Pi 3A+", r"pi\s*3\s*(model\s*)?a\+"),
-        ("Pi 3B+", r"pi\s*3\s*(model\s*)?b\+"),
-        ("Pi 4B", r"pi\s*4(?!00)\s*(model\s*)?b"),
-        ("Pi 5", r"pi\s*5(?!00)"),
-        ("Pi 400", r"pi\s*400"),
-        ("Pi 500", r"pi\s*500\b"),
-        ("Pi 500+", r"pi\s*500\+"),
-    ]
-    for label, pattern in patterns:
-        if re.search(pattern, n):
-            return label
-    return None
-
-
-def _availability_status(stock: str, availability: str) -> str:
-    combined = f"{stock or ''} {availability or ''}".lower()
-    if any(keyword in combined for keyword in ("sold out", "out of stock")):
-        return "sold_out"
-    if any(
-        keyword in combined
-        for keyword in (
-            "in-store",
-            "instore",
-            "buy in store",
-            "pickup",
-            "in store only",
-            "store only",
-            "call store",
-        )
-    ):
-        return "store_only"
-    return "available"
-
-
 def _format_price_markdown(record: Optional[dict[str, object]], link_url: bool = False) -> str:
     if not record:
         return "x"
@@ -129,20 +81,11 @@ def _price_record_from_row(row: pd.Series) -> Optional[dict[str, object]]:
         return None
     return {
         "price": float(price),
-        "status": _availability_status(row.get("stock", ""), row.get("availability", "")),
+        "status": availability_status(row.get("stock", ""), row.get("availability", "")),
         "url": row.get("url"),
     }
 
 
-def _memory_from_name(name: str) -> float:
-    m = re.search(r"(512|1|2|4|8|16)\s*(GB|MB)", str(name), re.I)
-    if not m:
-        return math.nan
-    value = float(m.group(1))
-    unit = m.group(2).lower()
-    return value / 1024 if unit == "mb" else value
-
-
 def _memory_label(val: Optional[float]) -> Optional[str]:
     if val is None:
         return None
@@ -159,16 +102,14 @@ def _memory_label(val: Optional[float]) -> Optional[str]:
 
 
 def _build_board_tables(latest: pd.DataFrame) -> tuple[list[str], bool]:
-    boards = latest.copy()
-    boards["board"] = boards["name"].map(_classify_board)
-    boards = boards[boards["board"].notna()]
+    boards = latest[latest["board"].notna()].copy()
     if boards.empty:
         return ["No Raspberry Pi boards found.\n"], False
 
     boards["memory_val"] = pd.to_numeric(boards["memory_gb"], errors="coerce")
     missing = boards["memory_val"].isna()
     if missing.any():
-        boards.loc[missing, "memory_val"] = boards.loc[missing, "name"].map(_memory_from_name)
+        boards.loc[missing, "memory_val"] = boards.loc[missing, "memory"]
     boards["memory_label"] = boards["memory_val"].map(_memory_label)
 
     tables: list[str] = []
@@ -193,7 +134,7 @@ def _build_board_tables(latest: pd.DataFrame) -> tuple[list[str], bool]:
             current = data.get(key)
             current_price = None if current is None else current.get("price")
             if current is None or (current_price is not None and price < current_price) or current_price is None:
-                status = _availability_status(row.get("stock", ""), row.get("availability", ""))
+                status = availability_status(row.get("stock", ""), row.get("availability", ""))
                 data[key] = {
                     "price": float(price),
                     "status": status,
@@ -252,45 +193,6 @@ def _build_board_tables(latest: pd.DataFrame) -> tuple[list[str], bool]:
     return tables, include_zero_note
 
 
-def _is_power_product(name: str) -> bool:
-    n = (name or "").lower()
-    keywords = ("power supply", "psu", "poe", "charger", "injector")
-    return any(k in n for k in keywords)
-
-
-def _classify_accessory(name: str) -> Optional[str]:
-    n = (name or "").lower()
-    for label, keywords in ACCESSORY_KEYWORDS:
-        if any(keyword in n for keyword in keywords):
-            return label
-    return None
-
-
-def _extract_power(name: str) -> str:
-    n = name or ""
-    m = re.search(r"(\d+(?:\.\d+)?)\s*(?:w|watt)", n, re.I)
-    return f"{m.group(1)}W" if m else ""
-
-
-def _extract_connector(name: str) -> str:
-    n = (name or "").lower()
-    options = [
-        ("usb-c", "USB-C"),
-        ("usb c", "USB-C"),
-        ("usb type-c", "USB-C"),
-        ("micro usb", "Micro USB"),
-        ("usb micro", "Micro USB"),
-        ("usb-a", "USB-A"),
-        ("usb a", "USB-A"),
-        ("poe", "RJ45 PoE"),
-        ("rj45", "RJ45 PoE"),
-    ]
-    for needle, label in options:
-        if needle in n:
-            return label
-    return ""
-
-
 def _format_description(text: str, max_parts: int = 3) -> str:
     raw = str(text or "")
     parts = [p.strip() for p in raw.split(";") if p.strip()]
@@ -312,14 +214,14 @@ def _markdown_escape(value: str) -> str:
 
 
 def _build_power_table(latest: pd.DataFrame) -> tuple[str, bool]:
-    power_df = latest[latest["name"].map(_is_power_product)].copy()
+    power_df = latest[latest["is_power"]].copy()
     if power_df.empty:
         return "No power accessories found.\n", False
 
     rows = ["|Power|Connector|Price|Link|Description|", "|:-|:-|-:|:-:|:-|"]
     for _, row in power_df.sort_values("name").iterrows():
-        power = _extract_power(str(row["name"]))
-        connector = _extract_connector(str(row["name"]))
+        power = row["power"]
+        connector = row["connector"]
         record = _price_record_from_row(row)
         price_text = _format_price_markdown(record)
         url = row.get("url") or ""
@@ -352,11 +254,7 @@ def _build_simple_table(title: str, df: pd.DataFrame) -> Optional[str]:
 
 
 def _build_accessory_tables(latest: pd.DataFrame) -> list[str]:
-    df = latest.copy()
-    df["board"] = df["name"].map(_classify_board)
-    df = df[df["board"].isna()].copy()
-    df = df[~df["name"].map(_is_power_product)].copy()
-    df["category"] = df["name"].map(_classify_accessory)
+    df = latest[latest["board"].isna() & ~latest["is_power"]].copy()
 
     if df.empty:
         return []
@@ -400,11 +298,30 @@ def _latest_snapshot(latest: pd.DataFrame) -> str:
     return ""
 
 
+def _load_latest() -> pd.DataFrame:
+    # the merge step's table is already classified and one row per SKU
+    latest = latest_table.load()
+    if latest is not None and not latest.empty:
+        return latest
+    # the SQLite store answers "newest row per SKU" without reading history
+    latest = None
+    conn = history_db.open_if_fresh(HIST)
+    if conn is not None:
+        try:
+            latest = history_db.latest_rows(conn)
+        finally:
+            conn.close()
+    if latest is None or latest.empty:
+        df = _load_history()
+        df = df.sort_values("date").reset_index(drop=True)
+        idx = df.groupby("sku")["date"].idxmax()
+        latest = df.loc[idx].copy()
+    names = classify_names(latest["name"])
+    return latest.join(names[latest_table.CLASS_COLUMNS])
+
+
 def main() -> None:
-    df = _load_history()
-    df = df.sort_values("date").reset_index(drop=True)
-    idx = df.groupby("sku")["date"].idxmax()
-    latest = df.loc[idx].copy()
+    latest = _load_latest()
 
     as_of = _latest_snapshot(latest)
     board_tables, include_zero_note = _build_board_tables(latest)
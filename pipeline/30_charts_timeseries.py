@@ -4,35 +4,80 @@ Generate per-SKU time series charts:
 - line: price over time
 - markers: 'v' for sale; '*' for all-time low
 One chart per figure; no custom colors/styles (per constraints).
+
+--resolution auto (default) keeps daily points for SKUs tracked up to a year
+and switches to weekly / monthly closing prices beyond that
+(history_rollup.pick_resolution); day/week/month force one resolution.
 """
 
 from __future__ import annotations
+import argparse
 from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
 
-HIST = Path("data/history/price_history.csv")
+from history_rollup import RESOLUTIONS, downsample, pick_resolution
+from history_store import HIST, load_history
+
 OUT_DIR = Path("charts")
 
 
+def _points(g: pd.DataFrame, rollups: dict, resolution: str) -> pd.DataFrame:
+    """date/price/is_sale/is_low points for one SKU at the given resolution."""
+    if resolution == "day":
+        return g
+    buckets = rollups[resolution].get(g["sku"].iloc[0])
+    if buckets is None:
+        return g
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(buckets["period"]),
+            "price": buckets["close"].to_numpy(),
+            "is_sale": (buckets["flags"] & 1).astype(bool).to_numpy(),
+            "is_low": (buckets["flags"] & 2).astype(bool).to_numpy(),
+        }
+    )
+
+
 def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--resolution",
+        choices=["auto", "day", *RESOLUTIONS],
+        default="auto",
+        help="Points per chart: daily, weekly/monthly closes, or by span (default)",
+    )
+    args = ap.parse_args()
+
     if not HIST.exists():
         raise SystemExit(
             "History file not found. Run 10_merge_history.py and 20_flags.py first."
         )
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    df = pd.read_csv(HIST, dtype={"sku": str}, parse_dates=["date"])
+    df = load_history(["date", "sku", "name", "price", "is_sale", "is_low"])
     df = df.sort_values(["sku", "date"])
+    # rollups are computed for every SKU in one pass, then looked up per chart
+    needed = RESOLUTIONS if args.resolution == "auto" else (args.resolution,)
+    rollups = {
+        res: dict(tuple(downsample(df, res).groupby("sku", sort=False)))
+        for res in needed
+        if res != "day"
+    }
 
     for sku, g in df.groupby("sku"):
         if g["price"].notna().sum() < 2:
             continue
+        resolution = args.resolution
+        if resolution == "auto":
+            resolution = pick_resolution((g["date"].max() - g["date"].min()).days)
+        name = g["name"].dropna().iloc[-1][:40] if g["name"].notna().any() else ""
+        g = _points(g, rollups, resolution)
         plt.figure()
         plt.plot(
             g["date"],
             g["price"],
-            label=f"{sku} {g['name'].dropna().iloc[-1][:40] if g['name'].notna().any() else ''}",
+            label=f"{sku} {name}",
         )
         if "is_sale" in g:
             sale_mask = g["is_sale"] == True
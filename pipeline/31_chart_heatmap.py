@@ -4,6 +4,8 @@ Build a model×memory heatmap from the latest prices per SKU.
 - Rows: model (Pi 3/4/5/500/500+)
 - Cols: memory_gb (2/4/8/16 where present)
 - Values: min price among SKUs matching that model/memory
+Reads the merge step's latest-per-SKU table (latest_table.py) when it is
+fresh and only falls back to scanning history otherwise.
 """
 
 from __future__ import annotations
@@ -12,7 +14,9 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-HIST = Path("data/history/price_history.csv")
+import latest_table
+from history_store import HIST, load_history
+
 OUT_DIR = Path("charts")
 
 FOCUS_MODELS = ["Pi 3", "Pi 4", "Pi 5", "Pi 500", "Pi 500+"]
@@ -23,15 +27,14 @@ def main() -> None:
         raise SystemExit("History file not found. Run 10_merge_history.py first.")
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    df = pd.read_csv(HIST, dtype={"sku": str})
-    if df.empty:
-        raise SystemExit("History is empty.")
-
-    # latest row per SKU
-    df["date_dt"] = pd.to_datetime(df["date"], errors="coerce")
-    idx = df.groupby("sku")["date_dt"].idxmax()
-    latest = df.loc[idx].copy()
-    latest = latest.drop(columns=["date_dt"])
+    latest = latest_table.load(["sku", "model", "memory_gb", "price"])
+    if latest is None:
+        df = load_history(["date", "sku", "model", "memory_gb", "price"])
+        if df.empty:
+            raise SystemExit("History is empty.")
+        # latest row per SKU
+        idx = df.groupby("sku")["date"].idxmax()
+        latest = df.loc[idx].copy()
     latest["memory_gb"] = pd.to_numeric(latest["memory_gb"], errors="coerce")
     latest = latest[latest["model"].isin(FOCUS_MODELS)]
 
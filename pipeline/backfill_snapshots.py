@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Re-derive daily snapshots from cached listing HTML (search.py --cache-dir).
+
+The brand listing pages (search.BRAND_QUERY) of the latest cached run of each
+UTC day are re-parsed with the current parser on a process pool, then either
+written to data/snapshots/<DATE>_pi_brand.csv or diffed against the snapshot
+already there. Pages cached for manifest queries or --stores are never used.
+
+Usage:
+  python pipeline/backfill_snapshots.py --cache-dir cache --diff
+  python pipeline/backfill_snapshots.py --cache-dir cache --since 2025-10-01 --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import search
+
+SNAP_DIR = Path("data/snapshots")
+
+
+def _runs_by_day(cache_dir: Path) -> dict[str, list[dict]]:
+    days: dict[str, list[dict]] = {}
+    for (run, query), entries in search.cache_runs(cache_dir).items():
+        if query != search.BRAND_QUERY:
+            continue
+        day = f"{run[:4]}-{run[4:6]}-{run[6:8]}"
+        days[day] = entries  # runs are oldest first, so the last one wins
+    return days
+
+
+def _parse_day(job: tuple[str, list[dict], str]) -> tuple[str, list[dict]]:
+    day, entries, parser = job
+    return day, search.dedupe_rows(search.parse_cached_run(entries, parser))
+
+
+def _read_snapshot(path: Path) -> list[dict]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _diff(old: list[dict], new: list[dict]) -> tuple[int, int, int]:
+    old_by = {r.get("sku", ""): r for r in old if r.get("sku")}
+    new_by = {r.get("sku", ""): r for r in new if r.get("sku")}
+    added = len(new_by.keys() - old_by.keys())
+    removed = len(old_by.keys() - new_by.keys())
+    changed = sum(
+        1
+        for sku in new_by.keys() & old_by.keys()
+        if any(
+            (new_by[sku].get(f) or "") != (old_by[sku].get(f) or "")
+            for f in search.SNAPSHOT_FIELDS
+        )
+    )
+    return added, removed, changed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache-dir", required=True, help="search.py HTML cache directory")
+    ap.add_argument("--out-dir", default=str(SNAP_DIR), help="Snapshot directory")
+    ap.add_argument("--since", help="Only backfill days on/after YYYY-MM-DD")
+    ap.add_argument("--until", help="Only backfill days on/before YYYY-MM-DD")
+    ap.add_argument(
+        "--diff",
+        action="store_true",
+        help="Report differences against existing snapshots instead of writing",
+    )
+    ap.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="Parser processes"
+    )
+    ap.add_argument(
+        "--parser", choices=search.PARSER_BACKENDS, default=search.DEFAULT_PARSER
+    )
+    args = ap.parse_args()
+    if not search.parser_available(args.parser):
+        ap.error(f"parser backend '{args.parser}' is not installed (pip install {args.parser})")
+
+    days = _runs_by_day(Path(args.cache_dir))
+    jobs = [
+        (day, entries, args.parser)
+        for day, entries in sorted(days.items())
+        if (not args.since or day >= args.since) and (not args.until or day <= args.until)
+    ]
+    if not jobs:
+        print(f"No cached listing runs found in {args.cache_dir}", file=sys.stderr)
+        return
+
+    out_dir = Path(args.out_dir)
+    written = unchanged = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers or 1)) as pool:
+        # map() yields in submission order, so output is ordered by day
+        for day, rows in pool.map(_parse_day, jobs, chunksize=4):
+            path = out_dir / f"{day}_pi_brand.csv"
+            if not rows:
+                print(f"{day}: no rows parsed, skipped", file=sys.stderr)
+                continue
+            if args.diff:
+                if not path.exists():
+                    print(f"{day}: new snapshot ({len(rows)} rows)")
+                    continue
+                added, removed, changed = _diff(_read_snapshot(path), rows)
+                if added or removed or changed:
+                    print(f"{day}: +{added} -{removed} ~{changed}")
+                else:
+                    unchanged += 1
+                continue
+            search.write_snapshot(path, rows)
+            written += 1
+
+    if args.diff:
+        print(f"Compared {len(jobs)} day(s); {unchanged} unchanged")
+    else:
+        print(f"Backfilled {written} snapshot(s) into {out_dir}/")
+
+
+if __name__ == "__main__":
+    main()
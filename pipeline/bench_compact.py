@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+History export benchmark: version-1 files vs compact version-2 files.
+
+Both exporters of 25_export_json.py render the same synthetic history
+(--skus x --days, one row per SKU and day) in memory. For each format the
+total size of every per-SKU file (raw, gzip -9, and brotli when installed)
+and the time to render them is printed; v2 times include writing its .gz/.br
+siblings, as the export does.
+
+Run: python pipeline/bench_compact.py [--skus 1000] [--days 730]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import importlib.util
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+spec = importlib.util.spec_from_file_location(
+    "export_json", Path(__file__).with_name("25_export_json.py")
+)
+export_json = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(export_json)
+
+
+def synthetic_history(skus: int, days: int) -> pd.DataFrame:
+    """(sku, date)-sorted history with occasional price moves and flags."""
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2023-01-01", periods=days).strftime("%Y-%m-%d")
+    ids = [f"{s:06d}" for s in range(skus)]
+    base = np.repeat(rng.uniform(5, 200, skus), days)
+    moves = rng.choice([0.0, 0.0, 0.0, 0.0, -1.0, 1.0], size=skus * days)
+    return pd.DataFrame(
+        {
+            "sku": np.repeat(ids, days),
+            "date": np.tile(dates, skus),
+            "name": np.repeat([f"Raspberry Pi accessory {s}" for s in ids], days),
+            "price": np.round(base + moves, 2),
+            "is_sale": rng.random(skus * days) < 0.05,
+            "is_low": rng.random(skus * days) < 0.02,
+        }
+    )
+
+
+def measure(files) -> tuple[float, dict[str, int]]:
+    """Render every (filename, bytes); returns seconds and bytes per suffix."""
+    started = time.perf_counter()
+    rendered = list(files)
+    elapsed = time.perf_counter() - started
+    sizes = {"raw": 0, "gz": 0, "br": 0}
+    for filename, data in rendered:
+        suffix = filename.rsplit(".", 1)[-1]
+        sizes[suffix if suffix in ("gz", "br") else "raw"] += len(data)
+    return elapsed, sizes
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--skus", type=int, default=1000)
+    ap.add_argument("--days", type=int, default=730)
+    args = ap.parse_args()
+
+    df = synthetic_history(args.skus, args.days)
+    brotli = export_json._import_brotli()
+
+    v1_time, v1 = measure(export_json._export_histories(df))
+    # v1 ships uncompressed; compress it here only to compare sizes
+    for _filename, data in export_json._export_histories(df):
+        v1["gz"] += len(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            v1["br"] += len(brotli.compress(data, quality=11))
+    v2_time, v2 = measure(export_json._export_compact(df))
+
+    print(f"{args.skus} SKUs x {args.days} days ({len(df)} rows)")
+    for label, elapsed, sizes in (("v1 history/", v1_time, v1), ("v2 history_compact/", v2_time, v2)):
+        parts = [f"raw {sizes['raw'] / 2**20:7.1f} MB", f"gz {sizes['gz'] / 2**20:6.1f} MB"]
+        if brotli is not None:
+            parts.append(f"br {sizes['br'] / 2**20:6.1f} MB")
+        print(f"  {label:<20} {'  '.join(parts)}  render {elapsed:5.1f} s")
+    if brotli is None:
+        print("  brotli not installed: no .br sizes")
+
+
+if __name__ == "__main__":
+    main()
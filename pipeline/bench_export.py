@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Version-1 history export benchmark: the original iterrows exporter vs the
+column-array one in 25_export_json.py.
+
+Both render every history/<SKU>.json of the same synthetic history (--skus x
+--days, one row per SKU and day, every row flagged) in memory. The sha256 of
+each file must be identical; the render time of each exporter is printed.
+Unflagged rows are where the two differ on purpose (see
+fixtures/history_v1/README.md), so the synthetic history has none.
+
+Run: python pipeline/bench_export.py [--skus 5000] [--days 1095]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from bench_compact import synthetic_history
+
+spec = importlib.util.spec_from_file_location(
+    "export_json", Path(__file__).with_name("25_export_json.py")
+)
+export_json = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(export_json)
+
+
+def legacy_histories(df: pd.DataFrame):
+    """The version-1 exporter as it was before the column-array rewrite."""
+    for sku, group in df.sort_values("date").groupby("sku"):
+        group = group.reset_index(drop=True)
+        series = []
+        for _, row in group.iterrows():
+            price = pd.to_numeric(row.get("price"), errors="coerce")
+            if pd.isna(price):
+                continue
+            dt = row["date"]
+            date_str = dt.strftime("%Y-%m-%d") if hasattr(dt, "strftime") else str(dt)
+            series.append(
+                {
+                    "date": date_str,
+                    "price": round(float(price), 2),
+                    "is_sale": bool(row.get("is_sale", False)),
+                    "is_low": bool(row.get("is_low", False)),
+                }
+            )
+        if not series:
+            continue
+        if "name" in group and group["name"].notna().any():
+            name = group["name"].dropna().iloc[-1]
+        else:
+            name = sku
+        payload = {"sku": str(sku), "name": name, "series": series}
+        yield f"{export_json._slugify_filename(str(sku))}.json", json.dumps(payload, indent=2).encode("utf-8")
+
+
+def measure(files) -> tuple[float, dict[str, str], int]:
+    """Render every (filename, bytes); returns seconds, sha256 per file and total bytes."""
+    digests = {}
+    size = 0
+    started = time.perf_counter()
+    for filename, data in files:
+        digests[filename] = hashlib.sha256(data).hexdigest()
+        size += len(data)
+    return time.perf_counter() - started, digests, size
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--skus", type=int, default=5000)
+    ap.add_argument("--days", type=int, default=1095)
+    args = ap.parse_args()
+
+    df = synthetic_history(args.skus, args.days)
+    legacy_time, legacy, size = measure(legacy_histories(df))
+    # main() hands the exporter a (sku, date)-sorted frame; synthetic_history is already
+    current_time, current, _size = measure(export_json._export_histories(df))
+    if current != legacy:
+        raise SystemExit("the column-array exporter wrote different history files")
+
+    print(
+        f"{args.skus} SKUs x {args.days} days ({len(df)} rows, "
+        f"{size / 2**20:.0f} MB of JSON): outputs identical"
+    )
+    for label, elapsed in (("iterrows", legacy_time), ("column arrays", current_time)):
+        print(f"  {label:<14} {elapsed:7.1f} s")
+    print(f"  speedup {legacy_time / current_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Merge benchmark: 10_merge_history.py in memory vs --max-memory (streaming).
+
+A synthetic history (--skus x --days rows, one row per SKU and day) plus one
+snapshot for the following day is written to a temporary tree. Both merges
+run there with --full as child processes; their price_history.csv must be
+byte-identical, and the wall time and peak RSS of each is printed.
+
+Run: python pipeline/bench_merge.py [--skus 5000] [--days 730] [--max-memory 512]
+"""
+
+from __future__ import annotations
+
+import argparse
+import filecmp
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MERGE = Path(__file__).resolve().parent / "10_merge_history.py"
+HIST = Path("data/history/price_history.csv")
+SNAP_DIR = Path("data/snapshots")
+SKUS_PER_BATCH = 500
+
+
+def write_history(root: Path, skus: int, days: int) -> None:
+    """Write the synthetic history and the next day's snapshot under root."""
+    dates = pd.date_range("2023-01-01", periods=days + 1).strftime("%Y-%m-%d")
+    rng = np.random.default_rng(1)
+    path = root / HIST
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for start in range(0, skus, SKUS_PER_BATCH):
+        ids = [f"{s:06d}" for s in range(start, min(start + SKUS_PER_BATCH, skus))]
+        sku = np.repeat(ids, days)
+        base = np.repeat(rng.uniform(5, 200, len(ids)), days)
+        # a price that moves now and then, as real listings do
+        steps = rng.choice([0.0, 0.0, 0.0, -1.0, 1.0], size=len(sku))
+        df = pd.DataFrame(
+            {
+                "date": np.tile(dates[:days], len(ids)),
+                "sku": sku,
+                "name": [f"Raspberry Pi accessory {s}" for s in sku],
+                "url": [f"https://www.microcenter.com/product/{s}/accessory" for s in sku],
+                "price": np.round(base + steps, 2),
+                "stock": "In Stock",
+                "availability": "Usually ships",
+                "model": "Accessory",
+                "memory_gb": np.nan,
+                "brand": "Raspberry Pi",
+            }
+        )
+        df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+    snap = pd.DataFrame(
+        {
+            "sku": [f"{s:06d}" for s in range(0, skus, 3)],
+            "name": "Raspberry Pi accessory",
+            "price": "$9.99",
+            "availability": "Usually ships",
+            "stock": "In Stock",
+            "url": "https://www.microcenter.com/product/accessory",
+        }
+    )
+    (root / SNAP_DIR).mkdir(parents=True, exist_ok=True)
+    snap.to_csv(root / SNAP_DIR / f"{dates[days]}_pi_brand.csv", index=False)
+
+
+def run_merge(root: Path, extra: list[str]) -> tuple[float, int]:
+    """Run the merge in root; returns (seconds, peak RSS in bytes)."""
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, str(MERGE), "--full", *extra],
+        cwd=root,
+        stdout=subprocess.DEVNULL,
+    )
+    _pid, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - started
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit(f"10_merge_history.py {' '.join(extra)} failed")
+    return elapsed, usage.ru_maxrss * 1024
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--skus", type=int, default=5000)
+    ap.add_argument("--days", type=int, default=730)
+    ap.add_argument("--max-memory", type=int, default=512, metavar="MB")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-merge-") as tmp:
+        base = Path(tmp) / "base"
+        # a child's peak RSS starts at its parent's when it is forked, so the
+        # data is generated in a separate process to keep this one small
+        writer = multiprocessing.get_context("spawn").Process(
+            target=write_history, args=(base, args.skus, args.days)
+        )
+        writer.start()
+        writer.join()
+        if writer.exitcode != 0:
+            raise SystemExit("writing the synthetic history failed")
+        rows = args.skus * args.days
+        size = (base / HIST).stat().st_size
+        results = {}
+        for label, extra in (
+            ("in-memory", []),
+            (f"--max-memory {args.max_memory}", ["--max-memory", str(args.max_memory)]),
+        ):
+            root = Path(tmp) / f"run{len(results)}"
+            shutil.copytree(base, root)
+            results[label] = run_merge(root, extra)
+        if not filecmp.cmp(Path(tmp) / "run0" / HIST, Path(tmp) / "run1" / HIST, shallow=False):
+            raise SystemExit("the streaming merge wrote a different price_history.csv")
+
+    print(f"{rows} history rows ({size / 2**20:.0f} MB CSV): outputs identical")
+    for label, (elapsed, peak) in results.items():
+        print(f"  {label:<18} {elapsed:7.1f} s  peak {peak / 2**20:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tile extraction benchmark: search.scan_tile() vs the old per-field walks.
+
+The legacy_* functions below are the extraction code search.py used before
+scan_tile(): every field re-walked the tile (get_text, find_all, find).
+Both versions run over the same parsed pages; rows must match exactly and
+the per-page extraction time of each is printed.
+
+Pages come from --cache-dir or synthetic listings (see check_parsers.py).
+Run: python pipeline/bench_tiles.py [--cache-dir cache] [--parser lxml]
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from pathlib import Path
+
+import search
+from check_parsers import cached_pages, synthetic_pages
+from classify import classify_availability
+from search import PRICE_RE, SKU_CLASS_RE, SKU_RE, absolutize, normalize_price
+
+LEGACY_SELECTORS = [
+    "li.product_wrapper",
+    "li.product-wrap",
+    "li.Product_wrapper",
+    "article.product_wrapper",
+    "div.product_wrapper",
+    "div.product-tile",
+    "div.product_tile",
+    "div.product-grid__item",
+    "div.productGridItem",
+]
+PRODUCT_HINTS = ("product", "result", "search-item", "listing", "tile")
+
+
+def legacy_extract_tile_data(tile) -> dict:
+    txt = tile.get_text(" ", strip=True)
+    msku = SKU_RE.search(txt)
+    name = ""
+    prod_link = None
+    for a in tile.find_all("a", href=True):
+        if "/product/" in a["href"]:
+            prod_link = absolutize(a["href"])
+            t = a.get_text(" ", strip=True)
+            if len(t) > len(name):
+                name = t
+    price = ""
+    price_node = tile.find(attrs={"itemprop": "price"})
+    if price_node:
+        price = normalize_price(price_node.get_text("", strip=True))
+    if not price:
+        meta_price = tile.find("meta", attrs={"itemprop": "price"})
+        if meta_price and meta_price.get("content"):
+            price = normalize_price(meta_price["content"])
+    if not price:
+        price = normalize_price(txt)
+    availability, stock = classify_availability(txt)
+    return {
+        "sku": msku.group(1) if msku else "",
+        "name": name,
+        "price": price,
+        "availability": availability,
+        "stock": stock,
+        "url": prod_link or "",
+        "tile_html": str(tile),
+    }
+
+
+def _legacy_locate_tile_from_anchor(anchor):
+    best = None
+    for depth, parent in enumerate(anchor.parents):
+        if depth > 10 or not getattr(parent, "name", None):
+            break
+        if parent.name in {"html", "body"}:
+            break
+        classes = " ".join(parent.get("class", [])).lower()
+        has_product_hint = any(hint in classes for hint in PRODUCT_HINTS)
+        if parent.name in {"li", "article"} and has_product_hint:
+            return parent
+        if parent.name in {"div", "section"} and has_product_hint:
+            if parent.find(attrs={"itemprop": "price"}) or PRICE_RE.search(
+                parent.get_text(" ", strip=True)
+            ):
+                best = best or parent
+        if parent.name in {"ul", "ol"}:
+            if best:
+                return best
+            break
+    return best
+
+
+def legacy_find_product_tiles(soup) -> list:
+    seen, tiles = set(), []
+    for selector in LEGACY_SELECTORS:
+        for tile in soup.select(selector):
+            if not getattr(tile, "name", None) or id(tile) in seen:
+                continue
+            if not tile.find("a", href=re.compile("/product/")):
+                continue
+            txt = tile.get_text(" ", strip=True)
+            has_price = bool(tile.find(attrs={"itemprop": "price"}) or PRICE_RE.search(txt))
+            has_sku = "sku:" in txt.lower() or tile.find(class_=SKU_CLASS_RE)
+            if not (has_price or has_sku):
+                continue
+            seen.add(id(tile))
+            tiles.append(tile)
+    if tiles:
+        return tiles
+    for anchor in [a for a in soup.find_all("a", href=True) if "/product/" in a["href"]]:
+        tile = _legacy_locate_tile_from_anchor(anchor)
+        if tile and id(tile) not in seen:
+            seen.add(id(tile))
+            tiles.append(tile)
+    return tiles
+
+
+def legacy_rows(soup) -> list[dict]:
+    rows = []
+    for tile in legacy_find_product_tiles(soup):
+        row = legacy_extract_tile_data(tile)
+        row.pop("tile_html")
+        rows.append(row)
+    return rows
+
+
+def current_rows(soup) -> list[dict]:
+    scans = {}
+    return [
+        search.extract_tile_data(tile, scans.get(id(tile)))
+        for tile in search.find_product_tiles(soup, scans)
+    ]
+
+
+def _ms_per_page(extract, soups, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for soup in soups:
+            extract(soup)
+    return (time.perf_counter() - started) / (repeat * len(soups)) * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache-dir", help="Use cached listing pages instead of synthetic ones")
+    ap.add_argument("--parser", choices=search.PARSER_BACKENDS, default=search.DEFAULT_PARSER)
+    ap.add_argument("--repeat", type=int, default=10, help="Timing passes")
+    args = ap.parse_args()
+    if not search.parser_available(args.parser):
+        raise SystemExit(f"parser backend '{args.parser}' is not installed")
+
+    pages = cached_pages(Path(args.cache_dir)) if args.cache_dir else synthetic_pages()
+    if not pages:
+        raise SystemExit(f"No cached listing pages in {args.cache_dir}")
+    soups = [(label, search.make_soup(html, args.parser)) for label, html in pages]
+    for label, soup in soups:
+        if current_rows(soup) != legacy_rows(soup):
+            raise SystemExit(f"scan_tile rows differ from the legacy extraction on {label}")
+
+    plain = [soup for _label, soup in soups]
+    legacy = _ms_per_page(legacy_rows, plain, args.repeat)
+    current = _ms_per_page(current_rows, plain, args.repeat)
+    print(f"{len(soups)} page(s) with {args.parser}: rows identical")
+    print(f"  legacy extraction  {legacy:7.1f} ms/page")
+    print(f"  scan_tile          {current:7.1f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
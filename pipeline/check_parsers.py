@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Parser backend parity check and throughput benchmark for search.py --parser.
+
+Every installed backend (html.parser, lxml, html5lib) parses the same listing
+pages; the rows each one yields must match html.parser's exactly, and the
+parse + tile extraction rate is printed as pages/sec.
+
+Pages come from the listing entries of --cache-dir (as saved by
+search.py --cache-dir), or, without one, from synthetic listings that cover
+the selector path and the anchor-walk fallback.
+
+Run: python pipeline/check_parsers.py [--cache-dir cache] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import search
+
+REFERENCE = search.DEFAULT_PARSER
+AVAILABILITY = ["In stock", "SOLD OUT", "Buy In Store", "Usually ships in 2 days"]
+
+
+def synthetic_tile(i: int, tag: str = "li", cls: str = "product_wrapper") -> str:
+    price = f"{10 + i % 50}.99"
+    avail = random.Random(i).choice(AVAILABILITY)
+    href = f"/product/{600000 + i}/raspberry-pi-thing-{i}"
+    return (
+        f'<{tag} class="{cls}"><div class="image"><a href="{href}"><img src="x.jpg"></a></div>\n'
+        f'<div class="details"><h2><a href="{href}">Raspberry Pi Thing {i} {2 ** (i % 5)}GB Board</a></h2>\n'
+        f'<p class="sku">SKU: {100000 + i}</p><span itemprop="price" content="{price}">${price}</span>'
+        f'<div class="stock"><span>{avail}</span></div>\n'
+        f'<!-- tile {i} --><script>var x = "SKU: 999";</script></div></{tag}>'
+    )
+
+
+def synthetic_listing(tiles: int = 96, start: int = 0, cls: str = "product_wrapper") -> str:
+    body = "\n".join(synthetic_tile(start + i, cls=cls) for i in range(tiles))
+    pager = "".join(
+        f'<a href="/search/search_results.aspx?fq=brand:Raspberry+Pi&page={p}">{p}</a>'
+        for p in range(2, 4)
+    )
+    return (
+        "<html><head><title>listing</title></head><body>"
+        f"<div class='pages'>{pager}</div><ul class='results'>{body}</ul></body></html>"
+    )
+
+
+def synthetic_pages() -> list[tuple[str, str]]:
+    """(label, html): selector path, div fallback, li fallback."""
+    return [
+        ("synthetic-96", synthetic_listing(96)),
+        (
+            "synthetic-div-fallback",
+            synthetic_listing(30, 200, cls="x").replace(
+                '<div class="details">', '<div class="details result-tile">'
+            ),
+        ),
+        ("synthetic-li-fallback", synthetic_listing(40, 400, cls="search-item")),
+    ]
+
+
+def cached_pages(cache_dir: Path) -> list[tuple[str, str]]:
+    pages = []
+    for entries in search.cache_runs(cache_dir).values():
+        for entry in entries:
+            pages.append((Path(entry["path"]).name, search.cache_read(entry)))
+    return pages
+
+
+def parse(html: str, parser: str) -> list[dict]:
+    return search.parse_listing_page(search.make_soup(html, parser))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache-dir", help="Use cached listing pages instead of synthetic ones")
+    ap.add_argument("--repeat", type=int, default=5, help="Timing passes per backend")
+    args = ap.parse_args()
+
+    pages = cached_pages(Path(args.cache_dir)) if args.cache_dir else synthetic_pages()
+    if not pages:
+        raise SystemExit(f"No cached listing pages in {args.cache_dir}")
+    backends = [p for p in search.PARSER_BACKENDS if search.parser_available(p)]
+    skipped = [p for p in search.PARSER_BACKENDS if p not in backends]
+
+    expected = {label: parse(html, REFERENCE) for label, html in pages}
+    for parser in backends:
+        for label, html in pages:
+            rows = parse(html, parser)
+            if rows != expected[label]:
+                raise SystemExit(
+                    f"{parser} differs from {REFERENCE} on {label}: "
+                    f"{len(rows)} vs {len(expected[label])} rows"
+                )
+
+    total_rows = sum(len(rows) for rows in expected.values())
+    print(f"{len(pages)} page(s), {total_rows} rows; every backend matches {REFERENCE}")
+    for parser in backends:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for _label, html in pages:
+                parse(html, parser)
+        elapsed = time.perf_counter() - started
+        rate = len(pages) * args.repeat / elapsed
+        print(f"  {parser:<12} {rate:7.1f} pages/sec")
+    if skipped:
+        print(f"  not installed: {', '.join(skipped)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
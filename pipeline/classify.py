@@ -0,0 +1,283 @@
+"""
+Product classification shared by the merge and markdown stages.
+
+Every rule table lives here and is compiled once. classify_names() works on
+the distinct names of a Series only, evaluates each rule as one vectorized
+string operation over them, and keeps a name -> fields cache on disk
+(.scrapegoat/classify_cache.json, or $SCRAPEGOAT_CLASSIFY_CACHE) so a run
+only classifies names it has never seen. The cache is keyed by a hash of the
+rule tables and starts over whenever they change.
+
+Fields:
+  model      Pi 5 / Pi 4 / ... / Accessory   (history `model` column)
+  board      Zero W / Pi 4B / ... or None    (markdown board tables)
+  memory_gb  strict "<n> GB|MB" match        (history `memory_gb` column)
+  memory     memory_gb, else a looser match  (markdown memory rows)
+  category   accessory category or None
+  is_power   power supply / PoE product
+  power      e.g. "27W" or ""
+  connector  USB-C / Micro USB / USB-A / RJ45 PoE or ""
+
+availability_status() normalizes a row's stock/availability strings to
+available / store_only / sold_out for the stages that reason about stock;
+classify_availability() derives the (availability, stock) strings from a
+listing tile's text for the scraper, and stock_status() combines the two for
+rows whose stock string is empty.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+CACHE_PATH = Path(
+    os.environ.get("SCRAPEGOAT_CLASSIFY_CACHE", ".scrapegoat/classify_cache.json")
+)
+FIELDS = [
+    "model",
+    "board",
+    "memory_gb",
+    "memory",
+    "category",
+    "is_power",
+    "power",
+    "connector",
+]
+
+# first match wins, checked against the lower-cased name
+MODEL_SUBSTRINGS = [
+    ("Pi 5", ("raspberry pi 5",)),
+    ("Pi 4", ("raspberry pi 4",)),
+    ("Pi 3", ("raspberry pi 3",)),
+    ("Pi 500+", ("500 plus", "500+")),
+    ("Pi 500", ("500",)),
+    ("Pico 2", ("pico 2",)),
+    ("Pico", ("pico",)),
+]
+BOARD_PATTERNS = [
+    ("Zero 2 W", r"zero\s*2\s*w"),
+    ("Zero W", r"zero\s*w"),
+    ("Pi 3A+", r"pi\s*3\s*(?:model\s*)?a\+"),
+    ("Pi 3B+", r"pi\s*3\s*(?:model\s*)?b\+"),
+    ("Pi 4B", r"pi\s*4(?!00)\s*(?:model\s*)?b"),
+    ("Pi 5", r"pi\s*5(?!00)"),
+    ("Pi 400", r"pi\s*400"),
+    ("Pi 500", r"pi\s*500\b"),
+    ("Pi 500+", r"pi\s*500\+"),
+]
+ACCESSORY_KEYWORDS = [
+    ("Cameras", ("camera", "imager")),
+    ("Cases", ("case", "enclosure", "shell")),
+    ("Kits", ("kit", "starter", "bundle", "set")),
+    ("Cooling", ("fan", "heat sink", "heatsink", "cooling")),
+    ("Displays", ("display", "screen", "monitor", "touchscreen")),
+    ("Storage", ("micro sd", "sd card", "storage", "ssd", "flash drive")),
+    ("Networking", ("poe", "ethernet", "network", "wifi", "wi-fi", "wireless")),
+    ("Audio", ("speaker", "audio", "microphone")),
+    ("Robotics", ("robot", "servo", "motor")),
+    ("Sensors", ("sensor", "temperature", "humidity", "accelerometer")),
+    ("Controllers", ("controller", "gamepad", "joystick")),
+]
+POWER_KEYWORDS = ("power supply", "psu", "poe", "charger", "injector")
+CONNECTORS = [
+    ("usb-c", "USB-C"),
+    ("usb c", "USB-C"),
+    ("usb type-c", "USB-C"),
+    ("micro usb", "Micro USB"),
+    ("usb micro", "Micro USB"),
+    ("usb-a", "USB-A"),
+    ("usb a", "USB-A"),
+    ("poe", "RJ45 PoE"),
+    ("rj45", "RJ45 PoE"),
+]
+SOLD_OUT_KEYWORDS = ("sold out", "out of stock")
+STORE_ONLY_KEYWORDS = (
+    "in-store",
+    "instore",
+    "buy in store",
+    "pickup",
+    "in store only",
+    "store only",
+    "call store",
+)
+AVAIL_HINTS = (
+    "Usually ships",
+    "In stock",
+    "SOLD OUT",
+    "Sold Out",
+    "Out of Stock",
+    "In-Store Only",
+    "Buy In Store",
+    "Pickup Today",
+    "In-Store Pickup",
+    "Pickup Only",
+)
+MEMORY_STRICT_RE = re.compile(r"\b(512|1|2|4|8|16)\s*(GB|MB)\b", re.I)
+MEMORY_LOOSE_RE = re.compile(r"(512|1|2|4|8|16)\s*(GB|MB)", re.I)
+POWER_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:w|watt)", re.I)
+
+
+def availability_status(stock: str, availability: str) -> str:
+    combined = f"{stock or ''} {availability or ''}".lower()
+    if any(keyword in combined for keyword in SOLD_OUT_KEYWORDS):
+        return "sold_out"
+    if any(keyword in combined for keyword in STORE_ONLY_KEYWORDS):
+        return "store_only"
+    return "available"
+
+
+def classify_availability(text: str) -> tuple[str, str]:
+    t = (text or "").lower()
+    availability_raw = ""
+    for h in AVAIL_HINTS:
+        if h.lower() in t:
+            availability_raw = h
+            break
+    if (
+        "buy in store" in t
+        or "in-store only" in t
+        or "in store only" in t
+        or "pickup today" in t
+        or "in-store pickup" in t
+        or "pickup only" in t
+    ):
+        return availability_raw or "Buy In Store", "Buy In Store"
+    if "sold out" in t or "out of stock" in t:
+        return availability_raw or "Sold Out", "Out of Stock"
+    if "usually ships" in t or "in stock" in t:
+        return availability_raw or "In stock", "In Stock"
+    return availability_raw, ""
+
+
+def stock_status(stock: str, availability: str) -> str:
+    """
+    availability_status() of a scraped row, with an empty stock string first
+    derived from the availability text by classify_availability().
+    """
+    stock = stock.strip() if isinstance(stock, str) else ""
+    availability = availability.strip() if isinstance(availability, str) else ""
+    return availability_status(stock or classify_availability(availability)[1], availability)
+
+
+def _any_of(needles: Iterable[str]) -> re.Pattern:
+    return re.compile("|".join(re.escape(n) for n in needles))
+
+
+_MODEL_RULES = [(label, _any_of(needles)) for label, needles in MODEL_SUBSTRINGS]
+_BOARD_RULES = [(label, re.compile(pattern)) for label, pattern in BOARD_PATTERNS]
+_CATEGORY_RULES = [(label, _any_of(words)) for label, words in ACCESSORY_KEYWORDS]
+_POWER_PRODUCT_RE = _any_of(POWER_KEYWORDS)
+_CONNECTOR_RULES = [(label, _any_of([needle])) for needle, label in CONNECTORS]
+
+RULES_VERSION = hashlib.sha256(
+    json.dumps(
+        [
+            MODEL_SUBSTRINGS,
+            BOARD_PATTERNS,
+            ACCESSORY_KEYWORDS,
+            POWER_KEYWORDS,
+            CONNECTORS,
+            MEMORY_STRICT_RE.pattern,
+            MEMORY_LOOSE_RE.pattern,
+            POWER_RE.pattern,
+        ]
+    ).encode("utf-8")
+).hexdigest()[:16]
+
+
+def _first_match(lower: pd.Series, rules, default):
+    conditions = [lower.str.contains(rx).to_numpy(dtype=bool) for _, rx in rules]
+    labels = [label for label, _ in rules]
+    return np.select(conditions, labels, default=default) if rules else default
+
+
+def _memory(names: pd.Series, rx: re.Pattern, ndigits: int | None) -> pd.Series:
+    found = names.str.extract(rx)
+    amount = pd.to_numeric(found[0], errors="coerce")
+    mb = found[1].str.lower().eq("mb").fillna(False).astype(bool)
+    if ndigits is None:
+        scaled = amount / 1024
+    else:
+        scaled = (amount / 1024).round(ndigits)
+    return amount.where(~mb, scaled).astype(float)
+
+
+def _classify_unique(names: pd.Series) -> pd.DataFrame:
+    """Run every rule over a Series of distinct names at once."""
+    names = names.astype(object).astype(str)
+    lower = names.str.lower()
+    out = pd.DataFrame(index=names.to_numpy())
+    out["model"] = _first_match(lower, _MODEL_RULES, "Accessory")
+    out["board"] = _first_match(lower, _BOARD_RULES, None)
+    strict = _memory(names, MEMORY_STRICT_RE, 3)
+    out["memory_gb"] = strict.to_numpy()
+    out["memory"] = strict.fillna(_memory(names, MEMORY_LOOSE_RE, None)).to_numpy()
+    out["category"] = _first_match(lower, _CATEGORY_RULES, None)
+    out["is_power"] = lower.str.contains(_POWER_PRODUCT_RE).to_numpy(dtype=bool)
+    watts = names.str.extract(POWER_RE)[0]
+    out["power"] = (watts + "W").fillna("").to_numpy()
+    out["connector"] = _first_match(lower, _CONNECTOR_RULES, "")
+    return out
+
+
+def _load_cache(path: Path) -> dict[str, list]:
+    try:
+        cache = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != RULES_VERSION:
+        return {}
+    return cache.get("names", {})
+
+
+def _save_cache(path: Path, entries: dict[str, list]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(
+        json.dumps({"version": RULES_VERSION, "names": entries}, sort_keys=True),
+        encoding="utf-8",
+    )
+    tmp.replace(path)
+
+
+def _to_cache_row(values: list) -> list:
+    values = [v.item() if isinstance(v, np.generic) else v for v in values]
+    return [None if isinstance(v, float) and np.isnan(v) else v for v in values]
+
+
+def classify_names(names: pd.Series, cache_path: Path | None = CACHE_PATH) -> pd.DataFrame:
+    """
+    Classification for every entry of `names`, as a DataFrame with FIELDS as
+    columns and the same index. Missing names classify as "".
+    Pass cache_path=None to skip the disk cache.
+    """
+    if names.empty:
+        return pd.DataFrame(columns=FIELDS, index=names.index)
+    clean = names.astype(object).where(names.notna(), "").astype(str)
+    codes, uniques = pd.factorize(clean)
+    uniques = pd.Index(uniques, dtype=object)
+
+    cache = _load_cache(cache_path) if cache_path is not None else {}
+    new = [name for name in uniques if name not in cache]
+    if new:
+        fresh = _classify_unique(pd.Series(new, dtype=object))
+        for name, row in zip(new, fresh.itertuples(index=False, name=None)):
+            cache[name] = _to_cache_row(list(row))
+        if cache_path is not None:
+            _save_cache(cache_path, cache)
+
+    table = pd.DataFrame([cache[name] for name in uniques], columns=FIELDS)
+    for col in ("memory_gb", "memory"):
+        table[col] = pd.to_numeric(table[col], errors="coerce").astype(float)
+    table["is_power"] = table["is_power"].astype(bool)
+    table = table.astype({"model": object, "board": object, "category": object})
+    result = table.take(codes)
+    result.index = names.index
+    return result
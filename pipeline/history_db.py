@@ -0,0 +1,222 @@
+"""
+Optional SQLite store for price history (data/history/prices.sqlite).
+
+The merge step feeds it (10_merge_history.py --sqlite, or automatically once
+the file exists) and 20_flags.py keeps its flag columns current. Every sync
+stamps the CSV fingerprint into the `meta` table, so readers can tell whether
+the database still matches the canonical CSV before trusting it. When the
+merge rewrites history (--full, a changed snapshot, or a stale database) it
+reloads the table from scratch instead of upserting.
+
+Schema:
+  prices(sku, date, name, url, price, stock, availability, model, memory_gb,
+         brand, is_sale, is_low)  PRIMARY KEY (sku, date)
+  indexes on date and model
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+DB_PATH = Path("data/history/prices.sqlite")
+COLUMNS = [
+    "sku",
+    "date",
+    "name",
+    "url",
+    "price",
+    "stock",
+    "availability",
+    "model",
+    "memory_gb",
+    "brand",
+    "is_sale",
+    "is_low",
+]
+KEY = ("sku", "date")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    sku TEXT NOT NULL,
+    date TEXT NOT NULL,
+    name TEXT,
+    url TEXT,
+    price REAL,
+    stock TEXT,
+    availability TEXT,
+    model TEXT,
+    memory_gb REAL,
+    brand TEXT,
+    is_sale INTEGER,
+    is_low INTEGER,
+    PRIMARY KEY (sku, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_date ON prices (date);
+CREATE INDEX IF NOT EXISTS prices_model ON prices (model);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def connect(path: Path = DB_PATH) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _csv_sha256(csv_path: Path) -> str:
+    return hashlib.sha256(csv_path.read_bytes()).hexdigest()
+
+
+def upsert(
+    conn: sqlite3.Connection, df: pd.DataFrame, update: Iterable[str] = ()
+) -> int:
+    """
+    INSERT rows keyed on (sku, date). On conflict the `update` columns are
+    overwritten; with no update columns existing rows win (like the CSV merge).
+    Rows without a SKU or date are skipped. Returns rows sent.
+    """
+    cols = [c for c in COLUMNS if c in df.columns]
+    keyed = df["sku"].fillna("").astype(str).ne("") & df["date"].notna()
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        keyed &= df["date"].astype(str).ne("")
+    rows = df.loc[keyed, cols].copy()
+    if rows.empty:
+        return 0
+    if pd.api.types.is_datetime64_any_dtype(rows["date"]):
+        rows["date"] = rows["date"].dt.strftime("%Y-%m-%d")
+    for flag in ("is_sale", "is_low"):
+        if flag in rows:
+            rows[flag] = rows[flag].map({True: 1, False: 0, "True": 1, "False": 0})
+    # empty strings become NULL, the same as a CSV round trip turns them into NaN
+    rows = rows.astype(object)
+    rows = rows.where(rows.notna() & rows.ne(""), None)
+
+    update = [c for c in update if c in cols and c not in KEY]
+    conflict = (
+        "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in update)
+        if update
+        else "DO NOTHING"
+    )
+    sql = (
+        f"INSERT INTO prices ({', '.join(cols)}) "
+        f"VALUES ({', '.join('?' for _ in cols)}) "
+        f"ON CONFLICT (sku, date) {conflict}"
+    )
+    with conn:
+        conn.executemany(sql, rows.itertuples(index=False, name=None))
+    return len(rows)
+
+
+def sync(
+    df: pd.DataFrame | Iterable[pd.DataFrame],
+    csv_path: Path,
+    update: Iterable[str] = (),
+    path: Path = DB_PATH,
+    replace: bool = False,
+) -> int:
+    """
+    Upsert df (or each frame of an iterable of chunks) and record that the
+    database now matches csv_path. With replace, df is the whole history:
+    every existing row is deleted first, so rows the CSV no longer has (a
+    re-merged snapshot's date) do not survive. Returns rows sent.
+    """
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    update = tuple(update)
+    sent = 0
+    conn = connect(path)
+    try:
+        if replace:
+            # drop the stamp with the rows: an interrupted reload is never fresh
+            with conn:
+                conn.execute("DELETE FROM meta WHERE key = 'csv_sha256'")
+                conn.execute("DELETE FROM prices")
+        for chunk in chunks:
+            sent += upsert(conn, chunk, update)
+        with conn:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('csv_sha256', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (_csv_sha256(csv_path),),
+            )
+    finally:
+        conn.close()
+    return sent
+
+
+def open_if_fresh(csv_path: Path, path: Path = DB_PATH) -> Optional[sqlite3.Connection]:
+    """Connection to the store if it exists and matches csv_path, else None."""
+    if not path.exists() or not csv_path.exists():
+        return None
+    conn = connect(path)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'csv_sha256'").fetchone()
+    if row is None or row[0] != _csv_sha256(csv_path):
+        conn.close()
+        return None
+    return conn
+
+
+def _frame(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> pd.DataFrame:
+    df = pd.read_sql_query(sql, conn, params=params)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    for flag in ("is_sale", "is_low"):
+        if flag in df:
+            df[flag] = df[flag].map({1: True, 0: False})
+    return df
+
+
+def latest_rows(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Most recent row per SKU (served from the primary key index)."""
+    return _frame(
+        conn,
+        """
+        SELECT p.* FROM prices p
+        JOIN (SELECT sku, MAX(date) AS date FROM prices GROUP BY sku) m
+          ON p.sku = m.sku AND p.date = m.date
+        ORDER BY p.sku
+        """,
+    )
+
+
+def sku_series(
+    conn: sqlite3.Connection, sku: str, since: Optional[str] = None
+) -> pd.DataFrame:
+    """All rows for one SKU, optionally from `since` (YYYY-MM-DD) onwards."""
+    return _frame(
+        conn,
+        "SELECT * FROM prices WHERE sku = ? AND date >= ? ORDER BY date",
+        (sku, since or ""),
+    )
+
+
+def rows_on(conn: sqlite3.Connection, date: str) -> pd.DataFrame:
+    return _frame(conn, "SELECT * FROM prices WHERE date = ? ORDER BY sku", (date,))
+
+
+def changed_on(conn: sqlite3.Connection, date: str) -> pd.DataFrame:
+    """
+    Rows on `date` whose price or stock differs from that SKU's previous
+    observation (new SKUs included), with prev_price/prev_stock columns.
+    """
+    return _frame(
+        conn,
+        """
+        SELECT cur.*, prev.price AS prev_price, prev.stock AS prev_stock
+        FROM prices cur
+        LEFT JOIN prices prev
+          ON prev.sku = cur.sku
+         AND prev.date = (SELECT MAX(date) FROM prices
+                          WHERE sku = cur.sku AND date < cur.date)
+        WHERE cur.date = ?
+          AND (prev.sku IS NULL
+               OR prev.price IS NOT cur.price
+               OR prev.stock IS NOT cur.stock)
+        ORDER BY cur.sku
+        """,
+        (date,),
+    )
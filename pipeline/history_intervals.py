@@ -0,0 +1,238 @@
+"""
+Change-only (run-length) encoding of price history.
+
+Outputs (written by 10_merge_history.py --intervals):
+  data/history/price_intervals.csv  sku, valid_from, valid_to, price, stock, availability
+  data/history/products.csv         sku, name, url, model, memory_gb, brand
+  .scrapegoat/intervals_state.json  merge_manifest.json fingerprint they match
+
+An interval covers consecutive calendar days on which a SKU was observed with
+the same price, stock and availability; a change in any of them, or a day the
+SKU was not seen, starts a new one. Product attributes live once per SKU in
+products.csv (the most recently observed values), so expanded rows carry the
+current name/url rather than whatever was scraped on that day.
+
+The merge step folds each batch of newly merged rows into the existing tables
+with update() (extending a SKU's last interval when the next day carries the
+same values) and only re-encodes the whole history when a batch reaches back
+before a SKU's last interval. Readers call load_daily() only while is_fresh().
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from history_store import merge_stamp
+
+INTERVALS = Path("data/history/price_intervals.csv")
+PRODUCTS = Path("data/history/products.csv")
+STATE_PATH = Path(".scrapegoat/intervals_state.json")
+
+VALUE_COLUMNS = ["price", "stock", "availability"]
+INTERVAL_COLUMNS = ["sku", "valid_from", "valid_to", *VALUE_COLUMNS]
+PRODUCT_COLUMNS = ["sku", "name", "url", "model", "memory_gb", "brand"]
+HISTORY_COLUMNS = [
+    "date",
+    "sku",
+    "name",
+    "url",
+    "price",
+    "stock",
+    "availability",
+    "model",
+    "memory_gb",
+    "brand",
+]
+TEXT_COLUMNS = ("stock", "availability", "name", "url", "model", "brand")
+DAY = pd.Timedelta(days=1)
+
+
+def _blank_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Empty strings for missing text, whether it came from memory or a CSV."""
+    for col in TEXT_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype(object).where(df[col].notna(), "").astype(str)
+    return df
+
+
+def encode(history: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Split daily history into (intervals, products)."""
+    df = _blank_text(history.loc[history["sku"].fillna("").astype(str).ne("")].copy())
+    df["sku"] = df["sku"].astype(str)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    df = df.loc[df["date"].notna()].sort_values(["sku", "date"], kind="mergesort")
+    if df.empty:
+        return (
+            pd.DataFrame(columns=INTERVAL_COLUMNS),
+            pd.DataFrame(columns=PRODUCT_COLUMNS),
+        )
+
+    prev = df.shift()
+    starts = (df["sku"] != prev["sku"]) | (df["date"] - prev["date"] != DAY)
+    for col in VALUE_COLUMNS:
+        same = (df[col] == prev[col]) | (df[col].isna() & prev[col].isna())
+        starts |= ~same
+    run = starts.cumsum()
+
+    intervals = df.groupby(run, sort=False).agg(
+        sku=("sku", "first"),
+        valid_from=("date", "first"),
+        valid_to=("date", "last"),
+        price=("price", "first"),
+        stock=("stock", "first"),
+        availability=("availability", "first"),
+    )
+    for col in ("valid_from", "valid_to"):
+        intervals[col] = intervals[col].dt.strftime("%Y-%m-%d")
+
+    products = df.groupby("sku", sort=True).last()
+    products = products.reset_index().reindex(columns=PRODUCT_COLUMNS)
+    return intervals.reset_index(drop=True)[INTERVAL_COLUMNS], products
+
+
+def update(
+    intervals: pd.DataFrame, products: pd.DataFrame, rows: pd.DataFrame
+) -> Optional[tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    (intervals, products) with newly merged daily rows folded in, or None when
+    some SKU's new rows do not all come after its last interval (re-encode).
+    """
+    fresh, fresh_products = encode(rows)
+    if fresh.empty:
+        return intervals, products
+    if intervals.empty:
+        return fresh, fresh_products
+
+    tail = intervals.groupby("sku", sort=False).tail(1)
+    last = pd.Series(tail.index, index=tail["sku"].to_numpy())
+    head = fresh.groupby("sku", sort=False).head(1)
+    at = head["sku"].map(last)
+    known = at.notna()
+    prev = intervals.loc[at[known].astype(int)].set_index(head.index[known])
+    begins = pd.to_datetime(head.loc[known, "valid_from"], format="%Y-%m-%d")
+    prev_to = pd.to_datetime(prev["valid_to"], format="%Y-%m-%d")
+    if (begins <= prev_to).any():
+        return None
+
+    joins = begins - prev_to == DAY
+    for col in VALUE_COLUMNS:
+        new, old = head.loc[known, col], prev[col]
+        joins &= (new == old) | (new.isna() & old.isna())
+    joined = joins[joins].index
+    intervals = intervals.copy()
+    intervals.loc[at[joined].astype(int), "valid_to"] = fresh.loc[joined, "valid_to"].to_numpy()
+
+    merged = pd.concat([intervals, fresh.drop(index=joined)], ignore_index=True)
+    merged = merged.sort_values(["sku", "valid_from"], kind="mergesort")
+    products = pd.concat([products, fresh_products], ignore_index=True)
+    products = products.groupby("sku", sort=True).last().reset_index()
+    return merged.reset_index(drop=True)[INTERVAL_COLUMNS], products[PRODUCT_COLUMNS]
+
+
+def encode_chunks(chunks: Iterable[pd.DataFrame]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Encode history read in chunks, each holding later days than the last per SKU."""
+    intervals = pd.DataFrame(columns=INTERVAL_COLUMNS)
+    products = pd.DataFrame(columns=PRODUCT_COLUMNS)
+    for chunk in chunks:
+        folded = update(intervals, products, chunk)
+        if folded is None:
+            raise ValueError("history chunks are not in date order per SKU")
+        intervals, products = folded
+    return intervals, products
+
+
+def write(intervals: pd.DataFrame, products: pd.DataFrame) -> tuple[int, int]:
+    """
+    Write the interval + product tables and record the merge manifest they
+    belong to; returns their row counts.
+    """
+    INTERVALS.parent.mkdir(parents=True, exist_ok=True)
+    intervals.to_csv(INTERVALS, index=False)
+    products.to_csv(PRODUCTS, index=False)
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(
+        json.dumps({"manifest_sha256": merge_stamp(), "intervals": len(intervals)}),
+        encoding="utf-8",
+    )
+    return len(intervals), len(products)
+
+
+def is_fresh() -> bool:
+    """True if the tables were written for the current merge manifest."""
+    if not (INTERVALS.exists() and PRODUCTS.exists()):
+        return False
+    try:
+        state = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    sha = merge_stamp()
+    return sha is not None and state.get("manifest_sha256") == sha
+
+
+def load() -> tuple[pd.DataFrame, pd.DataFrame]:
+    intervals = pd.read_csv(INTERVALS, dtype={"sku": str}, float_precision="round_trip")
+    products = pd.read_csv(PRODUCTS, dtype={"sku": str}, float_precision="round_trip")
+    return _blank_text(intervals), _blank_text(products)
+
+
+def expand(
+    intervals: pd.DataFrame,
+    products: Optional[pd.DataFrame] = None,
+    skus: Optional[Iterable[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Expand intervals back into one row per (sku, day), optionally limited to
+    some SKUs and/or a [start, end] date window. With products, the result has
+    the same columns as price_history.csv (without the flag columns).
+    """
+    iv = intervals
+    if skus is not None:
+        iv = iv.loc[iv["sku"].isin(set(skus))]
+    if start is not None:
+        iv = iv.loc[iv["valid_to"] >= start]
+    if end is not None:
+        iv = iv.loc[iv["valid_from"] <= end]
+    iv = iv.copy()
+    lo = pd.to_datetime(iv["valid_from"], format="%Y-%m-%d")
+    hi = pd.to_datetime(iv["valid_to"], format="%Y-%m-%d")
+    if start is not None:
+        lo = lo.clip(lower=pd.Timestamp(start))
+    if end is not None:
+        hi = hi.clip(upper=pd.Timestamp(end))
+
+    days = (hi - lo).dt.days + 1
+    daily = iv.loc[iv.index.repeat(days)].reset_index(drop=True)
+    # day offset of each expanded row within its interval
+    first_row = (days.cumsum() - days).repeat(days).to_numpy()
+    offsets = pd.to_timedelta(range(len(daily)) - first_row, unit="D")
+    daily["date"] = pd.Series(lo.repeat(days).to_numpy() + offsets).dt.strftime("%Y-%m-%d")
+    daily = daily.drop(columns=["valid_from", "valid_to"])
+
+    if products is None:
+        return daily[["date", "sku", *VALUE_COLUMNS]]
+    daily = daily.merge(products, on="sku", how="left")
+    return daily.sort_values(["sku", "date"], kind="mergesort").reset_index(drop=True)[
+        HISTORY_COLUMNS
+    ]
+
+
+def load_daily(
+    skus: Optional[Iterable[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    attributes: bool = True,
+) -> pd.DataFrame:
+    """
+    Daily history rebuilt from the interval files; attributes=False keeps
+    only date, sku, price, stock and availability.
+    """
+    intervals, products = load()
+    return expand(
+        intervals, products if attributes else None, skus=skus, start=start, end=end
+    )
@@ -0,0 +1,92 @@
+"""
+Weekly / monthly downsampling of daily price history for long-range charts.
+
+A bucket is a calendar week (starting Monday) or month. For each SKU and
+bucket: the first and last observed price (open/close), min, max, the number
+of observations and a flags bitmask that keeps a sale (1) or all-time low (2)
+if any day inside the bucket had one.
+
+pick_resolution() maps a requested span in days to the resolution a chart
+should use, so point counts stay roughly constant however long a SKU has
+been tracked: daily up to a year, weekly up to four years, monthly beyond.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ("week", "month")
+DAY_MAX_SPAN = 366
+WEEK_MAX_SPAN = 4 * 365 + 1
+FLAG_SALE = 1
+FLAG_LOW = 2
+ROLLUP_COLUMNS = ["sku", "period", "open", "close", "min", "max", "n", "flags"]
+
+
+def pick_resolution(span_days: int) -> str:
+    """"day", "week" or "month" for a chart covering span_days."""
+    if span_days <= DAY_MAX_SPAN:
+        return "day"
+    if span_days <= WEEK_MAX_SPAN:
+        return "week"
+    return "month"
+
+
+def flag_values(values: pd.Series) -> np.ndarray:
+    """A flag column as bools; a missing flag (row not flagged yet) is False."""
+    return values.fillna(False).astype(bool).to_numpy()
+
+
+def price_values(values: pd.Series) -> pd.Series:
+    """Numeric prices; unparseable and non-finite ones become NaN."""
+    price = pd.to_numeric(values, errors="coerce")
+    return price.where(np.isfinite(price))
+
+
+def downsample(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    One row per (sku, bucket) with ROLLUP_COLUMNS, sorted by sku and period.
+    df needs sku, date and price; is_sale / is_low are used when present.
+    Rows without a (finite) price are ignored.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {RESOLUTIONS}, got {resolution!r}")
+    df = df[[c for c in ("sku", "date", "price", "is_sale", "is_low") if c in df]]
+    price = price_values(df["price"])
+    df = df.loc[df["sku"].notna() & price.notna()].assign(price=price)
+    df = df.assign(date=pd.to_datetime(df["date"], errors="coerce"))
+    df = df.loc[df["date"].notna()].sort_values(["sku", "date"], kind="mergesort")
+    if df.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    day = df["date"].to_numpy().astype("datetime64[D]")
+    if resolution == "week":
+        # 1970-01-01 was a Thursday; shift so buckets start on Monday
+        period = day - ((day.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    else:
+        period = day.astype("datetime64[M]").astype("datetime64[D]")
+    skus = df["sku"].astype(str).to_numpy()
+    prices = df["price"].to_numpy(dtype=float)
+    flags = np.zeros(len(df), dtype=np.int64)
+    if "is_sale" in df:
+        flags |= flag_values(df["is_sale"]) * FLAG_SALE
+    if "is_low" in df:
+        flags |= flag_values(df["is_low"]) * FLAG_LOW
+
+    starts = np.flatnonzero(
+        np.r_[True, (skus[1:] != skus[:-1]) | (period[1:] != period[:-1])]
+    )
+    ends = np.r_[starts[1:], len(df)] - 1
+    return pd.DataFrame(
+        {
+            "sku": skus[starts],
+            "period": pd.to_datetime(period[starts]).strftime("%Y-%m-%d"),
+            "open": prices[starts],
+            "close": prices[ends],
+            "min": np.minimum.reduceat(prices, starts),
+            "max": np.maximum.reduceat(prices, starts),
+            "n": ends - starts + 1,
+            "flags": np.bitwise_or.reduceat(flags, starts),
+        }
+    )[ROLLUP_COLUMNS]
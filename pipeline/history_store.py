@@ -0,0 +1,138 @@
+"""
+Shared reader/writer for data/history/price_history.csv.
+
+The CSV stays the canonical, git-friendly artifact. Whenever a stage rewrites
+it, a typed columnar sidecar (price_history.parquet) is written next to it:
+real datetime/float dtypes, dictionary-encoded string columns, and the CSV's
+size + sha256 in the schema metadata. Readers use the sidecar (with column
+projection) only while it matches the CSV, and fall back to parsing the CSV
+otherwise or when pyarrow is not installed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+HIST = Path("data/history/price_history.csv")
+SIDECAR = HIST.with_suffix(".parquet")
+MERGE_MANIFEST = Path("data/history/merge_manifest.json")
+
+DICTIONARY_COLUMNS = ("name", "url", "stock", "availability", "model", "brand")
+NUMERIC_COLUMNS = ("price", "memory_gb", "rolling_median", "ever_min", "pct_off")
+_META_KEY = b"scrapegoat"
+
+
+def _fingerprint(path: Path) -> dict:
+    data = path.read_bytes()
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def merge_stamp() -> Optional[str]:
+    """
+    sha256 of the merge manifest: identifies the set of merged snapshots.
+    Tables derived from history record it to tell whether they are current.
+    """
+    try:
+        return hashlib.sha256(MERGE_MANIFEST.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def write_sidecar(df: pd.DataFrame, csv_path: Path = HIST) -> bool:
+    """Write the typed Parquet copy of df; returns False if pyarrow is missing."""
+    sidecar = csv_path.with_suffix(".parquet")
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sidecar.unlink(missing_ok=True)
+        return False
+
+    typed = df.copy()
+    if "date" in typed:
+        typed["date"] = pd.to_datetime(typed["date"], format="%Y-%m-%d", errors="coerce")
+    for col in NUMERIC_COLUMNS:
+        if col in typed:
+            typed[col] = pd.to_numeric(typed[col], errors="coerce")
+    for col in DICTIONARY_COLUMNS:
+        if col in typed:
+            typed[col] = typed[col].astype("category")
+    try:
+        table = pa.Table.from_pandas(typed, preserve_index=False)
+    except (pa.ArrowException, ValueError, TypeError):
+        sidecar.unlink(missing_ok=True)
+        return False
+    meta = dict(table.schema.metadata or {})
+    meta[_META_KEY] = json.dumps(_fingerprint(csv_path)).encode("utf-8")
+    pq.write_table(table.replace_schema_metadata(meta), sidecar)
+    return True
+
+
+def write_history(df: pd.DataFrame, csv_path: Path = HIST) -> None:
+    """Write the canonical CSV, then refresh its sidecar."""
+    df.to_csv(csv_path, index=False)
+    write_sidecar(df, csv_path)
+
+
+def _read_sidecar(
+    csv_path: Path, columns: Optional[list[str]]
+) -> Optional[pd.DataFrame]:
+    sidecar = csv_path.with_suffix(".parquet")
+    if not sidecar.exists():
+        return None
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    schema = pq.read_schema(sidecar)
+    try:
+        expected = json.loads((schema.metadata or {}).get(_META_KEY, b"{}"))
+    except ValueError:
+        return None
+    if expected.get("size") != csv_path.stat().st_size:
+        return None
+    if expected != _fingerprint(csv_path):
+        return None
+
+    if columns is not None:
+        columns = [c for c in columns if c in schema.names]
+    df = pq.read_table(sidecar, columns=columns).to_pandas()
+    # hand back the same dtypes a CSV read would give
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object).infer_objects()
+    return df
+
+
+def load_history(
+    columns: Optional[Iterable[str]] = None,
+    parse_dates: bool = True,
+    csv_path: Path = HIST,
+) -> pd.DataFrame:
+    """
+    Load history, projecting to `columns` (missing ones are skipped).
+    parse_dates=True gives datetime64 dates; False keeps 'YYYY-MM-DD' strings.
+    """
+    wanted = list(columns) if columns is not None else None
+    df = _read_sidecar(csv_path, wanted)
+    if df is not None:
+        if "date" in df and not parse_dates:
+            df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+        return df
+
+    usecols = (lambda c: c in wanted) if wanted is not None else None
+    want_date = wanted is None or "date" in wanted
+    return pd.read_csv(
+        csv_path,
+        dtype={"sku": str},
+        usecols=usecols,
+        parse_dates=["date"] if parse_dates and want_date else None,
+        # exact parse, so values carried through a rewrite keep their digits
+        float_precision="round_trip",
+    )
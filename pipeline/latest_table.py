@@ -0,0 +1,121 @@
+"""
+Materialized "latest row per SKU" table shared by the export stages.
+
+Output (maintained by 10_merge_history.py):
+  data/history/latest.csv         one row per SKU, sorted by sku: the merge
+                                  columns of its newest history row plus the
+                                  classify_names() columns below
+  data/history/latest.parquet     typed sidecar (see history_store.py)
+  .scrapegoat/latest_state.json   merge_manifest.json fingerprint it matches
+
+The merge step folds each batch of newly merged snapshot rows into the table
+(the newer date wins; on a tie the existing row wins, as in the history), so
+readers get the latest prices without scanning history. load() returns None
+when the table is missing or was not written for the current merge manifest;
+callers then fall back to deriving it from history.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from classify import classify_names
+from history_store import load_history, merge_stamp, write_history
+
+LATEST = Path("data/history/latest.csv")
+STATE_PATH = Path(".scrapegoat/latest_state.json")
+
+HISTORY_COLUMNS = [
+    "date",
+    "sku",
+    "name",
+    "url",
+    "price",
+    "stock",
+    "availability",
+    "model",
+    "memory_gb",
+    "brand",
+]
+CLASS_COLUMNS = ["board", "memory", "category", "is_power", "power", "connector"]
+LATEST_COLUMNS = HISTORY_COLUMNS + CLASS_COLUMNS
+
+
+def _newest(rows: pd.DataFrame) -> pd.DataFrame:
+    """Newest row per SKU (the earlier row wins a tie), sorted by sku."""
+    df = rows.loc[rows["sku"].fillna("").astype(str).ne("")]
+    df = df.assign(sku=df["sku"].astype(str), date=df["date"].astype(str))
+    df = df.sort_values(["sku", "date"], ascending=[True, False], kind="mergesort")
+    return df.drop_duplicates("sku", keep="first").reset_index(drop=True)
+
+
+def _with_classes(df: pd.DataFrame) -> pd.DataFrame:
+    names = classify_names(df["name"])
+    return df.reindex(columns=HISTORY_COLUMNS).join(names[CLASS_COLUMNS])
+
+
+def build(history: pd.DataFrame | Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    The table for a whole history: one frame, or chunks of it in any
+    partition (10_merge_history._history_chunks reads it in file order).
+    """
+    chunks = [history] if isinstance(history, pd.DataFrame) else history
+    parts = [_newest(chunk.reindex(columns=HISTORY_COLUMNS)) for chunk in chunks]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=LATEST_COLUMNS)
+    return _with_classes(_newest(pd.concat(parts, ignore_index=True)))
+
+
+def update(latest: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """latest with newly merged history rows folded in."""
+    fresh = _newest(rows.reindex(columns=HISTORY_COLUMNS))
+    if fresh.empty:
+        return latest
+    current = latest.assign(date=pd.to_datetime(latest["date"]).dt.strftime("%Y-%m-%d"))
+    merged = _newest(pd.concat([current, _with_classes(fresh)], ignore_index=True))
+    return merged[LATEST_COLUMNS]
+
+
+def write(latest: pd.DataFrame) -> None:
+    """Write the table and record the merge manifest it belongs to."""
+    LATEST.parent.mkdir(parents=True, exist_ok=True)
+    write_history(latest[LATEST_COLUMNS], LATEST)
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(
+        json.dumps({"manifest_sha256": merge_stamp(), "rows": len(latest)}),
+        encoding="utf-8",
+    )
+
+
+def is_fresh() -> bool:
+    """True if the table was written for the current merge manifest."""
+    if not LATEST.exists():
+        return False
+    try:
+        state = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    sha = merge_stamp()
+    return sha is not None and state.get("manifest_sha256") == sha
+
+
+def load(columns: Optional[Iterable[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    The table (typed: datetime dates, float prices/memory, bool is_power),
+    projected to `columns`, or None when it is missing or stale.
+    """
+    if not is_fresh():
+        return None
+    df = load_history(columns, csv_path=LATEST)
+    # a CSV read turns the empty power/connector strings into NaN
+    for col in ("power", "connector"):
+        if col in df:
+            df[col] = df[col].astype(object).where(df[col].notna(), "")
+    if "is_power" in df:
+        df["is_power"] = df["is_power"].fillna(False).astype(bool)
+    return df
@@ -0,0 +1,160 @@
+"""
+Multi-window price statistics per SKU (written by 22_stats.py).
+
+For each SKU, as of its latest observation T, and each window W (days), the
+prices observed in (T - W, T] give: n, median, min, max, the configured
+percentiles, and volatility (sample standard deviation of log price changes
+between consecutive observations inside the window).
+
+Everything is computed with NumPy over arrays sorted once by (sku, price):
+each window is just a boolean mask over that order, so the cost is one sort
+plus a few vectorized reductions per window, independent of the SKU count.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+STATS_PATH = Path("data/history/price_stats.csv")
+STATS_JSON = Path("site/data/stats.json")
+WINDOWS = (7, 30, 90, 365)
+PERCENTILES = (10, 90)
+
+
+def _group_quantile(
+    values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float
+) -> np.ndarray:
+    """Linear-interpolated quantile of each sorted run values[start:start+count]."""
+    out = np.full(len(counts), np.nan)
+    ok = counts > 0
+    pos = q * (counts[ok] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    base = starts[ok]
+    v_lo = values[base + lo]
+    v_hi = values[base + hi]
+    frac = pos - lo
+    # same lerp as numpy.quantile: interpolate from the nearer end
+    out[ok] = np.where(
+        frac >= 0.5,
+        v_hi - (v_hi - v_lo) * (1 - frac),
+        v_lo + (v_hi - v_lo) * frac,
+    )
+    return out
+
+
+def compute_stats(
+    df: pd.DataFrame,
+    windows: Sequence[int] = WINDOWS,
+    percentiles: Sequence[int] = PERCENTILES,
+) -> pd.DataFrame:
+    """One row per SKU: sku, as_of, price, then <stat>_<W>d for every window."""
+    df = df.loc[df["sku"].notna(), ["sku", "date", "price"]].copy()
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.loc[df["date"].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=["sku", "as_of", "price"])
+
+    codes, skus = pd.factorize(df["sku"].astype(str), sort=True)
+    day = df["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    price = df["price"].to_numpy(dtype=float)
+    n_sku = len(skus)
+
+    # latest observation per SKU (its "as of" day and price)
+    by_date = np.lexsort((day, codes))
+    codes_d, day_d, price_d = codes[by_date], day[by_date], price[by_date]
+    last_idx = np.flatnonzero(np.r_[codes_d[1:] != codes_d[:-1], True])
+    as_of = day_d[last_idx]
+    age = as_of[codes_d] - day_d  # days before the SKU's latest observation
+
+    # log changes between consecutive observations of the same SKU
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_p = np.log(np.where(price_d > 0, price_d, np.nan))
+    same = np.r_[False, codes_d[1:] == codes_d[:-1]]
+    ret = np.where(same, log_p - np.r_[np.nan, log_p[:-1]], np.nan)
+    age_prev = np.r_[0, age[:-1]]
+
+    # one sort by (sku, price) serves every window's order statistics
+    valid = ~np.isnan(price_d)
+    by_price = np.lexsort((price_d, codes_d))
+    by_price = by_price[valid[by_price]]
+    codes_p, price_p, age_p = codes_d[by_price], price_d[by_price], age[by_price]
+
+    out = pd.DataFrame(
+        {
+            "sku": np.asarray(skus, dtype=object),
+            "as_of": pd.to_datetime(as_of, unit="D").strftime("%Y-%m-%d"),
+            "price": price_d[last_idx],
+        }
+    )
+    money = ["price"]
+    for w in windows:
+        in_win = age_p < w
+        c, v = codes_p[in_win], price_p[in_win]
+        counts = np.bincount(c, minlength=n_sku)
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        has = counts > 0
+        mins = np.full(n_sku, np.nan)
+        maxs = np.full(n_sku, np.nan)
+        mins[has] = v[starts[has]]
+        maxs[has] = v[starts[has] + counts[has] - 1]
+
+        out[f"n_{w}d"] = counts
+        out[f"median_{w}d"] = _group_quantile(v, starts, counts, 0.5)
+        out[f"min_{w}d"] = mins
+        out[f"max_{w}d"] = maxs
+        for p in percentiles:
+            out[f"p{p}_{w}d"] = _group_quantile(v, starts, counts, p / 100)
+        money += [f"median_{w}d", f"min_{w}d", f"max_{w}d"]
+        money += [f"p{p}_{w}d" for p in percentiles]
+
+        # both ends of a change must fall inside the window
+        r_ok = ~np.isnan(ret) & (age_prev < w)
+        rc, rv = codes_d[r_ok], ret[r_ok]
+        rn = np.bincount(rc, minlength=n_sku)
+        rs = np.bincount(rc, weights=rv, minlength=n_sku)
+        rss = np.bincount(rc, weights=rv * rv, minlength=n_sku)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = (rss - rs * rs / rn) / (rn - 1)
+        out[f"volatility_{w}d"] = np.where(rn > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+
+    out[money] = out[money].round(2)
+    vol_cols = [c for c in out.columns if c.startswith("volatility_")]
+    out[vol_cols] = out[vol_cols].round(4)
+    return out
+
+
+def to_json_payload(stats: pd.DataFrame, windows: Iterable[int]) -> dict:
+    """{"as_of", "windows", "skus": {sku: {"price", "as_of", "<W>d": {...}}}}."""
+    windows = list(windows)
+    skus: dict[str, dict] = {}
+    for rec in stats.to_dict(orient="records"):
+        entry: dict[str, object] = {"as_of": rec["as_of"], "price": _clean(rec["price"])}
+        for w in windows:
+            suffix = f"_{w}d"
+            entry[f"{w}d"] = {
+                key[: -len(suffix)]: _clean(val)
+                for key, val in rec.items()
+                if key.endswith(suffix)
+            }
+        skus[str(rec["sku"])] = entry
+    as_of = max(stats["as_of"]) if len(stats) else None
+    return {"as_of": as_of, "windows": windows, "skus": skus}
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def load_stats(path: Path = STATS_PATH) -> pd.DataFrame:
+    """The stats table indexed by SKU, for stages that want to join on it."""
+    return pd.read_csv(path, dtype={"sku": str}).set_index("sku")
@@ -4,20 +4,33 @@ Scrape Micro Center brand results for Raspberry Pi (or any brand listing URL):
 - SKU, Name, Price, Availability (raw), Stock (normalized), URL
 
 Extras:
-  --cache-dir DIR   Save fetched listing HTML
+  --cache-dir DIR   Save fetched listing HTML (gzip blobs deduplicated by hash)
   --cache-tiles     Also save each product tile's HTML snippet
+  --concurrency N   Fetch pagination pages on N threads (with --pages all)
+  --host-budget N   Stop after N requests to any one host
+  --parser NAME     html.parser (default), lxml or html5lib
+  --replay [RUN]    Re-parse a cached run from --cache-dir offline
+  --manifest FILE   Scrape a JSON/YAML list of queries into one snapshot
+  --stores IDS      Per-store availability for comma-separated store IDs
+  --rate-limit R    Pace requests to each host at <= R per second
+  --hedge           Race the next strategy when a fetch is slower than p50
+  --state PATH      Persisted cookies + fetch-strategy stats (--no-state to skip)
 
 Usage:
   python search.py "https://www.microcenter.com/search/search_results.aspx?fq=brand:Raspberry+Pi&sortby=match&rpp=96&myStore=false" \
     --out pi_brand.csv --pages 1 --cache-dir cache --cache-tiles
 """
 
-import argparse, csv, hashlib, json, os, random, re, sys, time, urllib.parse
+import argparse, csv, gzip, hashlib, json, os, random, re, sys, threading, time, urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString
+from bs4.builder import builder_registry
+
+from classify import classify_availability
 
 # ---------- HTTP session with warmup + resilient headers ----------
 HEADERS_PRIMARY = {
@@ -50,68 +63,364 @@ SESSION = requests.Session()
 SESSION.headers.update(HEADERS_PRIMARY)
 
 
+class BudgetExhausted(RuntimeError):
+    pass
+
+
+class HostBudget:
+    """
+    Thread-safe cap on how many requests a single run may send to each host.
+    limit=None means unlimited; warm-up and retry requests count too.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def take(self, url):
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self._lock:
+            used = self.counts.get(host, 0)
+            if self.limit is not None and used >= self.limit:
+                raise BudgetExhausted(
+                    f"request budget of {self.limit} exhausted for {host}"
+                )
+            self.counts[host] = used + 1
+
+
+HOST_BUDGET = HostBudget()
+
+
+class RateLimiter:
+    """
+    Thread-safe per-host pacing shared by every worker: request starts to one
+    host are spaced at least 1/rate seconds apart. rate=0 disables it.
+    """
+
+    def __init__(self, rate=0.0):
+        self.rate = rate
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.rate:
+            return
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + 1.0 / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+RATE_LIMIT = RateLimiter()
+_POOL_LOCK = threading.Lock()
+_WARM_LOCK = threading.Lock()
+
+
+def _ensure_pool_size(size):
+    """Grow SESSION's connection pool once so concurrent workers don't starve."""
+    with _POOL_LOCK:
+        if size <= getattr(SESSION, "_pool_size", 10):
+            return
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=size, pool_maxsize=size
+        )
+        SESSION.mount("https://", adapter)
+        SESSION.mount("http://", adapter)
+        SESSION._pool_size = size
+
+
+def _session_get(url, **kwargs):
+    HOST_BUDGET.take(url)
+    RATE_LIMIT.wait(url)
+    return SESSION.get(url, **kwargs)
+
+
 def _attempt_get(url, headers, timeout=30):
-    r = SESSION.get(url, headers=headers, timeout=timeout, allow_redirects=True)
+    r = _session_get(url, headers=headers, timeout=timeout, allow_redirects=True)
     if r.status_code == 403:
         raise requests.HTTPError(f"403 for {url}", response=r)
     r.raise_for_status()
     return r.url, r.text
 
-def get(url):
+# ---------- Persisted fetch state ----------
+# Cookies (with expiry) and per-strategy success/latency stats survive between
+# runs so the next run can skip warm-up and lead with the strategy that worked.
+STATE_PATH = Path(os.environ.get("SCRAPER_STATE", ".scrapegoat/fetch_state.json"))
+SESSION_COOKIE_TTL = 6 * 3600  # how long cookies without an expiry are trusted
+LATENCY_ALPHA = 0.3  # EWMA weight of the newest latency sample
+RECENT_LATENCY_SAMPLES = 50
+FETCH_STATS: dict[str, dict] = {}
+RECENT_LATENCIES: list[float] = []
+HEDGE_STATS = {"fired": 0, "wins": 0, "losses": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def load_fetch_state(path: Path = STATE_PATH) -> None:
     """
-    Warm up cookies, then try multiple header/URL variants.
+    Restore cookies that have not expired and the strategy stats. When any
+    cookie is still valid the warm-up requests are skipped.
     """
-    # --- warm up once per run to set cookies/clearance ---
-    if not getattr(SESSION, "_warm", False):
-        try:
-            SESSION.get("https://www.microcenter.com/", timeout=15)
-            SESSION.get("https://www.microcenter.com/categories", timeout=15)
-            # touch "Shippable Items" store to encourage server-rendered listings
-            SESSION.get(
-                "https://www.microcenter.com/search/search_results.aspx?storeid=029",
-                timeout=15,
-            )
-            SESSION._warm = True
-            time.sleep(0.5)
-        except Exception:
-            pass
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return
+    now = time.time()
+    saved_at = state.get("saved_at", 0)
+    restored = 0
+    for c in state.get("cookies", []):
+        expires = c.get("expires")
+        if expires is None:
+            if now - saved_at > SESSION_COOKIE_TTL:
+                continue
+        elif expires <= now:
+            continue
+        SESSION.cookies.set(
+            c["name"],
+            c["value"],
+            domain=c.get("domain", ""),
+            path=c.get("path", "/"),
+            expires=expires,
+            secure=bool(c.get("secure")),
+        )
+        restored += 1
+    if restored:
+        SESSION._warm = True
+    FETCH_STATS.update(state.get("strategies", {}))
+    RECENT_LATENCIES[:] = state.get("recent_latencies", [])[-RECENT_LATENCY_SAMPLES:]
+    HEDGE_STATS.update(state.get("hedge", {}))
+
+
+def save_fetch_state(path: Path = STATE_PATH) -> None:
+    cookies = [
+        {
+            "name": c.name,
+            "value": c.value,
+            "domain": c.domain,
+            "path": c.path,
+            "expires": c.expires,
+            "secure": c.secure,
+        }
+        for c in SESSION.cookies
+    ]
+    with _STATS_LOCK:
+        state = {
+            "saved_at": time.time(),
+            "cookies": cookies,
+            "strategies": FETCH_STATS,
+            "recent_latencies": RECENT_LATENCIES,
+            "hedge": HEDGE_STATS,
+        }
+        text = json.dumps(state, indent=2, sort_keys=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _record_attempt(label: str, ok: bool, latency: float) -> None:
+    with _STATS_LOCK:
+        st = FETCH_STATS.setdefault(
+            label, {"ok": 0, "fail": 0, "latency": None, "last_ok": None}
+        )
+        st["last_ok"] = ok
+        if not ok:
+            st["fail"] += 1
+            return
+        st["ok"] += 1
+        RECENT_LATENCIES.append(round(latency, 3))
+        del RECENT_LATENCIES[:-RECENT_LATENCY_SAMPLES]
+        prev = st["latency"]
+        st["latency"] = round(
+            latency if prev is None else prev + LATENCY_ALPHA * (latency - prev), 3
+        )
+
 
+def _order_strategies(strategies):
+    """
+    Strategies whose last attempt succeeded come first, fastest EWMA latency
+    first; untried ones keep their default order; last-failed ones go last.
+    """
+
+    def rank(item):
+        pos, (label, _u, _h) = item
+        st = FETCH_STATS.get(label)
+        if not st or st.get("last_ok") is None:
+            return (1, 0.0, pos)
+        if st["last_ok"]:
+            return (0, st.get("latency") or 0.0, pos)
+        return (2, 0.0, pos)
+
+    with _STATS_LOCK:
+        ranked = sorted(enumerate(strategies), key=rank)
+    return [s for _pos, s in ranked]
+
+
+def _strategies(url):
+    """(label, url, headers) variants to try, in default order."""
     strategies = []
-    strategies.append((url, HEADERS_PRIMARY))
-    strategies.append((url, HEADERS_ALT))
+    strategies.append(("primary", url, HEADERS_PRIMARY))
+    strategies.append(("alt_headers", url, HEADERS_ALT))
 
     if "fq=brand:Raspberry+Pi" in url:
         u_enc = url.replace("fq=brand:Raspberry+Pi", "fq=brand:Raspberry%20Pi")
-        strategies.append((u_enc, HEADERS_ALT))
+        strategies.append(("brand_encoded", u_enc, HEADERS_ALT))
 
     if "myStore=false" in url:
         u_nostore = url.replace("&myStore=false", "")
-        strategies.append((u_nostore, HEADERS_ALT))
+        strategies.append(("no_store", u_nostore, HEADERS_ALT))
 
     if url.startswith("http"):
         proxy = f"https://r.jina.ai/{url}"
-        strategies.append((proxy, HEADERS_PRIMARY))
+        strategies.append(("jina_proxy", proxy, HEADERS_PRIMARY))
+    return strategies
+
+
+class HedgePolicy:
+    """
+    Optional hedging for get(): when the in-flight request has not answered
+    after `delay()` seconds, the next strategy is fired in parallel (at most
+    max_extra extra requests in flight) and the first success wins.
+    """
+
+    MIN_SAMPLES = 5
+    DEFAULT_DELAY = 2.0
+
+    def __init__(self, enabled=False, after=None, max_extra=1):
+        self.enabled = enabled
+        self.after = after
+        self.max_extra = max_extra
+
+    def delay(self):
+        """Fixed threshold if set, else p50 of recent successful fetches."""
+        if self.after is not None:
+            return self.after
+        with _STATS_LOCK:
+            samples = sorted(RECENT_LATENCIES)
+        if len(samples) < self.MIN_SAMPLES:
+            return self.DEFAULT_DELAY
+        return samples[len(samples) // 2]
+
+
+HEDGE = HedgePolicy()
+
+
+def _raise_fetch_error(last_err):
+    if isinstance(last_err, requests.HTTPError) and getattr(last_err, "response", None) is not None:
+        code = last_err.response.status_code
+        text = last_err.response.text[:300].replace("\n", " ")
+        raise requests.HTTPError(
+            f"{code} for {last_err.response.url} :: {text}"
+        ) from last_err
+    raise last_err or RuntimeError("Unknown fetch error")
+
+
+def _get_hedged(url, strategies, throttle):
+    """
+    Walk strategies like get(), but hedge slow requests. Losers are cancelled
+    if not yet started; running ones are abandoned and their result dropped.
+    """
+    queue = list(strategies)
+    pending = {}
+    hedged_any = False
+    attempt = 0
+    pool = ThreadPoolExecutor(max_workers=1 + HEDGE.max_extra)
+
+    def launch(hedge=False):
+        nonlocal attempt
+        attempt += 1
+        label, u, h = queue.pop(0)
+        fut = pool.submit(_attempt_get, u, h)
+        pending[fut] = (label, u, time.monotonic(), hedge)
+
+    last_err = None
+    try:
+        launch()
+        while pending:
+            can_hedge = queue and len(pending) < 1 + HEDGE.max_extra
+            done, _ = wait(
+                pending,
+                timeout=HEDGE.delay() if can_hedge else None,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                launch(hedge=True)
+                hedged_any = True
+                with _STATS_LOCK:
+                    HEDGE_STATS["fired"] += 1
+                continue
+            for fut in done:
+                label, u, started, hedge = pending.pop(fut)
+                try:
+                    resolved_url, html = fut.result()
+                except BudgetExhausted:
+                    raise
+                except Exception as e:
+                    _record_attempt(label, False, time.monotonic() - started)
+                    last_err = e
+                    continue
+                _record_attempt(label, True, time.monotonic() - started)
+                if hedged_any:
+                    with _STATS_LOCK:
+                        HEDGE_STATS["wins" if hedge else "losses"] += 1
+                if u.startswith("https://r.jina.ai/"):
+                    resolved_url = url
+                return resolved_url, html
+            if not pending and queue:
+                # nothing left in flight: back off like the serial path
+                time.sleep(throttle * (attempt ** 1.3))
+                launch()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    _raise_fetch_error(last_err)
+
+
+def get(url):
+    """
+    Warm up cookies (unless restored from the state file), then try multiple
+    header/URL variants, historically fastest working variant first.
+    """
+    # --- warm up once per run to set cookies/clearance ---
+    # (locked so concurrent batch queries share a single warm-up)
+    with _WARM_LOCK:
+        if not getattr(SESSION, "_warm", False):
+            try:
+                _session_get("https://www.microcenter.com/", timeout=15)
+                _session_get("https://www.microcenter.com/categories", timeout=15)
+                # touch "Shippable Items" store to encourage server-rendered listings
+                _session_get(
+                    "https://www.microcenter.com/search/search_results.aspx?storeid=029",
+                    timeout=15,
+                )
+                SESSION._warm = True
+                time.sleep(0.5)
+            except Exception:
+                pass
+
+    strategies = _order_strategies(_strategies(url))
 
     last_err = None
     throttle = float(os.environ.get("SCRAPER_THROTTLE", "0.8"))
-    for attempt, (u, h) in enumerate(strategies, start=1):
+    if HEDGE.enabled:
+        return _get_hedged(url, strategies, throttle)
+    for attempt, (label, u, h) in enumerate(strategies, start=1):
+        started = time.monotonic()
         try:
             resolved_url, html = _attempt_get(u, h)
+            _record_attempt(label, True, time.monotonic() - started)
             if u.startswith("https://r.jina.ai/"):
                 resolved_url = url
             return resolved_url, html
+        except BudgetExhausted:
+            raise
         except Exception as e:
+            _record_attempt(label, False, time.monotonic() - started)
             last_err = e
             backoff = throttle * (attempt ** 1.3)
             time.sleep(backoff)
 
-    if isinstance(last_err, requests.HTTPError) and getattr(last_err, "response", None) is not None:
-        code = last_err.response.status_code
-        text = last_err.response.text[:300].replace("\n", " ")
-        raise requests.HTTPError(
-            f"{code} for {last_err.response.url} :: {text}"
-        ) from last_err
-    raise last_err or RuntimeError("Unknown fetch error")
+    _raise_fetch_error(last_err)
 
 
 # ---------- Helpers ----------
@@ -136,41 +445,19 @@ def normalize_price(val: str) -> str:
         return ""
 
 
-AVAIL_HINTS = (
-    "Usually ships",
-    "In stock",
-    "SOLD OUT",
-    "Sold Out",
-    "Out of Stock",
-    "In-Store Only",
-    "Buy In Store",
-    "Pickup Today",
-    "In-Store Pickup",
-    "Pickup Only",
-)
+# ---------- Parser backends ----------
+# Every backend here builds a BeautifulSoup tree, so the tile logic below runs
+# unchanged; lxml is the fast path when installed.
+PARSER_BACKENDS = ("html.parser", "lxml", "html5lib")
+DEFAULT_PARSER = "html.parser"
 
 
-def classify_availability(text: str) -> tuple[str, str]:
-    t = (text or "").lower()
-    availability_raw = ""
-    for h in AVAIL_HINTS:
-        if h.lower() in t:
-            availability_raw = h
-            break
-    if (
-        "buy in store" in t
-        or "in-store only" in t
-        or "in store only" in t
-        or "pickup today" in t
-        or "in-store pickup" in t
-        or "pickup only" in t
-    ):
-        return availability_raw or "Buy In Store", "Buy In Store"
-    if "sold out" in t or "out of stock" in t:
-        return availability_raw or "Sold Out", "Out of Stock"
-    if "usually ships" in t or "in stock" in t:
-        return availability_raw or "In stock", "In Stock"
-    return availability_raw, ""
+def parser_available(parser: str) -> bool:
+    return builder_registry.lookup(parser) is not None
+
+
+def make_soup(html: str, parser: str = DEFAULT_PARSER):
+    return BeautifulSoup(html, parser)
 
 
 def absolutize(href):
@@ -180,36 +467,160 @@ def absolutize(href):
 
 
 # ---------- Caching ----------
+# Content-addressed layout, deduplicated across runs:
+#   <cache_dir>/blobs/<sha[:2]>/<sha>.html.gz   gzip'd page body, keyed by sha256
+#   <cache_dir>/index.jsonl                      one line per save:
+#     {"run", "query", "fetched_at", "kind", "key", "sha256", "bytes"}
+# query names the listing a page belongs to: BRAND_QUERY for the plain brand
+# scrape, the manifest query name, or "store:<id>" for --stores. One run can
+# hold several queries, so cached runs are keyed by (run, query).
+# Older runs wrote flat <ts>__<kind>__<hash>.html files; they are still read
+# (as BRAND_QUERY, like index lines written before query was recorded).
+CACHE_INDEX = "index.jsonl"
+BRAND_QUERY = "brand"
+LEGACY_CACHE_RE = re.compile(r"^(\d{8}T\d{6}Z)__([a-z0-9_-]+)__[0-9a-f]+\.html$")
+_CACHE_LOCK = threading.Lock()
+
+
 def _ts():
     return datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
 
 
-def _short_hash(s: str) -> str:
-    return hashlib.sha1((s or "").encode("utf-8")).hexdigest()[:10]
+RUN_ID = _ts()
+
 
+def _blob_path(cache_dir: Path, sha: str) -> Path:
+    return cache_dir / "blobs" / sha[:2] / f"{sha}.html.gz"
 
-def cache_save_html(cache_dir: Path, kind: str, key: str, html: str):
+
+def cache_save_html(
+    cache_dir: Path, kind: str, key: str, html: str, query: str = BRAND_QUERY
+):
     """
-    Save HTML under cache_dir with a stable-ish filename.
-    kind: 'listing' or 'tile'
+    Store HTML as a compressed blob (written once per distinct body) and
+    record the save in the cache index.
+    kind: 'listing', 'listing_p<N>' or 'tile'
     key: url (for listing) or 'SKU:<sku>' (for tile)
+    query: the listing query the page was fetched for
     """
-    cache_dir.mkdir(parents=True, exist_ok=True)
+    body = (html or "").encode("utf-8")
+    sha = hashlib.sha256(body).hexdigest()
+    path = _blob_path(cache_dir, sha)
     safe_kind = re.sub(r"[^a-z0-9_-]+", "-", kind.lower())
-    base = f"{_ts()}__{safe_kind}__{_short_hash(key)}.html"
-    path = cache_dir / base
-    path.write_text(html or "", encoding="utf-8")
+    entry = {
+        "run": RUN_ID,
+        "query": query,
+        "fetched_at": _ts(),
+        "kind": safe_kind,
+        "key": key,
+        "sha256": sha,
+        "bytes": len(body),
+    }
+    with _CACHE_LOCK:
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(gzip.compress(body, mtime=0))
+            tmp.replace(path)
+        with (cache_dir / CACHE_INDEX).open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
     return str(path)
 
 
+def cache_entries(cache_dir: Path) -> list[dict]:
+    """
+    Return every cached save, oldest first: index entries plus legacy flat
+    .html files (grouped into one run per UTC day).
+    """
+    entries = []
+    for legacy in sorted(cache_dir.glob("*.html")):
+        m = LEGACY_CACHE_RE.match(legacy.name)
+        if not m:
+            continue
+        ts, kind = m.groups()
+        entries.append(
+            {
+                "run": ts[:8],
+                "query": BRAND_QUERY,
+                "fetched_at": ts,
+                "kind": kind,
+                "key": "",
+                "path": str(legacy),
+            }
+        )
+    index = cache_dir / CACHE_INDEX
+    if index.exists():
+        with index.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entry.setdefault("query", BRAND_QUERY)
+                entry["path"] = str(_blob_path(cache_dir, entry["sha256"]))
+                entries.append(entry)
+    entries.sort(key=lambda e: e["fetched_at"])
+    return entries
+
+
+def cache_read(entry: dict) -> str:
+    path = Path(entry["path"])
+    if path.suffix == ".gz":
+        return gzip.decompress(path.read_bytes()).decode("utf-8")
+    return path.read_text(encoding="utf-8", errors="ignore")
+
+
+def _listing_page_no(kind: str) -> int | None:
+    if kind == "listing":
+        return 1
+    m = re.fullmatch(r"listing_p(\d+)", kind)
+    return int(m.group(1)) if m else None
+
+
+def cache_runs(cache_dir: Path) -> dict[tuple[str, str], list[dict]]:
+    """
+    Group cached listing pages by (run, query), oldest run first. Pages of
+    one query are in pagination order and deduplicated by page number.
+    """
+    runs: dict[tuple[str, str], dict[int, dict]] = {}
+    for entry in cache_entries(cache_dir):
+        page_no = _listing_page_no(entry["kind"])
+        if page_no is None:
+            continue
+        runs.setdefault((entry["run"], entry["query"]), {})[page_no] = entry
+    return {
+        key: [pages[n] for n in sorted(pages)]
+        for key, pages in sorted(runs.items())
+    }
+
+
+def select_cache_run(cache_dir: Path, which: str = "latest", query: str = BRAND_QUERY):
+    """
+    Pick the pages of one query from a cached run: 'latest', a run id, or a
+    YYYY-MM-DD date (latest run that day). Returns (run_id, entries) or
+    (None, []).
+    """
+    runs = {run: pages for (run, q), pages in cache_runs(cache_dir).items() if q == query}
+    if which == "latest":
+        candidates = list(runs)
+    else:
+        day = which.replace("-", "")
+        candidates = [r for r in runs if r == which or r[:8] == day]
+    if not candidates:
+        return None, []
+    run = candidates[-1]
+    return run, runs[run]
+
+
 # ---------- JSON-LD fallback (ItemList on listing pages) ----------
-def parse_listing_jsonld(html: str):
+def parse_listing_jsonld(html, parser: str = DEFAULT_PARSER):
     """
     Return rows from JSON-LD ItemList on listing pages.
+    Accepts raw HTML or an already parsed soup (avoids a second parse).
     Each row: {sku,name,price,availability,stock,url}
     """
     rows = []
-    soup = BeautifulSoup(html, "html.parser")
+    soup = html if isinstance(html, BeautifulSoup) else make_soup(html, parser)
     for tag in soup.find_all("script", type="application/ld+json"):
         try:
             data = json.loads(tag.string or "")
@@ -283,30 +694,79 @@ def parse_listing_jsonld(html: str):
 
 
 # ---------- Parsing tiles ----------
-def extract_tile_data(tile):
-    txt = tile.get_text(" ", strip=True)
+MAIN_STRING_TYPES = frozenset({NavigableString, CData})
 
-    # SKU
-    msku = SKU_RE.search(txt)
-    sku = msku.group(1) if msku else ""
+
+def scan_tile(tile):
+    """
+    Walk a tile subtree once and collect everything the tile logic needs:
+    text (same as get_text(" ", strip=True)), SKU, price nodes, product
+    anchors and whether any descendant carries a sku-ish class.
+    """
+    types = getattr(tile, "interesting_string_types", None) or MAIN_STRING_TYPES
+    texts = []
+    price_node = meta_price = None
+    links = []
+    has_sku_class = False
+    for node in tile.descendants:
+        if isinstance(node, NavigableString):
+            if type(node) in types:
+                stripped = node.strip()
+                if stripped:
+                    texts.append(stripped)
+            continue
+        attrs = node.attrs
+        if attrs.get("itemprop") == "price":
+            if price_node is None:
+                price_node = node
+            if meta_price is None and node.name == "meta":
+                meta_price = node
+        if node.name == "a":
+            href = attrs.get("href")
+            if href is not None and "/product/" in href:
+                links.append(node)
+        if not has_sku_class and any(
+            SKU_CLASS_RE.search(c) for c in attrs.get("class", ())
+        ):
+            has_sku_class = True
+
+    text = " ".join(texts)
+    msku = SKU_RE.search(text)
+    return {
+        "text": text,
+        "sku": msku.group(1) if msku else "",
+        "price_node": price_node,
+        "meta_price": meta_price,
+        "links": links,
+        "has_sku_class": has_sku_class,
+    }
+
+
+def extract_tile_data(tile, scan=None, keep_html=False):
+    """
+    Build a row from a tile. Pass the scan_tile() result when it is already
+    known; tile HTML is only serialized when keep_html is set.
+    """
+    if scan is None:
+        scan = scan_tile(tile)
+    txt = scan["text"]
 
     # Name + URL
     name = ""
     prod_link = None
-    for a in tile.find_all("a", href=True):
-        if "/product/" in a["href"]:
-            prod_link = absolutize(a["href"])
-            t = a.get_text(" ", strip=True)
-            if len(t) > len(name):
-                name = t
+    for a in scan["links"]:
+        prod_link = absolutize(a["href"])
+        t = a.get_text(" ", strip=True)
+        if len(t) > len(name):
+            name = t
 
     # Price
     price = ""
-    price_node = tile.find(attrs={"itemprop": "price"})
+    price_node = scan["price_node"]
     if price_node:
         price = normalize_price(price_node.get_text("", strip=True))
     if not price:
-        meta_price = tile.find("meta", attrs={"itemprop": "price"})
+        meta_price = scan["meta_price"]
         if meta_price and meta_price.get("content"):
             price = normalize_price(meta_price["content"])
     if not price:
@@ -314,23 +774,28 @@ def extract_tile_data(tile):
 
     availability, stock = classify_availability(txt)
 
-    return {
-        "sku": sku,
+    row = {
+        "sku": scan["sku"],
         "name": name,
         "price": price,
         "availability": availability,
         "stock": stock,
         "url": prod_link or "",
-        "tile_html": str(tile),  # for optional caching
     }
+    if keep_html:
+        row["tile_html"] = str(tile)  # for optional caching
+    return row
 
 
-def _locate_tile_from_anchor(anchor):
+def _locate_tile_from_anchor(anchor, scans=None):
     """
     Walk anchor ancestors and try to locate the product wrapper element.
     Prefer <li>/<article> with product-ish classes, otherwise fall back to a div
     that actually contains price data to avoid stopping on partial columns.
+    scans memoizes scan_tile() per ancestor across anchors.
     """
+    if scans is None:
+        scans = {}
     best = None
     for depth, parent in enumerate(anchor.parents):
         if depth > 10 or not getattr(parent, "name", None):
@@ -354,9 +819,10 @@ def _locate_tile_from_anchor(anchor):
             return parent
 
         if parent.name in {"div", "section"} and has_product_hint:
-            if parent.find(attrs={"itemprop": "price"}) or PRICE_RE.search(
-                parent.get_text(" ", strip=True)
-            ):
+            key = id(parent)
+            scan = scans.get(key) or scan_tile(parent)
+            scans[key] = scan
+            if scan["price_node"] or PRICE_RE.search(scan["text"]):
                 best = best or parent
 
         if parent.name in {"ul", "ol"}:
@@ -367,11 +833,14 @@ def _locate_tile_from_anchor(anchor):
     return best
 
 
-def find_product_tiles(soup):
+def find_product_tiles(soup, scans=None):
     """
     Return a list of product tile elements from the listing soup.
     Tries explicit selectors first, then falls back to anchor-based traversal.
+    If scans is a dict, it is filled with id(tile) -> scan_tile() results.
     """
+    if scans is None:
+        scans = {}
     selectors = [
         "li.product_wrapper",
         "li.product-wrap",
@@ -391,13 +860,13 @@ def find_product_tiles(soup):
             key = id(tile)
             if key in seen:
                 continue
-            if not tile.find("a", href=re.compile("/product/")):
+            scan = scans.get(key) or scan_tile(tile)
+            scans[key] = scan
+            if not scan["links"]:
                 continue
-            txt = tile.get_text(" ", strip=True)
-            has_price = bool(
-                tile.find(attrs={"itemprop": "price"}) or PRICE_RE.search(txt)
-            )
-            has_sku = "sku:" in txt.lower() or tile.find(class_=SKU_CLASS_RE)
+            txt = scan["text"]
+            has_price = bool(scan["price_node"] or PRICE_RE.search(txt))
+            has_sku = "sku:" in txt.lower() or scan["has_sku_class"]
             if not (has_price or has_sku):
                 continue
             seen.add(key)
@@ -407,7 +876,7 @@ def find_product_tiles(soup):
 
     anchors = [a for a in soup.find_all("a", href=True) if "/product/" in a["href"]]
     for anchor in anchors:
-        tile = _locate_tile_from_anchor(anchor)
+        tile = _locate_tile_from_anchor(anchor, scans)
         if not tile:
             continue
         key = id(tile)
@@ -430,13 +899,106 @@ def find_pages(soup, current_url):
     return sorted(pages, key=lambda u: (len(u), u))
 
 
+def parse_listing_page(
+    soup,
+    cache_dir: Path | None = None,
+    cache_tiles: bool = False,
+    query: str = BRAND_QUERY,
+):
+    """
+    Turn one parsed listing page into rows, falling back to JSON-LD when no
+    tiles are found.
+    """
+    # Collect potential product tiles on the page
+    scans = {}
+    tiles = find_product_tiles(soup, scans)
+    keep_html = bool(cache_dir and cache_tiles)
+
+    page_rows = []
+    for tix, tile in enumerate(tiles, start=1):
+        row = extract_tile_data(tile, scans.get(id(tile)), keep_html=keep_html)
+        if row["name"] and (row["sku"] or row["url"]):
+            if keep_html:
+                cache_key = f"SKU:{row['sku'] or 'unknown'}__{tix}"
+                cache_save_html(cache_dir, "tile", cache_key, row["tile_html"], query)
+            row.pop("tile_html", None)
+            page_rows.append(row)
+
+    # JSON-LD ItemList fallback if no tiles found
+    if not page_rows:
+        jl_rows = parse_listing_jsonld(soup)
+        if jl_rows:
+            page_rows = jl_rows
+    return page_rows
+
+
+def parse_cached_run(entries, parser: str = DEFAULT_PARSER):
+    """
+    Re-parse the cached listing pages of one run (see select_cache_run)
+    without touching the network.
+    """
+    rows = []
+    for entry in entries:
+        try:
+            html = cache_read(entry)
+        except (OSError, ValueError) as exc:
+            print(f"[warn] unreadable cache entry {entry['path']}: {exc}", file=sys.stderr)
+            continue
+        rows.extend(parse_listing_page(make_soup(html, parser)))
+    return rows
+
+
+def _fetch_page(
+    idx, purl, cache_dir: Path | None = None, delay: float = 0.0, query: str = BRAND_QUERY
+):
+    """
+    Fetch one pagination page; returns HTML or None on failure.
+    delay is slept after the request so each worker stays throttled.
+    """
+    try:
+        _, ph = get(purl)
+    except Exception as exc:
+        print(f"[warn] fetch failed for {purl}: {exc}", file=sys.stderr)
+        return None
+    finally:
+        if delay:
+            time.sleep(delay)
+    if cache_dir:
+        saved = cache_save_html(cache_dir, f"listing_p{idx}", purl, ph, query)
+        print(f"[cache] listing page {idx} -> {saved}")
+    return ph
+
+
+def _fetch_pages_concurrently(
+    pages, concurrency, throttle, cache_dir=None, query: str = BRAND_QUERY
+):
+    """
+    Fetch (idx, url) pairs on a bounded thread pool sharing SESSION.
+    Returns {url: html or None}; callers iterate in their own order.
+    """
+    _ensure_pool_size(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            purl: pool.submit(_fetch_page, idx, purl, cache_dir, throttle, query)
+            for idx, purl in pages
+        }
+        return {purl: fut.result() for purl, fut in futures.items()}
+
+
 def scrape_listing(
     url,
     follow_pages=False,
     throttle=0.8,
     cache_dir: Path | None = None,
     cache_tiles: bool = False,
+    concurrency: int = 1,
+    parser: str = DEFAULT_PARSER,
+    query: str = BRAND_QUERY,
 ):
+    """
+    Scrape one listing (and its pagination with follow_pages). query tags
+    the pages saved to cache_dir.
+    """
     seen_urls = set()
     all_rows = []
 
@@ -446,54 +1008,183 @@ def scrape_listing(
         print(f"[warn] initial fetch failed: {exc}", file=sys.stderr)
         return []
     if cache_dir:
-        saved = cache_save_html(cache_dir, "listing", final_url, html)
+        saved = cache_save_html(cache_dir, "listing", final_url, html, query)
         print(f"[cache] listing -> {saved}")
-    soup = BeautifulSoup(html, "html.parser")
+    first_soup = make_soup(html, parser)
     page_urls = [final_url]
     if follow_pages:
-        page_urls = find_pages(soup, final_url)
+        page_urls = find_pages(first_soup, final_url)
 
+    pages = []
     for idx, purl in enumerate(page_urls, start=1):
         if purl in seen_urls:
             continue
         seen_urls.add(purl)
+        pages.append((idx, purl))
+
+    # Fetch the remaining pages up front when running concurrently; parsing
+    # still happens below in page order so output stays deterministic.
+    prefetched = None
+    remaining = [(idx, purl) for idx, purl in pages if purl != final_url]
+    if concurrency > 1 and len(remaining) > 1:
+        prefetched = _fetch_pages_concurrently(
+            remaining, concurrency, throttle, cache_dir, query
+        )
 
-        if purl != final_url:
-            try:
-                _, ph = get(purl)
-            except Exception as exc:
-                print(f"[warn] fetch failed for {purl}: {exc}", file=sys.stderr)
+    for idx, purl in pages:
+        if purl == final_url:
+            soup = first_soup
+        else:
+            if prefetched is not None:
+                ph = prefetched.get(purl)
+            else:
+                ph = _fetch_page(idx, purl, cache_dir, query=query)
+            if ph is None:
                 continue
-            if cache_dir:
-                saved = cache_save_html(cache_dir, f"listing_p{idx}", purl, ph)
-                print(f"[cache] listing page {idx} -> {saved}")
-            soup = BeautifulSoup(ph, "html.parser")
-
-        # Collect potential product tiles on the page
-        tiles = find_product_tiles(soup)
-
-        page_rows = []
-        for tix, tile in enumerate(tiles, start=1):
-            row = extract_tile_data(tile)
-            if row["name"] and (row["sku"] or row["url"]):
-                if cache_dir and cache_tiles:
-                    cache_key = f"SKU:{row['sku'] or 'unknown'}__{tix}"
-                    cache_save_html(cache_dir, "tile", cache_key, row["tile_html"])
-                row.pop("tile_html", None)
-                page_rows.append(row)
-
-        # JSON-LD ItemList fallback if no tiles found
-        if not page_rows:
-            jl_rows = parse_listing_jsonld(str(soup))
-            if jl_rows:
-                page_rows = jl_rows
-
-        all_rows.extend(page_rows)
-        time.sleep(throttle)
+            soup = make_soup(ph, parser)
+
+        all_rows.extend(parse_listing_page(soup, cache_dir, cache_tiles, query))
+        if prefetched is None:
+            time.sleep(throttle)
 
     return all_rows
 
 
+# ---------- Batch (manifest) ----------
+def with_store(url: str, storeid: str | None) -> str:
+    """Return url with its storeid query parameter set (or left alone)."""
+    if not storeid:
+        return url
+    parts = urllib.parse.urlsplit(url)
+    query = [
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() != "storeid"
+    ]
+    query.append(("storeid", str(storeid)))
+    return urllib.parse.urlunsplit(
+        parts._replace(query=urllib.parse.urlencode(query, safe=":"))
+    )
+
+
+def load_manifest(path: Path) -> list[dict]:
+    """
+    Load batch queries from JSON or YAML (YAML needs PyYAML). Accepts a list of
+    queries or {"queries": [...]}; each query has url plus optional name,
+    pages ('1'/'all') and storeid.
+    """
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in {".yml", ".yaml"}:
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("YAML manifests need PyYAML (pip install pyyaml)")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("queries", [])
+    queries = []
+    for i, q in enumerate(data or [], start=1):
+        if not isinstance(q, dict) or not q.get("url"):
+            raise SystemExit(f"{path}: query #{i} needs a url")
+        storeid = q.get("storeid")
+        queries.append(
+            {
+                "name": str(q.get("name") or f"query{i}"),
+                "url": with_store(q["url"], str(storeid) if storeid else None),
+                "pages": str(q.get("pages", "1")),
+            }
+        )
+    return queries
+
+
+def scrape_manifest(queries, query_concurrency: int = 2, **listing_kwargs):
+    """
+    Run manifest queries concurrently over the shared SESSION (one warm-up,
+    shared budget/rate limit). Rows come back in manifest order, each tagged
+    with source_query, so the SKU dedupe keeps the first query's row.
+    Cached pages are tagged with the query's cache_query (default: its name).
+    """
+    _ensure_pool_size(
+        query_concurrency * max(1, listing_kwargs.get("concurrency", 1))
+    )
+    with ThreadPoolExecutor(max_workers=max(1, query_concurrency)) as pool:
+        futures = [
+            pool.submit(
+                scrape_listing,
+                q["url"],
+                follow_pages=(q["pages"].lower() == "all"),
+                query=q.get("cache_query") or q["name"],
+                **listing_kwargs,
+            )
+            for q in queries
+        ]
+        results = [fut.result() for fut in futures]
+
+    rows = []
+    for q, qrows in zip(queries, results):
+        print(f"[batch] {q['name']}: {len(qrows)} rows", file=sys.stderr)
+        for r in qrows:
+            r["source_query"] = q["name"]
+            rows.append(r)
+    return rows
+
+
+# ---------- Output ----------
+SNAPSHOT_FIELDS = ["sku", "name", "price", "availability", "stock", "url"]
+
+
+def dedupe_rows(rows):
+    """Dedupe by SKU (keep first); rows without a SKU are kept as URL-only."""
+    uniq, seen = [], set()
+    for r in rows:
+        k = r.get("sku", "")
+        if k and k not in seen:
+            uniq.append(r)
+            seen.add(k)
+        elif not k:
+            uniq.append(r)  # keep rows without SKU in case URL-only
+    return uniq
+
+
+def write_snapshot(out: Path, rows, fieldnames=SNAPSHOT_FIELDS):
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w.writeheader()
+        for r in rows:
+            w.writerow(r)
+
+
+STORE_FIELDS = ["date", "store_id", "sku", "price", "stock"]
+
+
+def store_matrix_rows(rows, date: str):
+    """
+    Long-format (date, store_id, sku, price, stock) rows from a --stores run,
+    where source_query holds the store id. Deduped by SKU within each store.
+    """
+    by_store: dict[str, list[dict]] = {}
+    for r in rows:
+        by_store.setdefault(r["source_query"], []).append(r)
+    out = []
+    for store_id, store_rows in by_store.items():
+        for r in dedupe_rows(store_rows):
+            if not r.get("sku"):
+                continue
+            out.append(
+                {
+                    "date": date,
+                    "store_id": store_id,
+                    "sku": r["sku"],
+                    "price": r.get("price", ""),
+                    "stock": r.get("stock", ""),
+                }
+            )
+    return out
+
+
 # ---------- CLI ----------
 def main():
     ap = argparse.ArgumentParser()
@@ -516,7 +1207,8 @@ def main():
         help="'1' for first page only, or 'all' to follow pagination",
     )
     ap.add_argument(
-        "--cache-dir", help="Directory to save fetched HTML (listing pages)"
+        "--cache-dir",
+        help="Directory for the compressed, content-addressed HTML cache",
     )
     ap.add_argument(
         "--cache-tiles",
@@ -526,18 +1218,162 @@ def main():
     ap.add_argument(
         "--throttle", type=float, default=0.8, help="Delay between page fetches (sec)"
     )
+    ap.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Fetch up to N pagination pages in parallel with --pages all (default 1)",
+    )
+    ap.add_argument(
+        "--host-budget",
+        type=int,
+        help="Max requests sent to any one host this run, retries included",
+    )
+    ap.add_argument(
+        "--parser",
+        choices=PARSER_BACKENDS,
+        default=DEFAULT_PARSER,
+        help="HTML parser backend for BeautifulSoup (lxml is fastest if installed)",
+    )
+    ap.add_argument(
+        "--manifest",
+        help="JSON/YAML list of queries to scrape in one run into a combined snapshot",
+    )
+    ap.add_argument(
+        "--stores",
+        help=(
+            "Comma-separated store IDs: scrape the listing once per store and write "
+            "a long-format data/snapshots/<DATE>_stores.csv"
+        ),
+    )
+    ap.add_argument(
+        "--batch-concurrency",
+        type=int,
+        default=2,
+        help="Manifest queries scraped in parallel (default 2)",
+    )
+    ap.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="Max requests/sec per host across all workers (0 = off)",
+    )
+    ap.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Fire the next fetch strategy in parallel when a request is slow",
+    )
+    ap.add_argument(
+        "--hedge-after",
+        type=float,
+        help="Hedge threshold in seconds (default: p50 of recent fetch latencies)",
+    )
+    ap.add_argument(
+        "--hedge-max",
+        type=int,
+        default=1,
+        help="Max extra in-flight requests per fetch when hedging (default 1)",
+    )
+    ap.add_argument(
+        "--state",
+        default=str(STATE_PATH),
+        help="Cookie jar + strategy stats file (default: $SCRAPER_STATE or %(default)s)",
+    )
+    ap.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Do not load or save the persisted fetch state",
+    )
+    ap.add_argument(
+        "--replay",
+        nargs="?",
+        const="latest",
+        metavar="RUN",
+        help=(
+            "Re-parse cached listing pages from --cache-dir without network access. "
+            "RUN is 'latest' (default), a run id, or a YYYY-MM-DD date."
+        ),
+    )
+    ap.add_argument(
+        "--replay-query",
+        default=BRAND_QUERY,
+        metavar="NAME",
+        help=(
+            "Cached query to replay: %(default)s (the brand listing), a manifest "
+            "query name, or store:<id>"
+        ),
+    )
     args = ap.parse_args()
+    if not parser_available(args.parser):
+        ap.error(f"parser backend '{args.parser}' is not installed (pip install {args.parser})")
 
     cache_dir = Path(args.cache_dir) if args.cache_dir else None
-
-    rows = scrape_listing(
-        args.url,
-        follow_pages=(args.pages.lower() == "all"),
-        cache_dir=cache_dir,
-        cache_tiles=bool(args.cache_tiles),
-        throttle=args.throttle,
-    )
-    if not rows:
+    HOST_BUDGET.limit = args.host_budget
+    RATE_LIMIT.rate = max(0.0, args.rate_limit)
+    HEDGE.enabled = args.hedge
+    HEDGE.after = args.hedge_after
+    HEDGE.max_extra = max(1, args.hedge_max)
+
+    run_date = datetime.utcnow().strftime("%Y-%m-%d")
+    fieldnames = SNAPSHOT_FIELDS
+    if args.replay:
+        if not cache_dir:
+            ap.error("--replay needs --cache-dir")
+        run_id, entries = select_cache_run(cache_dir, args.replay, args.replay_query)
+        if not run_id:
+            ap.error(
+                f"no cached '{args.replay_query}' listing pages for '{args.replay}' "
+                f"in {cache_dir}"
+            )
+        print(
+            f"[replay] run {run_id} ({args.replay_query}): {len(entries)} cached page(s)",
+            file=sys.stderr,
+        )
+        run_date = f"{run_id[:4]}-{run_id[4:6]}-{run_id[6:8]}"
+        rows = parse_cached_run(entries, args.parser)
+    else:
+        state_path = None if args.no_state else Path(args.state)
+        if state_path:
+            load_fetch_state(state_path)
+        listing_kwargs = dict(
+            cache_dir=cache_dir,
+            cache_tiles=bool(args.cache_tiles),
+            throttle=args.throttle,
+            concurrency=max(1, args.concurrency),
+            parser=args.parser,
+        )
+        if args.stores:
+            store_ids = [sid.strip() for sid in args.stores.split(",") if sid.strip()]
+            queries = [
+                {
+                    "name": sid,
+                    "url": with_store(args.url, sid),
+                    "pages": args.pages,
+                    "cache_query": f"store:{sid}",
+                }
+                for sid in store_ids
+            ]
+            rows = scrape_manifest(queries, args.batch_concurrency, **listing_kwargs)
+        elif args.manifest:
+            queries = load_manifest(Path(args.manifest))
+            rows = scrape_manifest(queries, args.batch_concurrency, **listing_kwargs)
+            fieldnames = SNAPSHOT_FIELDS + ["source_query"]
+        else:
+            rows = scrape_listing(
+                args.url,
+                follow_pages=(args.pages.lower() == "all"),
+                **listing_kwargs,
+            )
+        if state_path:
+            save_fetch_state(state_path)
+        if args.stores:
+            store_rows = store_matrix_rows(rows, run_date)
+            default_path = Path("data/snapshots") / f"{run_date}_stores.csv"
+            out = Path(args.out) if args.out else default_path
+            write_snapshot(out, store_rows, STORE_FIELDS)
+            print(f"Wrote {len(store_rows)} store rows -> {out}")
+            return
+    if not rows and not args.replay:
         fallback_path = os.environ.get(
             "SCRAPER_FALLBACK",
             "data/snapshots/_fallback_pi_brand.csv",
@@ -555,41 +1391,23 @@ def main():
             except Exception as exc:
                 print(f"[fallback] failed to load {fallback}: {exc}", file=sys.stderr)
         if cache_dir and cache_dir.exists():
-            cache_files = sorted(cache_dir.glob("*.html"))
-            if cache_files:
-                latest_cache = cache_files[-1]
+            _, entries = select_cache_run(cache_dir)
+            if entries:
                 try:
-                    with latest_cache.open("r", encoding="utf-8", errors="ignore") as f:
-                        rows = parse_listing_jsonld(f.read())
+                    rows = parse_listing_jsonld(cache_read(entries[-1]), args.parser)
                 except Exception:
                     rows = []
-        if not rows:
-            print(
-                "No items found. Try --pages all, increase --throttle, or check cache HTML.",
-                file=sys.stderr,
-            )
-            sys.exit(2)
-
-    # Optional: dedupe by SKU (keep first)
-    uniq, seen = [], set()
-    for r in rows:
-        k = r.get("sku", "")
-        if k and k not in seen:
-            uniq.append(r)
-            seen.add(k)
-        elif not k:
-            uniq.append(r)  # keep rows without SKU in case URL-only
+    if not rows:
+        print(
+            "No items found. Try --pages all, increase --throttle, or check cache HTML.",
+            file=sys.stderr,
+        )
+        sys.exit(2)
 
-    default_path = Path("data/snapshots") / f"{datetime.utcnow().strftime('%Y-%m-%d')}_pi_brand.csv"
+    uniq = dedupe_rows(rows)
+    default_path = Path("data/snapshots") / f"{run_date}_pi_brand.csv"
     out = Path(args.out) if args.out else default_path
-    out.parent.mkdir(parents=True, exist_ok=True)
-    with out.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(
-            f, fieldnames=["sku", "name", "price", "availability", "stock", "url"]
-        )
-        w.writeheader()
-        for r in uniq:
-            w.writerow(r)
+    write_snapshot(out, uniq, fieldnames)
     print(f"Wrote {len(uniq)} rows -> {out}")
 
 
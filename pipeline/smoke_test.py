@@ -5,12 +5,128 @@ Run: python pipeline/smoke_test.py
 """
 
 from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
-import csv, datetime as dt, subprocess, sys
+import csv, datetime as dt, importlib.util, json, sqlite3, subprocess, sys, tempfile, threading
 
 ROOT = Path(__file__).resolve().parents[1]
 SNAP = ROOT / "data/snapshots"
 HIST = ROOT / "data/history/price_history.csv"
+GOLDEN = ROOT / "pipeline/fixtures/history_v1"
+
+
+def check_webhook(today: str) -> None:
+    """12_alerts.py --webhook against a local HTTP stand-in."""
+    received = []
+
+    class Hook(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Hook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yesterday = (dt.date.fromisoformat(today) - dt.timedelta(days=1)).isoformat()
+    # 999001 was sold out at a higher price the day before the fake snapshot
+    state = {
+        "date": yesterday,
+        "skus": {
+            "999001": {
+                "name": "Raspberry Pi 4 4GB Board",
+                "price": 99.99,
+                "status": "sold_out",
+                "last_seen": yesterday,
+                "min": 99.99,
+            }
+        },
+    }
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = Path(tmp) / "alert_state.json"
+            state_path.write_text(json.dumps(state), encoding="utf-8")
+            # keep the synthetic alerts out of data/history/alerts.jsonl
+            alerts_path = Path(tmp) / "alerts.jsonl"
+            subprocess.check_call(
+                [
+                    sys.executable,
+                    "pipeline/12_alerts.py",
+                    "--webhook",
+                    f"http://127.0.0.1:{server.server_port}/alerts",
+                    "--state",
+                    str(state_path),
+                    "--alerts",
+                    str(alerts_path),
+                ],
+                cwd=ROOT,
+            )
+            logged = [json.loads(line) for line in alerts_path.read_text(encoding="utf-8").splitlines()]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(received) == 1, "webhook not called once"
+    assert received[0]["date"] == today, "webhook payload has the wrong date"
+    types = {a["type"] for a in received[0]["alerts"] if a["sku"] == "999001"}
+    assert {"price_drop", "back_in_stock"} <= types, "webhook payload missing alerts"
+    assert logged == received[0]["alerts"], "--alerts log differs from the webhook payload"
+
+
+def check_history_golden() -> None:
+    """Version-1 history files must match pipeline/fixtures/history_v1/expected byte for byte."""
+    sys.path.insert(0, str(ROOT / "pipeline"))
+    from history_store import load_history
+
+    spec = importlib.util.spec_from_file_location("export_json", ROOT / "pipeline/25_export_json.py")
+    export_json = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(export_json)
+
+    df = load_history(csv_path=GOLDEN / "history.csv")
+    df = df.sort_values(["sku", "date"], kind="mergesort").reset_index(drop=True)
+    rendered = dict(export_json._export_histories(df))
+    expected = {p.name: p.read_bytes() for p in (GOLDEN / "expected").glob("*.json")}
+    assert sorted(rendered) == sorted(expected), "v1 history files differ from the golden set"
+    for filename, data in expected.items():
+        assert rendered[filename] == data, f"v1 history {filename} differs from the golden file"
+
+
+def check_sqlite_remerge(today: str) -> None:
+    """A re-scraped snapshot must not leave stale rows in prices.sqlite."""
+    yesterday = (dt.date.fromisoformat(today) - dt.timedelta(days=1)).isoformat()
+    header = ["sku", "name", "price", "availability", "stock", "url"]
+
+    def snapshot(root: Path, date: str, rows: list[list[str]]) -> None:
+        with (root / "data/snapshots" / f"{date}_pi_brand.csv").open("w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows([header, *rows])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "data/snapshots").mkdir(parents=True)
+        merge = [sys.executable, str(ROOT / "pipeline/10_merge_history.py")]
+        row = ["999001", "Raspberry Pi 4 4GB Board", "$54.99", "In stock", "In Stock", "https://example.com/p1"]
+        gone = ["999002", "Raspberry Pi 5 8GB Board", "$79.99", "In stock", "In Stock", "https://example.com/p2"]
+        snapshot(root, yesterday, [row, gone])
+        snapshot(root, today, [row, gone])
+        subprocess.check_call([*merge, "--sqlite"], cwd=root, stdout=subprocess.DEVNULL)
+        # yesterday's snapshot is re-scraped: one SKU dropped, the other repriced
+        snapshot(root, yesterday, [[*row[:2], "$49.99", *row[3:]]])
+        subprocess.check_call(merge, cwd=root, stdout=subprocess.DEVNULL)
+
+        with (root / "data/history/price_history.csv").open(newline="", encoding="utf-8") as f:
+            expected = sorted((r["sku"], r["date"], float(r["price"])) for r in csv.DictReader(f))
+        conn = sqlite3.connect(root / "data/history/prices.sqlite")
+        try:
+            stored = sorted(conn.execute("SELECT sku, date, price FROM prices"))
+        finally:
+            conn.close()
+    assert len(expected) == 3, "re-merged history has the wrong row count"
+    assert stored == expected, "prices.sqlite kept rows of the replaced snapshot"
+
+
 def main() -> None:
     SNAP.mkdir(parents=True, exist_ok=True)
     today = dt.date.today().isoformat()
@@ -43,17 +159,26 @@ def main() -> None:
 
     cmds = [
         [sys.executable, "pipeline/10_merge_history.py"],
+        [sys.executable, "pipeline/12_alerts.py"],
+        [sys.executable, "pipeline/13_stock_events.py"],
         [sys.executable, "pipeline/20_flags.py"],
+        [sys.executable, "pipeline/22_stats.py"],
         [sys.executable, "pipeline/25_export_json.py"],
         [sys.executable, "pipeline/26_build_markdown.py"],
         [sys.executable, "pipeline/27_update_readme.py"],
     ]
     for cmd in cmds:
         subprocess.check_call(cmd, cwd=ROOT)
+    check_webhook(today)
+    check_sqlite_remerge(today)
+    check_history_golden()
 
     assert HIST.exists(), "history not created"
+    assert (ROOT / "data/history/latest.csv").exists(), "latest table not written"
     latest_json = ROOT / "site/data/latest.json"
     assert latest_json.exists(), "latest.json not exported"
+    assert (ROOT / "site/data/stats.json").exists(), "stats.json not exported"
+    assert (ROOT / "site/data/stock_events.json").exists(), "stock_events.json not exported"
     sample_history = ROOT / "site/data/history/999001.json"
     assert sample_history.exists(), "per-SKU history missing"
     markdown_report = ROOT / "site/markdown/raspberry_pi.md"
@@ -108,3 +108,239 @@ function scrapegoat_load_asset(string $relativePath, bool $required = true): ?st
 
     return $cache[$key];
 }
+
+/**
+ * Expand a per-SKU history payload into [{date, price, is_sale, is_low}, ...].
+ * Accepts version 1 (history/<sku>.json, already a series) and version 2
+ * (history_compact/<sku>.json: start date + day gaps, prices, flag bitmask).
+ */
+function scrapegoat_history_series(array $item): array
+{
+    if ((int)($item['version'] ?? 1) < 2) {
+        return $item['series'] ?? [];
+    }
+
+    $series = [];
+    $day = new DateTimeImmutable((string)($item['start'] ?? ''), new DateTimeZone('UTC'));
+    $gaps = $item['days'] ?? [];
+    $prices = $item['prices'] ?? [];
+    $flags = $item['flags'] ?? [];
+    foreach ($gaps as $i => $gap) {
+        $day = $day->modify('+' . (int)$gap . ' day');
+        $mask = (int)($flags[$i] ?? 0);
+        $series[] = [
+            'date' => $day->format('Y-m-d'),
+            'price' => $prices[$i] ?? null,
+            'is_sale' => ($mask & 1) !== 0,
+            'is_low' => ($mask & 2) !== 0,
+        ];
+    }
+    return $series;
+}
+
+const SCRAPEGOAT_HISTORY_RANGES = ['90d' => 90, '1y' => 365, '3y' => 1095, 'all' => null];
+
+/**
+ * Resolution for a chart spanning $spanDays: daily up to a year, weekly up to
+ * four years, monthly beyond (same cut-offs as history_rollup.pick_resolution).
+ */
+function scrapegoat_pick_resolution(int $spanDays): string
+{
+    if ($spanDays <= 366) {
+        return 'day';
+    }
+    if ($spanDays <= 4 * 365 + 1) {
+        return 'week';
+    }
+    return 'month';
+}
+
+/**
+ * Decode a JSON asset into an array, or null when missing or malformed.
+ */
+function scrapegoat_load_json(string $relativePath): ?array
+{
+    $json = scrapegoat_load_asset($relativePath, required: false);
+    if ($json === null) {
+        return null;
+    }
+    try {
+        $data = json_decode($json, true, flags: JSON_THROW_ON_ERROR);
+    } catch (Throwable) {
+        return null;
+    }
+    return is_array($data) ? $data : null;
+}
+
+/**
+ * Load a SKU's history for a range key of SCRAPEGOAT_HISTORY_RANGES.
+ *
+ * The small monthly rollup is read first to learn the SKU's first/last day;
+ * the weekly rollup or the daily series is only fetched when the span calls
+ * for it. Points of a rollup carry the bucket's close as `price` plus open,
+ * min and max. Returns ['item' => ..., 'series' => ..., 'resolution' => ...]
+ * or null when the SKU is unknown.
+ */
+function scrapegoat_history_for_range(string $sku, string $range): ?array
+{
+    $rangeDays = SCRAPEGOAT_HISTORY_RANGES[$range] ?? null;
+    $month = scrapegoat_load_json("data/history_rollup/{$sku}.month.json");
+
+    $resolution = 'day';
+    $last = null;
+    if ($month !== null && isset($month['first'], $month['last'])) {
+        $first = new DateTimeImmutable((string)$month['first'], new DateTimeZone('UTC'));
+        $last = new DateTimeImmutable((string)$month['last'], new DateTimeZone('UTC'));
+        $span = (int)$first->diff($last)->days;
+        $resolution = scrapegoat_pick_resolution($rangeDays === null ? $span : min($span, $rangeDays));
+    }
+
+    $item = null;
+    if ($resolution === 'month') {
+        $item = $month;
+    } elseif ($resolution === 'week') {
+        $item = scrapegoat_load_json("data/history_rollup/{$sku}.week.json");
+    }
+
+    if ($item !== null) {
+        $series = [];
+        foreach ($item['period'] ?? [] as $i => $period) {
+            $mask = (int)($item['flags'][$i] ?? 0);
+            $series[] = [
+                'date' => $period,
+                'price' => $item['close'][$i] ?? null,
+                'open' => $item['open'][$i] ?? null,
+                'min' => $item['min'][$i] ?? null,
+                'max' => $item['max'][$i] ?? null,
+                'is_sale' => ($mask & 1) !== 0,
+                'is_low' => ($mask & 2) !== 0,
+            ];
+        }
+    } else {
+        $resolution = 'day';
+        // a local per-SKU file beats the bundle; the bundle (one seek or one
+        // Range request) beats fetching per-SKU files from the remote
+        $compact = "data/history_compact/{$sku}.json";
+        $item = is_file(__DIR__ . '/' . $compact) ? scrapegoat_load_json($compact) : null;
+        $item ??= scrapegoat_load_bundled_history($sku)
+            ?? scrapegoat_load_json($compact)
+            ?? scrapegoat_load_json("data/history/{$sku}.json");
+        if ($item === null) {
+            return null;
+        }
+        $series = scrapegoat_history_series($item);
+    }
+
+    if ($rangeDays !== null && $series !== []) {
+        $end = $last ?? new DateTimeImmutable((string)end($series)['date'], new DateTimeZone('UTC'));
+        $slack = ['day' => 0, 'week' => 6, 'month' => 30][$resolution];
+        $cutoff = $end->modify('-' . ($rangeDays + $slack) . ' day')->format('Y-m-d');
+        $series = array_values(array_filter(
+            $series,
+            static fn(array $point): bool => (string)$point['date'] >= $cutoff
+        ));
+    }
+
+    return ['item' => $item, 'series' => $series, 'resolution' => $resolution];
+}
+
+/**
+ * Read bytes [$offset, $offset + $length) of a site asset: a seek in the local
+ * file, else one HTTP Range request against the remote base.
+ */
+function scrapegoat_read_range(string $relativePath, int $offset, int $length): ?string
+{
+    $key = ltrim($relativePath, '/');
+    $localPath = __DIR__ . '/' . $key;
+    if (is_file($localPath)) {
+        $handle = @fopen($localPath, 'rb');
+        if ($handle === false) {
+            return null;
+        }
+        fseek($handle, $offset);
+        $body = fread($handle, $length);
+        fclose($handle);
+        return ($body === false || strlen($body) !== $length) ? null : $body;
+    }
+
+    $baseUrl = scrapegoat_remote_base_url();
+    if ($baseUrl === '') {
+        return null;
+    }
+    $url = $baseUrl . '/' . $key;
+    $range = $offset . '-' . ($offset + $length - 1);
+
+    if (function_exists('curl_init')) {
+        $handle = curl_init($url);
+        if ($handle === false) {
+            return null;
+        }
+        curl_setopt_array($handle, [
+            CURLOPT_RETURNTRANSFER => true,
+            CURLOPT_FOLLOWLOCATION => true,
+            CURLOPT_CONNECTTIMEOUT => 5,
+            CURLOPT_TIMEOUT => 10,
+            CURLOPT_USERAGENT => 'scrapegoat-site',
+            CURLOPT_RANGE => $range,
+        ]);
+        $body = curl_exec($handle);
+        $status = curl_getinfo($handle, CURLINFO_HTTP_CODE);
+        curl_close($handle);
+        if ($body === false) {
+            return null;
+        }
+    } else {
+        $context = stream_context_create([
+            'http' => [
+                'timeout' => 10,
+                'header' => "User-Agent: scrapegoat-site\r\nRange: bytes={$range}\r\n",
+            ],
+        ]);
+        $body = @file_get_contents($url, false, $context);
+        if ($body === false) {
+            return null;
+        }
+        $status = 206;
+        foreach ($http_response_header ?? [] as $line) {
+            if (preg_match('#^HTTP/\S+\s+(\d{3})#', $line, $m)) {
+                $status = (int)$m[1];
+            }
+        }
+    }
+
+    if ($status === 200) {
+        // server ignored the Range header and sent the whole file
+        $body = substr((string)$body, $offset, $length);
+    } elseif ($status !== 206) {
+        return null;
+    }
+    return strlen((string)$body) === $length ? (string)$body : null;
+}
+
+/**
+ * One SKU's v2 history from history_bundle.ndjson via its byte-offset index,
+ * or null when there is no bundle or the SKU is not in it.
+ */
+function scrapegoat_load_bundled_history(string $sku): ?array
+{
+    static $index = false;
+    if ($index === false) {
+        $index = scrapegoat_load_json('data/history_bundle.index.json');
+    }
+    $entry = $index['skus'][$sku] ?? null;
+    if (!is_array($entry) || count($entry) !== 2) {
+        return null;
+    }
+
+    $bundle = 'data/' . basename((string)($index['bundle'] ?? 'history_bundle.ndjson'));
+    $body = scrapegoat_read_range($bundle, (int)$entry[0], (int)$entry[1]);
+    if ($body === null) {
+        return null;
+    }
+    try {
+        $item = json_decode($body, true, flags: JSON_THROW_ON_ERROR);
+    } catch (Throwable) {
+        return null;
+    }
+    return is_array($item) ? $item : null;
+}
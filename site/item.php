@@ -10,8 +10,13 @@ if ($sku === '') {
     exit;
 }
 
-$historyJson = scrapegoat_load_asset("data/history/{$sku}.json", required: false);
-if ($historyJson === null) {
+$range = (string)($_GET['range'] ?? 'all');
+if (!array_key_exists($range, SCRAPEGOAT_HISTORY_RANGES)) {
+    $range = 'all';
+}
+
+$history = scrapegoat_history_for_range($sku, $range);
+if ($history === null) {
     http_response_code(404);
     echo "Unknown SKU.";
     exit;
@@ -36,20 +41,10 @@ if (!function_exists('render_fragment')) {
 }
 
 
-try {
-    $item = json_decode($historyJson, true, flags: JSON_THROW_ON_ERROR);
-} catch (Throwable) {
-    http_response_code(500);
-    echo "Item data is unavailable.";
-    exit;
-}
-
-if (!is_array($item)) {
-    http_response_code(500);
-    echo "Item data is unavailable.";
-    exit;
-}
-$series = $item['series'] ?? [];
+$item = $history['item'];
+$series = $history['series'];
+$resolution = $history['resolution'];
+$rangeLabels = ['90d' => '90 days', '1y' => '1 year', '3y' => '3 years', 'all' => 'All'];
 function layout_start(string $pageTitle): bool
 {
     $header = render_fragment('header.html');
@@ -95,6 +90,19 @@ $wrapperClasses = 'scrapegoat-wrapper' . ($customHeaderUsed ? ' scrapegoat-wrapp
     <h1><?= htmlspecialchars($item['name'] ?? $sku) ?></h1>
     <p class="lede">Historical Micro Center pricing for SKU <?= htmlspecialchars($item['sku'] ?? $sku) ?>.</p>
     <p><a href="sbc.php">&larr; Back to Raspberry Pi listings</a></p>
+    <p>
+      Range:
+      <?php foreach ($rangeLabels as $key => $label): ?>
+        <?php if ($key === $range): ?>
+          <strong><?= htmlspecialchars($label) ?></strong>
+        <?php else: ?>
+          <a href="?sku=<?= urlencode($sku) ?>&amp;range=<?= urlencode($key) ?>"><?= htmlspecialchars($label) ?></a>
+        <?php endif; ?>
+      <?php endforeach; ?>
+      <?php if ($resolution !== 'day'): ?>
+        <span>(<?= $resolution === 'week' ? 'weekly' : 'monthly' ?> closing prices)</span>
+      <?php endif; ?>
+    </p>
   </header>
 
   <section class="chart-section">